@@ -1,3 +1,6 @@
+import os
+import secrets
+
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from firebase_admin import auth
@@ -27,3 +30,12 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Security(securi
 
 def get_current_user_uid(user = Depends(get_current_user)):
     return user['uid']
+
+def require_admin(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Guards operational endpoints: the bearer token must be the Admin Portal's ADMIN_PASSWORD.
+    Without ADMIN_PASSWORD set they are closed to everyone.
+    """
+    admin_password = os.getenv("ADMIN_PASSWORD")
+    if not admin_password or not secrets.compare_digest(credentials.credentials, admin_password):
+        raise HTTPException(status_code=403, detail="Admin access required")
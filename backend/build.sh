@@ -14,3 +14,24 @@ else
     echo "Error: requirements.txt not found"
     exit 1
 fi
+
+echo "Building ingredient score table..."
+if [ -f "score_table.py" ]; then
+    python score_table.py build
+elif [ -f "backend/score_table.py" ]; then
+    (cd backend && python score_table.py build)
+fi
+
+echo "Exporting toxicity model to NumPy format..."
+if [ -f "export_model.py" ]; then
+    python export_model.py
+elif [ -f "backend/export_model.py" ]; then
+    (cd backend && python export_model.py)
+fi
+
+echo "Building ingredient matcher index..."
+if [ -f "ingredient_matcher.py" ]; then
+    python ingredient_matcher.py
+elif [ -f "backend/ingredient_matcher.py" ]; then
+    (cd backend && python ingredient_matcher.py)
+fi
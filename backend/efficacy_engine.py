@@ -1,3 +1,5 @@
+from ingredient_annotator import annotator
+
 # Common Active Ingredients Whitelist (The "Hero" list)
 # We match these by string presence (case-insensitive) to be robust.
 HERO_INGREDIENTS_DB = {
@@ -29,6 +31,7 @@ HERO_INGREDIENTS_DB = {
     "squalane": "Moisturizing, Barrier repair",
     "glycerin": "Hydration (superstar)"
 }
+annotator.register("hero_ingredients", lambda: {key: [key] for key in HERO_INGREDIENTS_DB})
 
 def calculate_efficacy(ingredients_list, product_category="general"):
     """
@@ -42,22 +45,20 @@ def calculate_efficacy(ingredients_list, product_category="general"):
     
     # Analyze ingredients
     for ing in ingredients_list:
-        ing_lower = ing.lower()
-        
-        # Check against our whitelist
-        for key, benefit in HERO_INGREDIENTS_DB.items():
-            if key in ing_lower:
-                # Deduplicate if we already have this key concept
-                # (e.g. don't list Retinol twice if they have Retinol and Retinyl Palmitate, or maybe do? match strictly)
-                
-                # Check if we already added this exact hero name
-                if not any(h['name'] == key.title() for h in hero_ingredients):
-                    hero_ingredients.append({
-                        "name": key.title(), # Capitalize for display
-                        "concentration_estimate": "Effective", # Simplified
-                        "reason": benefit
-                    })
-    
+        # Check against our whitelist (keys found in the name, in whitelist order)
+        for key in annotator.labels(ing, "hero_ingredients"):
+            benefit = HERO_INGREDIENTS_DB[key]
+            # Deduplicate if we already have this key concept
+            # (e.g. don't list Retinol twice if they have Retinol and Retinyl Palmitate, or maybe do? match strictly)
+
+            # Check if we already added this exact hero name
+            if not any(h['name'] == key.title() for h in hero_ingredients):
+                hero_ingredients.append({
+                    "name": key.title(), # Capitalize for display
+                    "concentration_estimate": "Effective", # Simplified
+                    "reason": benefit
+                })
+
     # Calculate Score
     # Base score 50 (Hydrating/Basic)
     # Add points for heroes
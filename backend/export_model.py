@@ -0,0 +1,184 @@
+"""
+Exports the pickled toxicity ensemble to flat NumPy arrays (model/toxicity_model.npz)
+for the pure-NumPy evaluator in numpy_model.py.
+
+    python export_model.py            # export and verify against the pickle
+    python export_model.py --verify   # only verify an existing export
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import toxicity_engine
+from numpy_model import NumpyToxicityModel
+
+DEFAULT_EXPORT_PATH = os.path.join(toxicity_engine.BASE_DIR, "model", "toxicity_model.npz")
+DEFAULT_TOLERANCE = 1e-6
+
+
+def _flatten_sklearn_trees(estimators):
+    """Concatenates sklearn decision trees into one node array; leaves point to themselves."""
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset, depth = 0, 0
+    for est in estimators:
+        tree = est.tree_
+        n = tree.node_count
+        ids = np.arange(n)
+        is_leaf = tree.children_left == -1
+        # Class-1 fraction at each node (normalized in case counts are stored)
+        counts = tree.value[:, 0, :]
+        proba = counts[:, 1] / counts.sum(axis=1)
+
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+        left.append(np.where(is_leaf, ids, tree.children_left) + offset)
+        right.append(np.where(is_leaf, ids, tree.children_right) + offset)
+        value.append(proba)
+        offset += n
+        depth = max(depth, tree.max_depth)
+
+    return {
+        "roots": np.array(roots, dtype=np.int32),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "value": np.concatenate(value).astype(np.float64),
+        "depth": np.array(depth)
+    }
+
+
+def _flatten_lightgbm(booster):
+    """Flattens a LightGBM binary model dump into the same node-array layout."""
+    dump = booster.dump_model()
+    if dump["objective"].split()[0] != "binary" or dump["num_tree_per_iteration"] != 1:
+        raise ValueError(f"Unsupported LightGBM objective: {dump['objective']}")
+    sigmoid = float(dump["objective"].split("sigmoid:")[1]) if "sigmoid:" in dump["objective"] else 1.0
+
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    max_depth = 0
+
+    def add(node, depth):
+        nonlocal max_depth
+        idx = len(feature)
+        feature.append(0)
+        threshold.append(0.0)
+        left.append(idx)
+        right.append(idx)
+        value.append(0.0)
+        if "split_index" not in node:
+            value[idx] = node["leaf_value"]
+            max_depth = max(max_depth, depth)
+            return idx
+        if node["decision_type"] != "<=" or node["missing_type"] not in ("None",) or node.get("num_cat"):
+            raise ValueError(f"Unsupported LightGBM split: {node['decision_type']} / {node['missing_type']}")
+        feature[idx] = node["split_feature"]
+        threshold[idx] = node["threshold"]
+        left[idx] = add(node["left_child"], depth + 1)
+        right[idx] = add(node["right_child"], depth + 1)
+        return idx
+
+    for tree in dump["tree_info"]:
+        roots.append(add(tree["tree_structure"], 0))
+
+    return {
+        "roots": np.array(roots, dtype=np.int32),
+        "feature": np.array(feature, dtype=np.int32),
+        "threshold": np.array(threshold, dtype=np.float64),
+        "left": np.array(left, dtype=np.int32),
+        "right": np.array(right, dtype=np.int32),
+        "value": np.array(value, dtype=np.float64),
+        "depth": np.array(max_depth),
+        "sigmoid": np.array(sigmoid)
+    }
+
+
+def export_model(path=DEFAULT_EXPORT_PATH):
+    ensemble, tfidf, scaler = toxicity_engine._get_model()
+
+    if getattr(ensemble, "voting", None) != "soft":
+        raise ValueError("Only soft-voting ensembles can be exported.")
+    svc, forest, gbm = ensemble.estimators_
+    if svc.kernel != "rbf" or len(svc.classes_) != 2:
+        raise ValueError("Only binary RBF SVCs can be exported.")
+
+    support_vectors = svc.support_vectors_
+    if hasattr(support_vectors, "toarray"):
+        support_vectors = support_vectors.toarray()
+
+    arrays = {
+        "tfidf_terms": np.array(list(tfidf.vocabulary_.keys())),
+        "tfidf_indices": np.array(list(tfidf.vocabulary_.values()), dtype=np.int32),
+        "tfidf_idf": tfidf.idf_.astype(np.float64),
+        "scaler_mean": scaler.mean_.astype(np.float64),
+        "scaler_scale": scaler.scale_.astype(np.float64),
+        "voting_weights": np.array(ensemble.weights or [1.0] * len(ensemble.estimators_), dtype=np.float64),
+        # libsvm's internal (unflipped) coefficients, which its Platt scaling is fitted on
+        "svc_support_vectors": support_vectors.astype(np.float64),
+        "svc_dual_coef": svc._dual_coef_.toarray()[0] if hasattr(svc._dual_coef_, "toarray") else svc._dual_coef_[0],
+        "svc_intercept": np.array(svc._intercept_[0]),
+        "svc_gamma": np.array(svc._gamma),
+        "svc_prob_a": np.array(svc.probA_[0]),
+        "svc_prob_b": np.array(svc.probB_[0]),
+    }
+    arrays.update({f"forest_{k}": v for k, v in _flatten_sklearn_trees(forest.estimators_).items()})
+    arrays.update({f"gbm_{k}": v for k, v in _flatten_lightgbm(gbm.booster_).items()})
+
+    meta = {
+        "source_version": toxicity_engine.get_model_version(),
+        "tfidf": {
+            "token_pattern": tfidf.token_pattern,
+            "ngram_range": list(tfidf.ngram_range),
+            "lowercase": tfidf.lowercase
+        }
+    }
+    if tfidf.analyzer != "word" or tfidf.sublinear_tf or tfidf.norm != "l2" or not tfidf.use_idf:
+        raise ValueError("Unsupported TfidfVectorizer settings for export.")
+    arrays["meta"] = np.array(json.dumps(meta))
+
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    print(f"Exported model to {path} ({os.path.getsize(path) / 1024:.1f} KB, "
+          f"pickle is {os.path.getsize(toxicity_engine.MODEL_PATH) / 1024:.1f} KB)")
+
+
+def verify_export(path=DEFAULT_EXPORT_PATH, tolerance=DEFAULT_TOLERANCE):
+    """Compares exported probabilities with the pickle on every ingredient we know about."""
+    from score_table import collect_ingredient_names
+
+    names = sorted({n for n in collect_ingredient_names() if n and n.strip()})
+    names += ["", "Zorblax Extract", "Methylparaben/Propylparaben", "PARFUM (FRAGRANCE)"]
+
+    model = NumpyToxicityModel(path)
+    numeric = [toxicity_engine.ingredient_features_from_name(n) for n in names]
+
+    start = time.perf_counter()
+    expected = toxicity_engine._run_pickle_model(names)
+    pickle_time = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = model.predict_proba(names, numeric)
+    numpy_time = time.perf_counter() - start
+
+    max_diff = float(np.max(np.abs(expected - actual)))
+    print(f"Verified {len(names)} ingredients: max abs diff {max_diff:.2e} "
+          f"(pickle {pickle_time * 1000:.1f} ms, numpy {numpy_time * 1000:.1f} ms)")
+    if max_diff > tolerance:
+        raise SystemExit(f"Export differs from the pickle by more than {tolerance}")
+    return max_diff
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the toxicity ensemble to a pure-NumPy format.")
+    parser.add_argument("--path", default=DEFAULT_EXPORT_PATH)
+    parser.add_argument("--verify", action="store_true", help="only verify an existing export")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    if not args.verify:
+        export_model(args.path)
+    verify_export(args.path, args.tolerance)
@@ -1,9 +1,9 @@
-import requests
-
+import http_clients
 from incidecoder_client import IncidecoderClient
 
 from firebase_admin import firestore
 from firebase_config import get_db
+from ingredient_cleaner import tokenize_ingredients
 
 def save_to_firestore(product):
     """
@@ -168,7 +168,7 @@ def get_product_by_barcode(barcode):
     if not product_data:
         url = f"https://world.openbeautyfacts.org/api/v0/product/{barcode}.json"
         try:
-            response = requests.get(url, timeout=10)
+            response = http_clients.sync_client("openbeautyfacts").get(url)
             if response.status_code == 200:
                 data = response.json()
                 if data.get("status") == 1:
@@ -208,6 +208,6 @@ def get_ingredients_from_product(product_name):
     for product in products:
         ingredients_text = product.get("ingredients_text")
         if ingredients_text:
-             return [i.strip() for i in ingredients_text.split(",")]
+             return list(tokenize_ingredients(ingredients_text, clean=False))
     
     return None
@@ -0,0 +1,223 @@
+"""
+Shared, pooled HTTP clients for the outbound calls (Incidecoder scraping, OpenBeautyFacts barcode lookups).
+
+Every upstream gets one httpx.Client for sync callers and one httpx.AsyncClient per
+event loop for async callers, so requests reuse keep-alive connections instead of
+paying for a new TCP + TLS handshake each time. HTTP/2 is used by default (requirements
+install httpx[http2], which brings the `h2` package; HTTP2=0 turns it off, and
+without `h2` the clients stay on HTTP/1.1). Pool limits and timeouts are set per
+upstream and can be overridden with HTTP_<UPSTREAM>_MAX_CONNECTIONS /
+HTTP_<UPSTREAM>_TIMEOUT.
+
+run_sync() runs a coroutine on a long-lived background loop, so sync code calling
+async scrapers also keeps its connections between calls.
+
+stats() reports per upstream: requests, new vs reused connections and latency
+percentiles (time to response headers).
+"""
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+from collections import deque
+
+import httpx
+
+HTTP2_ENABLED = os.getenv("HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# Latencies kept per upstream for the percentiles
+LATENCY_WINDOW = 1000
+
+
+def _upstream(name, timeout, connect_timeout, max_connections, keepalive_expiry=30.0, headers=None):
+    prefix = f"HTTP_{name.upper()}_"
+    return {
+        "timeout": float(os.getenv(prefix + "TIMEOUT", str(timeout))),
+        "connect_timeout": connect_timeout,
+        "max_connections": int(os.getenv(prefix + "MAX_CONNECTIONS", str(max_connections))),
+        "keepalive_expiry": keepalive_expiry,
+        "headers": headers or {}
+    }
+
+UPSTREAMS = {
+    # Search + product pages; SCRAPE_CONCURRENCY bounds how many are fetched at once
+    "incidecoder": _upstream("incidecoder", timeout=10.0, connect_timeout=5.0, max_connections=8,
+                             headers={"User-Agent": USER_AGENT}),
+    # One JSON lookup per barcode scan
+    "openbeautyfacts": _upstream("openbeautyfacts", timeout=10.0, connect_timeout=5.0, max_connections=4)
+}
+
+
+class UpstreamMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.responses = 0
+        self.new_connections = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def started(self):
+        with self._lock:
+            self.requests += 1
+
+    def record(self, latency, new_connection):
+        with self._lock:
+            self.responses += 1
+            if new_connection:
+                self.new_connections += 1
+            self.latencies.append(latency)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            reused = self.responses - self.new_connections
+
+            def percentile(p):
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+
+            return {
+                "requests": self.requests,
+                "responses": self.responses,
+                "new_connections": self.new_connections,
+                "reused_connections": reused,
+                "reuse_rate": round(reused / self.responses, 3) if self.responses else 0.0,
+                "latency_ms_p50": percentile(0.5),
+                "latency_ms_p95": percentile(0.95)
+            }
+
+
+metrics = {name: UpstreamMetrics() for name in UPSTREAMS}
+
+
+def _client_kwargs(name):
+    config = UPSTREAMS[name]
+    return {
+        "headers": config["headers"],
+        "timeout": httpx.Timeout(config["timeout"], connect=config["connect_timeout"]),
+        "limits": httpx.Limits(
+            max_connections=config["max_connections"],
+            max_keepalive_connections=config["max_connections"],
+            keepalive_expiry=config["keepalive_expiry"]
+        ),
+        "http2": HTTP2_ENABLED,
+        "follow_redirects": True
+    }
+
+
+# --- Metrics hooks ---
+# The request hook starts a clock and installs an httpcore trace callback, which sees
+# whether the request had to open a TCP connection; the response hook records both.
+
+def _start(name, request, new_connection):
+    metrics[name].started()
+    request.extensions["http_clients_start"] = time.perf_counter()
+    request.extensions["http_clients_new_connection"] = new_connection
+
+def _finish(name, response):
+    request = response.request
+    start = request.extensions.get("http_clients_start")
+    if start is not None:
+        metrics[name].record(time.perf_counter() - start, request.extensions["http_clients_new_connection"][0])
+
+def _sync_hooks(name):
+    def on_request(request):
+        new_connection = [False]
+
+        def trace(event, info):
+            if event == "connection.connect_tcp.complete":
+                new_connection[0] = True
+
+        _start(name, request, new_connection)
+        request.extensions["trace"] = trace
+
+    def on_response(response):
+        _finish(name, response)
+
+    return {"request": [on_request], "response": [on_response]}
+
+def _async_hooks(name):
+    async def on_request(request):
+        new_connection = [False]
+
+        async def trace(event, info):
+            if event == "connection.connect_tcp.complete":
+                new_connection[0] = True
+
+        _start(name, request, new_connection)
+        request.extensions["trace"] = trace
+
+    async def on_response(response):
+        _finish(name, response)
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+# --- Clients ---
+
+_lock = threading.Lock()
+_sync_clients = {}
+_async_clients = {}  # (event loop, upstream) -> AsyncClient
+
+
+def sync_client(name):
+    """The process-wide pooled httpx.Client of an upstream (thread-safe)."""
+    client = _sync_clients.get(name)
+    if client is None or client.is_closed:
+        with _lock:
+            client = _sync_clients.get(name)
+            if client is None or client.is_closed:
+                client = _sync_clients[name] = httpx.Client(event_hooks=_sync_hooks(name), **_client_kwargs(name))
+    return client
+
+def async_client(name):
+    """The pooled httpx.AsyncClient of an upstream for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get((loop, name))
+    if client is None or client.is_closed:
+        with _lock:
+            # Forget the clients of loops that are gone (their connections went with them)
+            for key in [key for key in _async_clients if key[0].is_closed()]:
+                del _async_clients[key]
+            client = _async_clients[(loop, name)] = httpx.AsyncClient(event_hooks=_async_hooks(name), **_client_kwargs(name))
+    return client
+
+
+_background_loop = None
+
+def _get_background_loop():
+    global _background_loop
+    with _lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="http-clients-loop", daemon=True).start()
+        return _background_loop
+
+def run_sync(coro, timeout=None):
+    """Runs a coroutine from sync code on the shared background loop (whose async clients stay warm)."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result(timeout)
+
+
+def close_all():
+    """Closes the sync clients and the background loop's async clients (e.g. at shutdown)."""
+    with _lock:
+        sync_clients = list(_sync_clients.values())
+        _sync_clients.clear()
+    for client in sync_clients:
+        client.close()
+
+    loop = _background_loop
+    if loop is not None and loop.is_running():
+        async def close_loop_clients():
+            for key in [key for key in _async_clients if key[0] is loop]:
+                await _async_clients.pop(key).aclose()
+        run_sync(close_loop_clients(), timeout=10)
+
+
+def stats():
+    return {
+        "http2": HTTP2_ENABLED,
+        "upstreams": {name: m.stats() for name, m in metrics.items()}
+    }
@@ -0,0 +1,276 @@
+"""
+Extraction of the fields we use from Incidecoder pages (search results, product
+pages, ingredient pages).
+
+Building a full BeautifulSoup tree of a product page costs about as much as
+fetching it. The extractors below only build the regions they read: a
+SoupStrainer keeps the top-level tags matching one of the page's rules (e.g. the
+ingredient links, images, brand link and "kbox" explanation boxes of a product
+page) together with everything inside them, and drops the rest of the document
+while it is parsed. The extraction code itself is unchanged and runs on the
+smaller tree, so results are identical to parsing the whole page (strain=False)
+for well-formed markup; tests/test_incidecoder_parser.py checks this on the
+pages in tests/fixtures/incidecoder. Those are synthetic pages following the
+site's markup, not captures: for representative timings, run the benchmark on
+a directory of pages saved from the live site.
+
+HTML_PARSER selects the BeautifulSoup backend ("html.parser" by default; "lxml"
+is faster when installed, but may build slightly different trees from broken
+markup).
+
+    python incidecoder_parser.py [pages_dir]      # benchmark full vs strained parsing
+"""
+import os
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+HTML_PARSER = os.getenv("HTML_PARSER", "html.parser")
+if HTML_PARSER == "lxml":
+    try:
+        import lxml  # noqa: F401
+    except ImportError:
+        print("HTML_PARSER=lxml but lxml is not installed, using html.parser")
+        HTML_PARSER = "html.parser"
+
+# Strainers need the tag-creation hook added in beautifulsoup4 4.13; older versions parse whole pages
+STRAINING_SUPPORTED = hasattr(SoupStrainer, "allow_tag_creation")
+
+
+def _classes(attrs):
+    value = attrs.get("class") or ()
+    return value.split() if isinstance(value, str) else value
+
+
+class _RegionStrainer(SoupStrainer):
+    """Keeps the top-level tags accepted by any rule: {tag name: predicate on the tag's attributes}."""
+
+    def __init__(self, rules):
+        super().__init__(name=list(rules))
+        self.rules = rules
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        rule = self.rules.get(name)
+        return rule is not None and rule(attrs or {})
+
+
+SEARCH_REGIONS = _RegionStrainer({
+    "a": lambda attrs: "simpletextlistitem" in _classes(attrs)
+})
+
+PRODUCT_REGIONS = _RegionStrainer({
+    # Ingredient links and the brand link
+    "a": lambda attrs: "ingred-link" in _classes(attrs) or "/brands/" in (attrs.get("href") or ""),
+    # Images, by id / inside a <picture> / by src
+    "img": lambda attrs: True,
+    "picture": lambda attrs: True,
+    # Explanation boxes, whose links are skipped
+    "div": lambda attrs: "kbox" in _classes(attrs)
+})
+
+INGREDIENT_REGIONS = _RegionStrainer({
+    "h1": lambda attrs: True,
+    "div": lambda attrs: attrs.get("id") == "showmore-section-quickfacts"
+    or any(c in ("fs-large", "itemprop", "ir-score") for c in _classes(attrs))
+})
+
+
+def _soup(html, regions, strain):
+    return BeautifulSoup(html, HTML_PARSER, parse_only=regions if strain and STRAINING_SUPPORTED else None)
+
+
+def parse_search_results(html, limit, site_url, strain=True):
+    """(name, product url) of the product links among the first `limit` search results."""
+    soup = _soup(html, SEARCH_REGIONS, strain)
+    candidates = []
+
+    # Find product links
+    product_links = soup.find_all("a", class_="simpletextlistitem")
+
+    # Limit results
+    for link in product_links[:limit]:
+        href = link.get('href')
+        name = link.get_text(strip=True)
+
+        if href and name:
+            # STRICT FILTER: Only follow actual product links
+            if "/products/" not in href:
+                continue
+            candidates.append((name, f"{site_url}{href}"))
+    return candidates
+
+
+# Jargon to filter out
+JARGON = {
+    "ingredients", "learn more", "read more", "explain",
+    "show all ingredients", "click here", "geeky details",
+    "[more]", "more", "about the ingredients"
+}
+
+def parse_product_page(html, site_url, strain=True):
+    """Ingredients, image and brand from a product page."""
+    soup = _soup(html, PRODUCT_REGIONS, strain)
+
+    ingredients = []
+
+    # Strategy: Look for the specific ingredient links which have class "ingred-link"
+    # This is more robust than looking for a specific container which changes ID/Class
+    candidate_links = soup.find_all("a", class_="ingred-link")
+
+    for link in candidate_links:
+        # Double check it is an ingredient link
+        href = link.get('href', '')
+        if "/ingredients/" not in href:
+            continue
+
+        text = link.get_text(strip=True)
+        if not text:
+            continue
+
+        text_lower = text.lower()
+
+        # Filter jargon
+        if any(j in text_lower for j in JARGON):
+            continue
+
+        # Filter out "Explain" boxes if they somehow got the class (unlikely but safe)
+        if link.find_parent("div", class_="kbox"):
+            continue
+
+        ingredients.append(text)
+
+    # Deduplicate while preserving order
+    seen = set()
+    unique_ingredients = [x for x in ingredients if not (x in seen or seen.add(x))]
+
+    # Image extraction
+    image_url = None
+    img_tag = soup.find("img", id="product-main-image")
+
+    if not img_tag:
+        # Strategy 2: Look for picture tag in main area
+        picture = soup.find("picture")
+        if picture:
+            img_tag = picture.find("img")
+
+    if not img_tag:
+        # Strategy 3: Look for any image with src containing likely path
+        img_tag = soup.find("img", src=lambda s: s and "incidecoder-content" in s)
+
+    if img_tag:
+        src = img_tag.get("src")
+        if src:
+            if src.startswith("/"):
+                image_url = f"{site_url}{src}"
+            else:
+                image_url = src
+
+    # Extract Brand
+    brand_link = soup.find("a", href=lambda h: h and "/brands/" in h)
+    brand = brand_link.get_text(strip=True) if brand_link else "Unknown"
+
+    return {
+        "image": image_url,
+        "brand": brand,
+        "ingredients": unique_ingredients
+    }
+
+
+def parse_ingredient_page(html, ingredient_name, strain=True):
+    """Description, functions and quick facts from an ingredient page (canonical_name: the page's heading)."""
+    soup = _soup(html, INGREDIENT_REGIONS, strain)
+
+    heading = soup.find("h1")
+    data = {
+        "name": ingredient_name,
+        "canonical_name": (heading.get_text(strip=True) or None) if heading else None,
+        "description": None,
+        "functions": [],
+        "quick_facts": []
+    }
+
+    # 1. Extract Description (usually in #showmore-section-ing or just the first p)
+    # Incidecoder often has a "What It Is" section
+    # We'll look for the first substantial paragraph in the content area
+
+    # Try to find the "intro" text
+    intro_div = soup.find("div", class_="fs-large")
+    if intro_div:
+        data["description"] = intro_div.get_text(strip=True)
+
+    # 2. Extract Functions ("What-it-does")
+    # Structure:
+    # <div class="itemprop">
+    #   <span class="label klavikab grey1">What-it-does: </span>
+    #   <span class="value"><a ...>func</a>, ...</span>
+    # </div>
+
+    itemprops = soup.find_all("div", class_="itemprop")
+    for prop in itemprops:
+        label = prop.find("span", class_="label")
+        if label and "What-it-does" in label.get_text():
+            value_span = prop.find("span", class_="value")
+            if value_span:
+                # Extract text from links or just the text
+                data["functions"] = [
+                    text.strip()
+                    for text in value_span.get_text(separator=",").split(",")
+                    if text.strip()
+                ]
+
+    # 3. Extract "Quick Facts"
+    # Structure: <div id="showmore-section-quickfacts"> <ul class="starlist"> <li>...</li> </ul>
+    quick_facts_section = soup.find("div", id="showmore-section-quickfacts")
+    if quick_facts_section:
+        starlist = quick_facts_section.find("ul", class_="starlist")
+        if starlist:
+            data["quick_facts"] = [
+                li.get_text(strip=True)
+                for li in starlist.find_all("li")
+            ]
+
+    # 4. Extract "Geeky Details" / Irritancy (if separate)
+    # Irritancy is often in the "Quick Facts" or separate, but let's check for "ir-score" again just in case
+    ir_score = soup.find("div", class_="ir-score")
+    if ir_score:
+        data["quick_facts"].append(f"Irritancy/Comedogenicity: {ir_score.get_text(strip=True)}")
+
+    return data
+
+
+def benchmark(path=None, repeat=20):
+    """
+    Times full vs strained extraction of every .html page in `path`: pages saved from the live site,
+    or by default the synthetic fixtures in tests/fixtures/incidecoder.
+    """
+    import time
+
+    path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures", "incidecoder")
+    results = {}
+    for file_name in sorted(os.listdir(path)):
+        if not file_name.endswith(".html"):
+            continue
+        with open(os.path.join(path, file_name), "r", encoding="utf-8") as f:
+            html = f.read()
+        if file_name.startswith("search"):
+            parse = lambda strain: parse_search_results(html, 5, "https://incidecoder.com", strain)
+        elif file_name.startswith("ingredient-"):
+            parse = lambda strain: parse_ingredient_page(html, file_name, strain)
+        else:
+            parse = lambda strain: parse_product_page(html, "https://incidecoder.com", strain)
+
+        timings = {}
+        for strain in (False, True):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                parse(strain)
+            timings["strained_ms" if strain else "full_ms"] = (time.perf_counter() - start) / repeat * 1e3
+        results[file_name] = dict(timings, kb=round(len(html) / 1024, 1), identical=parse(False) == parse(True))
+        print(f"{file_name:>48}: {results[file_name]['kb']:>6} KB  full {timings['full_ms']:.2f} ms  "
+              f"strained {timings['strained_ms']:.2f} ms  identical={results[file_name]['identical']}")
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    print(f"Parser: {HTML_PARSER}, straining {'on' if STRAINING_SUPPORTED else 'unsupported (bs4 < 4.13)'}")
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
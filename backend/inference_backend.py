@@ -0,0 +1,155 @@
+"""
+Pluggable backends for the model stage of predict_toxicity.
+
+"inprocess" scores on the calling thread (the default). "process" hands
+the tfidf/feature/ensemble work to a pool of worker processes that preload
+the model, so a burst of scans can use every core instead of contending
+for the GIL in FastAPI's threadpool.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+
+class InferenceBackendBusy(Exception):
+    """Raised when the worker pool queue is full. The API turns this into a 503."""
+
+
+def _worker_init():
+    import toxicity_engine
+    toxicity_engine.warmup()
+
+
+def _worker_predict(names):
+    import toxicity_engine
+    return toxicity_engine._run_model(names)
+
+
+def _worker_ping():
+    return os.getpid()
+
+
+class InProcessBackend:
+    name = "inprocess"
+
+    def __init__(self, run_model):
+        self.run_model = run_model
+
+    def start(self):
+        pass
+
+    def predict(self, names):
+        return self.run_model(names)
+
+    def shutdown(self):
+        pass
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class ProcessPoolBackend:
+    name = "process"
+
+    def __init__(self, run_model, workers=None, max_pending=None, queue_timeout=0.5, timeout=30.0):
+        self.run_model = run_model  # in-process fallback
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.queue_timeout = queue_timeout  # how long a request waits for a free slot before it is rejected
+        self.timeout = timeout
+
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.broken = False
+        self.submitted = 0
+        self.rejected = 0
+        self.fallbacks = 0
+        self.timeouts = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the API process has threads (uvicorn, micro-batcher) running
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_worker_init
+                )
+            return self._executor
+
+    def start(self):
+        """Pre-starts every worker so the model is loaded before the first scan."""
+        executor = self._get_executor()
+        pids = {f.result() for f in [executor.submit(_worker_ping) for _ in range(self.workers * 2)]}
+        print(f"Inference pool ready: {len(pids)} worker processes")
+
+    def predict(self, names):
+        if self.broken:
+            self.fallbacks += 1
+            return self.run_model(names)
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise InferenceBackendBusy(f"Inference queue is full ({self.max_pending} pending requests)")
+        try:
+            self.submitted += 1
+            future = self._get_executor().submit(_worker_predict, list(names))
+        except BrokenProcessPool as e:
+            self._slots.release()
+            return self._fall_back(e, names)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the task is finished or cancelled, not just until we stop waiting:
+        # a task that timed out may still be running in a worker
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # The workers are saturated: shed load (503) rather than queue more work in-process
+            future.cancel()
+            self.timeouts += 1
+            raise InferenceBackendBusy(f"Inference workers did not answer within {self.timeout}s")
+        except BrokenProcessPool as e:
+            return self._fall_back(e, names)
+
+    def _fall_back(self, error, names):
+        print(f"Inference pool is broken ({error}), falling back to in-process scoring.")
+        self.broken = True
+        self.fallbacks += 1
+        return self.run_model(names)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "fallbacks": self.fallbacks,
+            "timeouts": self.timeouts,
+            "broken": self.broken
+        }
+
+
+def create_backend(run_model):
+    """Builds the backend selected by the INFERENCE_BACKEND / INFERENCE_WORKERS / INFERENCE_MAX_PENDING env vars."""
+    kind = os.getenv("INFERENCE_BACKEND", "inprocess")
+    if kind == "process":
+        workers = int(os.getenv("INFERENCE_WORKERS", "0")) or None
+        max_pending = int(os.getenv("INFERENCE_MAX_PENDING", "0")) or None
+        queue_timeout = float(os.getenv("INFERENCE_QUEUE_TIMEOUT", "0.5"))
+        return ProcessPoolBackend(run_model, workers=workers, max_pending=max_pending, queue_timeout=queue_timeout)
+    if kind != "inprocess":
+        print(f"Warning: unknown INFERENCE_BACKEND '{kind}', using in-process scoring.")
+    return InProcessBackend(run_model)
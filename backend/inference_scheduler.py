@@ -0,0 +1,147 @@
+"""
+Cross-request micro-batching for model inference.
+
+Concurrent /scan-product requests each need the model for a handful of
+ingredient rows, and most of the cost of predict_proba is fixed per call.
+The MicroBatcher collects rows from all callers for a short window (or until
+enough rows are queued), runs the model once, and hands every caller back
+its own slice.
+"""
+import bisect
+import threading
+import time
+from concurrent.futures import Future
+
+
+class Histogram:
+    """Fixed-bucket histogram, cheap enough to update on every batch."""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (0..100)."""
+        if not self.count:
+            return 0.0
+        target = self.count * q / 100.0
+        running = 0
+        for i, c in enumerate(self.counts):
+            running += c
+            if running >= target:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        with self._lock:
+            buckets = {f"<={b}": c for b, c in zip(self.bounds, self.counts)}
+            buckets[f">{self.bounds[-1]}"] = self.counts[-1]
+            return {
+                "count": self.count,
+                "mean": round(self.total / self.count, 3) if self.count else 0.0,
+                "p50": self.percentile(50),
+                "p99": self.percentile(99),
+                "max": round(self.max, 3),
+                "buckets": buckets
+            }
+
+
+class MicroBatcher:
+    """
+    Collects rows submitted from many threads and runs them through
+    `run_batch(rows) -> sequence of results` in one call.
+
+    A batch is dispatched when `window_ms` has passed since its first row
+    arrived, or as soon as `max_rows` rows are queued. Identical rows from
+    different callers are only sent to `run_batch` once.
+    """
+
+    def __init__(self, run_batch, window_ms=2.0, max_rows=512):
+        self.run_batch = run_batch
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+
+        self._pending = []  # (rows, future, enqueued_at)
+        self._pending_rows = 0
+        self._cond = threading.Condition()
+
+        self.batch_rows = Histogram([1, 8, 16, 32, 64, 128, 256, 512, 1024])
+        self.batch_requests = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_wait_ms = Histogram([0.1, 0.5, 1, 2, 5, 10, 25, 50, 100])
+
+        self._worker = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, rows):
+        """Blocks until the batch containing `rows` has run and returns their results."""
+        rows = list(rows)
+        if not rows:
+            return []
+        future = Future()
+        with self._cond:
+            self._pending.append((rows, future, time.perf_counter()))
+            self._pending_rows += len(rows)
+            self._cond.notify()
+        return future.result()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            deadline = self._pending[0][2] + self.window
+            while self._pending_rows < self.max_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            # Take whole requests until the row budget is used up (always at least one)
+            batch, rows = [], 0
+            while self._pending and (not batch or rows + len(self._pending[0][0]) <= self.max_rows):
+                item = self._pending.pop(0)
+                batch.append(item)
+                rows += len(item[0])
+            self._pending_rows -= rows
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._take_batch()
+            started = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self.queue_wait_ms.observe((started - enqueued_at) * 1000.0)
+
+            unique_rows = list(dict.fromkeys(row for rows, _, _ in batch for row in rows))
+            self.batch_rows.observe(len(unique_rows))
+            self.batch_requests.observe(len(batch))
+
+            try:
+                results = dict(zip(unique_rows, self.run_batch(unique_rows)))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for rows, future, _ in batch:
+                future.set_result([results[row] for row in rows])
+
+    def stats(self):
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_rows": self.max_rows,
+            "batch_rows": self.batch_rows.snapshot(),
+            "batch_requests": self.batch_requests.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot()
+        }
@@ -0,0 +1,247 @@
+"""
+Keyword annotation of ingredient names, shared by the rule engines.
+
+Every engine used to lowercase each ingredient and run its own
+`any(k in name for k in keywords)` loop. Instead, each engine registers a rule
+group here ({label: [keywords]}, usually loaded from its JSON rules file) and
+all groups are compiled into one Aho-Corasick automaton. An ingredient is
+scanned once, character by character, and the result is a bitmask with one bit
+per (group, label) whose keywords occur in the name. Results are memoized per
+lowercased name, so repeated ingredients cost a dict lookup.
+
+Matching is plain substring matching on the lowercased name, exactly like the
+loops it replaces.
+
+Rule files are watched: when one of them changes on disk (checked at most every
+RULES_CHECK_INTERVAL seconds) or reload_rules() is called, every group is
+reloaded and a new automaton is built under a new version number.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+# Seconds between checks of the rule files' mtimes (0 checks on every call)
+RULES_CHECK_INTERVAL = float(os.getenv("RULES_CHECK_INTERVAL", "2"))
+
+# Annotations remembered per automaton before the memo is reset
+ANNOTATION_MEMO_SIZE = int(os.getenv("ANNOTATION_MEMO_SIZE", "50000"))
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over lowercase keywords, compiled into a DFA:
+    one transition dict per state, so scanning never follows failure links.
+    Each keyword carries an output bitmask; scan() ORs the masks of every keyword found.
+    """
+
+    def __init__(self, keyword_masks):
+        # 1. Trie of the keywords
+        goto = [{}]
+        output = [0]
+        self.always = 0  # masks of empty keywords, which (like `"" in s`) match every name
+        for keyword, mask in keyword_masks.items():
+            if not keyword:
+                self.always |= mask
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    output.append(0)
+                state = nxt
+            output[state] |= mask
+
+        # 2. Failure links in BFS order. Each state's DFA transitions are its failure
+        # state's plus its own, and its output includes the failure state's output.
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = goto[0]
+        queue = [(0, ch, nxt) for ch, nxt in goto[0].items()]
+        head = 0
+        while head < len(queue):
+            parent, ch, state = queue[head]
+            head += 1
+            if parent:
+                fail[state] = delta[fail[parent]].get(ch, 0)
+            output[state] |= output[fail[state]]
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            queue.extend((state, c, nxt) for c, nxt in goto[state].items())
+
+        self.delta = delta
+        self.output = output
+        self.n_keywords = len(keyword_masks)
+
+    def scan(self, text):
+        delta = self.delta
+        output = self.output
+        state = 0
+        found = self.always
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            found |= output[state]
+        return found
+
+
+class _CompiledRules:
+    """One immutable version of the rules: the automaton, label bits and annotation memo."""
+
+    def __init__(self, groups, version):
+        self.version = version
+        self.labels = {}  # group -> [(label, bit)] in the group's own order
+        keyword_masks = {}
+        bit = 1
+        for group, rules in groups.items():
+            self.labels[group] = []
+            for label, keywords in rules.items():
+                self.labels[group].append((label, bit))
+                for keyword in keywords:
+                    keyword = keyword.lower()
+                    keyword_masks[keyword] = keyword_masks.get(keyword, 0) | bit
+                bit <<= 1
+        self.bits = {group: dict(labels) for group, labels in self.labels.items()}
+        self.group_masks = {group: sum(b for _, b in labels) for group, labels in self.labels.items()}
+        self.automaton = KeywordAutomaton(keyword_masks)
+        self.memo = {}
+
+
+class IngredientAnnotator:
+    def __init__(self):
+        self._loaders = {}  # group -> (loader, paths)
+        self._lock = threading.Lock()
+        self._rules = None
+        self._stamps = None
+        self._next_check = 0.0
+        self.version = 0
+        self.scans = 0
+
+    def register(self, group, loader, paths=()):
+        """
+        Registers a rule group. `loader()` returns {label: [keywords]} (labels keep their order);
+        `paths` are the files it reads, which are watched for changes.
+        """
+        with self._lock:
+            self._loaders[group] = (loader, tuple(paths))
+            self._rules = None
+
+    def _file_stamps(self):
+        stamps = []
+        for _, paths in self._loaders.values():
+            for path in paths:
+                try:
+                    s = os.stat(path)
+                    stamps.append((path, s.st_mtime_ns, s.st_size))
+                except OSError:
+                    stamps.append((path, None, None))
+        return stamps
+
+    def _build(self):
+        groups = {}
+        for group, (loader, _) in self._loaders.items():
+            try:
+                groups[group] = loader()
+            except Exception as e:
+                print(f"Error loading annotation rules for {group}: {e}")
+                groups[group] = {}
+        self.version += 1
+        self._stamps = self._file_stamps()
+        self._rules = _CompiledRules(groups, self.version)
+
+    def reload_rules(self):
+        """Reloads every group's rules and compiles a new automaton version. Returns the version."""
+        with self._lock:
+            self._build()
+            return self.version
+
+    def _current(self):
+        rules = self._rules
+        now = time.monotonic()
+        if rules is not None and now < self._next_check:
+            return rules
+        with self._lock:
+            if self._rules is None:
+                self._build()
+            elif now >= self._next_check and self._file_stamps() != self._stamps:
+                print("Rule files changed on disk, rebuilding the ingredient annotator.")
+                self._build()
+            self._next_check = now + RULES_CHECK_INTERVAL
+            return self._rules
+
+    def current_version(self):
+        """Version of the rules in use (rebuilding first if a rules file changed)."""
+        return self._current().version
+
+    def _annotate(self, rules, name):
+        key = name.lower()
+        bits = rules.memo.get(key)
+        if bits is None:
+            bits = rules.automaton.scan(key)
+            self.scans += 1
+            if len(rules.memo) >= ANNOTATION_MEMO_SIZE:
+                rules.memo.clear()
+            rules.memo[key] = bits
+        return bits
+
+    def annotate(self, name):
+        """Bitmask of every (group, label) whose keywords occur in the ingredient name."""
+        return self._annotate(self._current(), name)
+
+    def annotate_many(self, names):
+        rules = self._current()
+        return [self._annotate(rules, n) for n in names]
+
+    def labels(self, name, group):
+        """Labels of `group` hit by the ingredient, in the group's order."""
+        rules = self._current()
+        bits = self._annotate(rules, name)
+        if not bits & rules.group_masks.get(group, 0):
+            return []
+        return [label for label, bit in rules.labels[group] if bits & bit]
+
+    def has(self, name, group, label):
+        """True if any keyword of `label` in `group` occurs in the ingredient."""
+        rules = self._current()
+        bit = rules.bits.get(group, {}).get(label, 0)
+        return bool(bit and self._annotate(rules, name) & bit)
+
+    def has_many(self, names, group, label):
+        """has() for several names, all checked against the same rules version."""
+        rules = self._current()
+        bit = rules.bits.get(group, {}).get(label, 0)
+        if not bit:
+            return [False] * len(names)
+        return [bool(self._annotate(rules, n) & bit) for n in names]
+
+    def label_matrix(self, names, groups):
+        """
+        Incidence matrix of names x labels: returns the columns as (group, label) pairs
+        and a bool array with one row per name, all from the same rules version.
+        """
+        rules = self._current()
+        columns = [(group, label) for group in groups for label, _ in rules.labels.get(group, [])]
+        column_bits = [bit for group in groups for _, bit in rules.labels.get(group, [])]
+        matrix = np.zeros((len(names), len(columns)), dtype=bool)
+        for i, name in enumerate(names):
+            bits = self._annotate(rules, name)
+            if bits:
+                matrix[i] = [bool(bits & bit) for bit in column_bits]
+        return columns, matrix
+
+    def stats(self):
+        rules = self._current()
+        return {
+            "version": rules.version,
+            "groups": {group: len(labels) for group, labels in rules.labels.items()},
+            "keywords": rules.automaton.n_keywords,
+            "states": len(rules.automaton.delta),
+            "memo_size": len(rules.memo),
+            "scans": self.scans
+        }
+
+
+# Shared by all the rule engines
+annotator = IngredientAnnotator()
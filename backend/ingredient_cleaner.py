@@ -1,46 +1,80 @@
+import os
 import re
+from functools import lru_cache
 
-def clean_ingredient(ing):
-    ing = ing.strip()
+# Distinct raw strings remembered by clean_ingredient (the result only depends on the string)
+CLEAN_CACHE_SIZE = int(os.getenv("INGREDIENT_CLEAN_CACHE_SIZE", "50000"))
+
+# Truncate at common non-ingredient keywords
+TRUNCATE_KEYWORDS = ["DIRECTIONS", "USAGE", "CAUTION", "WARNING", "HOW TO USE", "INGREDIENTS:"]
+# Sentences with instruction verbs
+INSTRUCTION_VERBS = ["apply", "rinse", "massage", "avoid", "contact", "use", "store", "keep", "consult", "patch test"]
+# Manufacturer addresses
+ADDRESS_MARKERS = ["hamburg", "uk ltd", "australia", "nsw", "made in", "dist."]
+# Words that make a long text still look like a chemical name
+CHEMICAL_WORDS = ["acid", "alcohol", "oil", "extract", "fragrance", "parfum", "glyc", "propyl", "coco", "gum", "water", "aqua"]
+# Common OCR mistakes
+OCR_FIXES = {
+    "ydroxide": "hydroxide",
+    "Citroneld pha": "Citronellol",
+    "Feel Oil": "Peel Oil",
+    "Searate": "Stearate"
+}
+
+
+def _any_of(words):
+    """One compiled substring search for any of the words (same result as any(w in s for w in words))."""
+    return re.compile("|".join(re.escape(w) for w in words))
 
-    # Truncate at common non-ingredient keywords
-    for keyword in ["DIRECTIONS", "USAGE", "CAUTION", "WARNING", "HOW TO USE", "INGREDIENTS:"]:
+_TRUNCATE_RE = _any_of(TRUNCATE_KEYWORDS)
+_INSTRUCTION_RE = _any_of(INSTRUCTION_VERBS)
+_ADDRESS_RE = _any_of(ADDRESS_MARKERS)
+_CHEMICAL_RE = _any_of(CHEMICAL_WORDS)
+_URL_RE = re.compile(r"http\S+")
+_LOT_NUMBER_RE = re.compile(r"\b\d+[A-Za-z]+\b")
+_STORAGE_RE = re.compile(r"Store.*?Aqua", flags=re.IGNORECASE)
+# Only at the start of a word, so a correct "Hydroxide" does not become "Hhydroxide"
+_OCR_FIX_RE = re.compile(r"\b(?:" + "|".join(re.escape(w) for w in OCR_FIXES) + ")")
+
+
+def _truncate(ing):
+    for keyword in TRUNCATE_KEYWORDS:
         if keyword in ing.upper():
             ing = ing.split(keyword, 1)[0] # Keep everything before the keyword
             ing = ing.split(keyword.title(), 1)[0] # Try title case too just in case
+    return ing
 
-    # Remove sentences with instruction verbs
-    instruction_verbs = ["apply", "rinse", "massage", "avoid", "contact", "use", "store", "keep", "consult", "patch test"]
-    if any(verb in ing.lower() for verb in instruction_verbs):
-        # If it's a long sentence with these verbs, it's likely an instruction
-        if len(ing.split()) > 3: 
-            return ""
 
-    # Remove URLs
-    ing = re.sub(r"http\S+", "", ing)
-
-    # Remove lot numbers / random codes
-    ing = re.sub(r"\b\d+[A-Za-z]+\b", "", ing)
+@lru_cache(maxsize=CLEAN_CACHE_SIZE)
+def clean_ingredient(ing):
+    ing = ing.strip()
 
-    # Remove temperature storage instructions
-    ing = re.sub(r"Store.*?Aqua", "Aqua", ing, flags=re.IGNORECASE)
+    # 1. Truncate at common non-ingredient keywords (the keyword loop only runs when one is present)
+    if _TRUNCATE_RE.search(ing.upper()):
+        ing = _truncate(ing)
 
-    # Remove manufacturer addresses
-    if any(x in ing.lower() for x in ["hamburg", "uk ltd", "australia", "nsw", "made in", "dist."]):
+    # 2. Remove sentences with instruction verbs
+    # If it's a long sentence with these verbs, it's likely an instruction
+    if len(ing.split()) > 3 and _INSTRUCTION_RE.search(ing.lower()):
         return ""
 
-    # Remove unwanted long manufacturer text
-    if len(ing.split()) >= 7:
+    # 3. Remove URLs, lot numbers / random codes and temperature storage instructions
+    if "http" in ing:
+        ing = _URL_RE.sub("", ing)
+    ing = _LOT_NUMBER_RE.sub("", ing)
+    ing = _STORAGE_RE.sub("Aqua", ing)
+
+    # 4. Remove manufacturer addresses and unwanted long manufacturer text
+    lower = ing.lower()
+    if _ADDRESS_RE.search(lower):
+        return ""
+    if len(ing.split()) >= 7 and not _CHEMICAL_RE.search(lower):
         # If contains many non-chemical words, drop it
-        if not any(x in ing.lower() for x in ["acid","alcohol","oil","extract","fragrance","parfum","glyc","propyl","coco","gum", "water", "aqua"]):
-            return ""
-
-    # Fix common OCR mistakes
-    ing = ing.replace("ydroxide", "hydroxide")
-    ing = ing.replace("Citroneld pha", "Citronellol")
-    ing = ing.replace("Feel Oil", "Peel Oil")
-    ing = ing.replace("Searate", "Stearate")
-    
+        return ""
+
+    # 5. Fix common OCR mistakes (all fixes in one pass)
+    ing = _OCR_FIX_RE.sub(lambda m: OCR_FIXES[m.group()], ing)
+
     # Normalize bilingual names (e.g., "Water/Eau" -> "Water")
     # But be careful not to break chemical names with slashes (though rare in basic lists)
     # Usually "Name/Name" with spaces or CamelCase is bilingual.
@@ -63,3 +97,139 @@ def clean_ingredient_list(lst):
             cleaned.append(ing)
 
     return cleaned
+
+
+def clean_ingredient_list_many(lists):
+    """clean_ingredient_list for many products; each distinct raw string is cleaned once."""
+    cleaned = {ing: clean_ingredient(ing) for ing in dict.fromkeys(ing for lst in lists for ing in lst)}
+    return [[c for c in map(cleaned.__getitem__, lst) if c and len(c) > 2] for lst in lists]
+
+
+# Ingredient list separators, and the brackets that protect them inside a name or sub-list
+_TOKEN_EVENT_RE = re.compile(r"[,;()\[\]{}]")
+_OPENING = "([{"
+_CLOSING = ")]}"
+# Leading "Ingredients:" label of a whole list
+_LIST_LABEL_RE = re.compile(r"^\s*ingredients?\s*:\s*", flags=re.IGNORECASE)
+# "may contain" / "+/-" sections list optional colorants
+_MAY_CONTAIN_RE = re.compile(r"[\[(]?\s*(?:\bmay contain\b|\+/-)\s*(?:\(\s*\+/-\s*\))?\s*:?\s*", flags=re.IGNORECASE)
+# Bilingual alternatives ("Water/Eau", "Aqua/Eau" inside parentheses): everything from the first slash in a segment
+_ALTERNATIVES_RE = re.compile(r"([^/()\[\]{}]+)((?:/[^/()\[\]{}]*)+)")
+# Zero-width characters and soft hyphens left by copy-paste and OCR
+_INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff\u00ad"))
+
+
+def _first_alternative(m):
+    first = m.group(1)
+    # Same heuristic as clean_ingredient: keep the first name if it is longer than 2 chars
+    return first.rstrip() if len(first.strip()) > 2 else m.group(0)
+
+
+def _split_top_level(text):
+    """
+    Yields the raw top-level items of an ingredient list in one scan over its separators.
+    Commas between digits ("1,2-Hexanediol") and separators inside brackets do not split.
+    An unclosed bracket does not swallow the rest of the list: its separators are
+    used after all once the text ends without the bracket being closed.
+    """
+    depth = 0
+    start = 0
+    nested = []  # separator positions inside the current outermost bracket
+    for m in _TOKEN_EVENT_RE.finditer(text):
+        ch = m.group()
+        pos = m.start()
+        if ch in _OPENING:
+            depth += 1
+        elif ch in _CLOSING:
+            if depth:
+                depth -= 1
+                if not depth:
+                    nested = []
+        elif ch == "," and 0 < pos < len(text) - 1 and text[pos - 1].isdigit() and text[pos + 1].isdigit():
+            continue
+        elif depth:
+            nested.append(pos)
+        else:
+            yield text[start:pos]
+            start = pos + 1
+    for pos in nested:
+        yield text[start:pos]
+        start = pos + 1
+    yield text[start:]
+
+
+def _expand(item):
+    """Turns one raw top-level item into ingredient names (unwrapping "may contain" sub-lists)."""
+    item = item.translate(_INVISIBLE).strip()
+    section = _MAY_CONTAIN_RE.search(item)
+    if section:
+        # Whatever precedes the section ("Niacinamide. [+/- CI 77891]") is an ingredient of its own
+        head = item[:section.start()].strip().rstrip(".")
+        if head:
+            yield from _expand(head)
+        rest = item[section.end():].strip()
+        # "[+/- CI 77491, CI 77492]" is kept together by the bracket, so split its inside
+        if section.group().startswith(("[", "(")) and rest.endswith(("]", ")")):
+            rest = rest[:-1]
+        for sub in _split_top_level(rest):
+            yield from _expand(sub)
+        return
+    if "/" in item:
+        item = _ALTERNATIVES_RE.sub(_first_alternative, item)
+    yield item.strip()
+
+
+def tokenize_ingredients(text, clean=True):
+    """
+    Lazily splits a raw ingredient list (pasted, OCR or scraped text) into ingredients.
+
+    Handles commas inside names ("1,2-Hexanediol") and brackets, "may contain" / "+/-"
+    sections, bilingual "Water/Eau" names, a leading "Ingredients:" label and
+    zero-width characters. With clean=True every token also goes through
+    clean_ingredient and short/empty ones are dropped, like clean_ingredient_list.
+    """
+    if not text:
+        return
+    text = _LIST_LABEL_RE.sub("", text, count=1)
+    for item in _split_top_level(text):
+        for ing in _expand(item):
+            if clean:
+                ing = clean_ingredient(ing)
+                if not ing or len(ing) <= 2:
+                    continue
+            elif not ing:
+                continue
+            yield ing
+
+
+def benchmark(path=None, repeat=20):
+    """Times cleaning every ingredient list in products.json: uncached, memoized and batched."""
+    import json
+    import time
+
+    path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "products.json")
+    with open(path, "r", encoding="utf-8") as f:
+        lists = [p.get("ingredients", []) for p in json.load(f)]
+    n = sum(len(lst) for lst in lists)
+    uncached = clean_ingredient.__wrapped__
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - start) / repeat
+
+    clean_ingredient.cache_clear()
+    results = {
+        "ingredients": n,
+        "uncached_ms": timed(lambda: [[uncached(i) for i in lst] for lst in lists]) * 1e3,
+        "memoized_ms": timed(lambda: [clean_ingredient_list(lst) for lst in lists]) * 1e3,
+        "batch_ms": timed(lambda: clean_ingredient_list_many(lists)) * 1e3
+    }
+    for key in ("uncached_ms", "memoized_ms", "batch_ms"):
+        print(f"{key[:-3]:>9}: {results[key]:.2f} ms for {n} ingredients ({results[key] * 1e3 / n:.2f} us each)")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,50 +1,313 @@
+import hashlib
 import json
 import os
+import shutil
+import threading
+import time
 import numpy as np
+import sklearn
+from scipy.sparse import csr_matrix, hstack, vstack
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from cache_utils import LRUCache
+
+MATCH_MEMO_SIZE = int(os.getenv("MATCH_MEMO_SIZE", "10000"))
+
+# Fitted vocabulary, IDF and posting matrix are cached here, one subdirectory per DB fingerprint
+MATCHER_CACHE_DIR = os.getenv("MATCHER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model", "matcher_cache"))
+# Bump when the vectorizer settings or the cached layout change
+INDEX_FORMAT = "char_wb-2-4-v1"
+
+# Refit in the background once this many names were added since the last fit (0 = only on compact())
+MATCHER_COMPACT_ROWS = int(os.getenv("MATCHER_COMPACT_ROWS", "5000"))
+
+def normalize_query(query):
+    """Lowercase and collapse whitespace. char_wb n-grams are built per word, so this never changes a match."""
+    return " ".join(query.lower().split())
+
+def _entry_texts(entry):
+    """Matrix rows for one DB entry: its name followed by its synonyms."""
+    return [entry["name"].lower()] + [s.lower() for s in entry.get("synonyms", [])]
+
+def _new_vectorizer():
+    return TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4))
+
+
+class MatcherIndex:
+    """
+    Immutable snapshot of the matcher's index.
+
+    Rows come from two segments: the fitted base (posting matrix + exact dict) and
+    a delta of entries added since, vectorized with the base's frozen vocabulary
+    and IDF. Removed rows are tombstoned rather than deleted. Writers build a new
+    snapshot and swap the reference, so readers never see a half-applied update.
+    """
+
+    def __init__(self, vectorizer, base_postings, base_map, base_exact, base_names,
+                 delta_matrix=None, delta_map=(), delta_exact=None, delta_names=None,
+                 tombstones=frozenset(), generation=0):
+        self.vectorizer = vectorizer
+        self.base_postings = base_postings # n-grams x rows
+        self.base_map = base_map # row -> DB entry
+        self.base_exact = base_exact # normalized text -> first row
+        self.base_names = base_names # normalized entry name -> rows
+        self.delta_matrix = delta_matrix # rows x n-grams
+        self.delta_map = delta_map
+        self.delta_exact = delta_exact or {}
+        self.delta_names = delta_names or {}
+        self.tombstones = tombstones
+        self.generation = generation
+
+    @classmethod
+    def build(cls, entries, vectorizer=None, postings=None):
+        """Base segment for a list of DB entries. Fits the vectorizer unless a fitted one is given."""
+        corpus, base_map, base_exact, base_names = [], [], {}, {}
+        for entry in entries:
+            name_key = normalize_query(entry["name"])
+            for text in _entry_texts(entry):
+                base_names.setdefault(name_key, []).append(len(corpus))
+                base_exact.setdefault(normalize_query(text), len(corpus))
+                corpus.append(text)
+                base_map.append(entry)
+
+        if postings is None:
+            vectorizer = _new_vectorizer()
+            # n-gram -> entries posting lists. Rows are L2-normalized, so a sparse
+            # product with this only touches entries sharing an n-gram with the query.
+            postings = vectorizer.fit_transform(corpus).T.tocsr()
+        return cls(vectorizer, postings, base_map, base_exact,
+                   {k: tuple(v) for k, v in base_names.items()})
+
+    @property
+    def n_base(self):
+        return len(self.base_map)
+
+    @property
+    def n_delta(self):
+        return len(self.delta_map)
+
+    def entry(self, row):
+        return self.base_map[row] if row < self.n_base else self.delta_map[row - self.n_base]
+
+    def exact(self, key):
+        """First live row whose text normalizes to key, or None (the fuzzy search then decides)."""
+        for table in (self.base_exact, self.delta_exact):
+            row = table.get(key)
+            if row is not None and row not in self.tombstones:
+                return row
+        return None
+
+    def rows_for_name(self, name_key):
+        rows = self.base_names.get(name_key, ()) + self.delta_names.get(name_key, ())
+        return [r for r in rows if r not in self.tombstones]
+
+    def similarities(self, query_vecs):
+        """Cosine similarity of every query against every row (sparse, tombstones included)."""
+        sims = query_vecs @ self.base_postings
+        if self.delta_matrix is not None:
+            sims = hstack([sims, query_vecs @ self.delta_matrix.T])
+        return sims.tocsr()
+
+    def with_entry(self, entry):
+        """New snapshot with the entry appended to the delta (replacing a live entry of the same name)."""
+        name_key = normalize_query(entry["name"])
+        texts = _entry_texts(entry)
+        vecs = self.vectorizer.transform(texts)
+
+        first_row = self.n_base + self.n_delta
+        replaced = set(self.rows_for_name(name_key))
+        delta_exact = dict(self.delta_exact)
+        for i, text in enumerate(texts):
+            key = normalize_query(text)
+            if key not in delta_exact or delta_exact[key] in replaced:
+                delta_exact[key] = first_row + i
+        delta_names = dict(self.delta_names)
+        delta_names[name_key] = delta_names.get(name_key, ()) + tuple(range(first_row, first_row + len(texts)))
+
+        return MatcherIndex(
+            self.vectorizer, self.base_postings, self.base_map, self.base_exact, self.base_names,
+            vecs if self.delta_matrix is None else vstack([self.delta_matrix, vecs]).tocsr(),
+            self.delta_map + (entry,) * len(texts), delta_exact, delta_names,
+            self.tombstones.union(replaced), self.generation + 1)
+
+    def without_name(self, name_key):
+        """New snapshot with every row of the named entry tombstoned, or None if there is no such entry."""
+        rows = self.rows_for_name(name_key)
+        if not rows:
+            return None
+        return MatcherIndex(
+            self.vectorizer, self.base_postings, self.base_map, self.base_exact, self.base_names,
+            self.delta_matrix, self.delta_map, self.delta_exact, self.delta_names,
+            self.tombstones.union(rows), self.generation + 1)
+
+    def live_entries(self):
+        """DB entries that are still matchable, base first, in row order."""
+        entries, seen = [], set()
+        for row in range(self.n_base + self.n_delta):
+            entry = self.entry(row)
+            if row not in self.tombstones and id(entry) not in seen:
+                seen.add(id(entry))
+                entries.append(entry)
+        return entries
+
 
 class IngredientMatcher:
-    def __init__(self, db_path="data/ingredients_db.json"):
+    def __init__(self, db_path="data/ingredients_db.json", cache_dir=MATCHER_CACHE_DIR):
         self.db_path = os.path.join(os.path.dirname(__file__), db_path)
+        self.cache_dir = cache_dir
+        self.fingerprint = None
+        self.index_source = None # "cache" or "fit"
         self.ingredients_db = []
-        self.vectorizer = None
-        self.tfidf_matrix = None
-        self.names_list = []
-        self.index_map = [] # Maps matrix index back to db entry
-        
+        self.index = None # Current MatcherIndex snapshot, swapped atomically by add/remove/compact
+
+        # Fuzzy results keyed by (normalized query, k, threshold, index generation)
+        self.memo = LRUCache(maxsize=MATCH_MEMO_SIZE)
+        self.exact_hits = 0
+        self.memo_hits = 0
+        self.fuzzy_fallbacks = 0
+
+        self._write_lock = threading.Lock()
+        self._compacting = False
+
         self._load_db()
         self._train_vectorizer()
 
+    @property
+    def vectorizer(self):
+        return self.index.vectorizer if self.index else None
+
     def _load_db(self):
         """Loads the ingredients database from JSON."""
         try:
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                self.ingredients_db = json.load(f)
+            with open(self.db_path, 'rb') as f:
+                raw = f.read()
+            self.ingredients_db = json.loads(raw.decode('utf-8'))
+            h = hashlib.sha256(raw)
+            h.update(f"{INDEX_FORMAT}|sklearn-{sklearn.__version__}".encode())
+            self.fingerprint = h.hexdigest()[:16]
         except FileNotFoundError:
             print(f"Warning: Database not found at {self.db_path}")
             self.ingredients_db = []
 
     def _train_vectorizer(self):
-        """Trains TF-IDF vectorizer on ingredient names and synonyms."""
-        corpus = []
-        self.index_map = []
-        
-        for entry in self.ingredients_db:
-            # Add primary name
-            corpus.append(entry["name"].lower())
-            self.index_map.append(entry)
-            
-            # Add synonyms
-            for synonym in entry.get("synonyms", []):
-                corpus.append(synonym.lower())
-                self.index_map.append(entry)
-        
-        if corpus:
-            self.vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4))
-            self.tfidf_matrix = self.vectorizer.fit_transform(corpus)
-        else:
+        """Trains TF-IDF vectorizer on ingredient names and synonyms (or restores it from the cache)."""
+        self.memo.clear()
+        n_rows = sum(len(_entry_texts(e)) for e in self.ingredients_db)
+        if not n_rows:
             print("Warning: Empty corpus, vectorizer not trained.")
+            return
+
+        cached = self._load_index(n_rows)
+        if cached:
+            self.index = MatcherIndex.build(self.ingredients_db, *cached)
+            self.index_source = "cache"
+            return
+
+        self.index = MatcherIndex.build(self.ingredients_db)
+        self.index_source = "fit"
+        self._save_index()
+
+    def _index_path(self):
+        if not self.cache_dir or not self.fingerprint:
+            return None
+        return os.path.join(self.cache_dir, self.fingerprint)
+
+    def _load_index(self, n_rows):
+        """Restores the fitted vectorizer and posting matrix from the cache. Returns None on a miss."""
+        path = self._index_path()
+        if not path or not os.path.isdir(path):
+            return None
+        try:
+            terms = np.load(os.path.join(path, "terms.npy"))
+            idf = np.load(os.path.join(path, "idf.npy"))
+            # Memory-mapped, so workers share the pages instead of each holding a copy
+            data = np.load(os.path.join(path, "data.npy"), mmap_mode='r')
+            indices = np.load(os.path.join(path, "indices.npy"), mmap_mode='r')
+            indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode='r')
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not load matcher index from {path}: {e}")
+            return None
+        if len(indptr) != len(terms) + 1 or len(idf) != len(terms):
+            print(f"Warning: matcher index in {path} is inconsistent, refitting.")
+            return None
+
+        vectorizer = _new_vectorizer()
+        vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms.tolist())}
+        vectorizer.idf_ = idf
+        postings = csr_matrix((data, indices, indptr), shape=(len(terms), n_rows), copy=False)
+        return vectorizer, postings
+
+    def _save_index(self):
+        """Writes the fitted index to the cache. Written to a temp dir and renamed, so readers never see a partial index."""
+        path = self._index_path()
+        if not path or os.path.isdir(path):
+            return
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        vectorizer, postings = self.index.vectorizer, self.index.base_postings
+        try:
+            os.makedirs(tmp_path, exist_ok=True)
+            terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+            np.save(os.path.join(tmp_path, "terms.npy"), np.array(terms, dtype=str))
+            np.save(os.path.join(tmp_path, "idf.npy"), vectorizer.idf_)
+            np.save(os.path.join(tmp_path, "data.npy"), postings.data)
+            np.save(os.path.join(tmp_path, "indices.npy"), postings.indices)
+            np.save(os.path.join(tmp_path, "indptr.npy"), postings.indptr)
+            os.rename(tmp_path, path)
+        except OSError as e:
+            # Read-only filesystem, or another worker saved the same index first
+            if not os.path.isdir(path):
+                print(f"Warning: could not save matcher index to {path}: {e}")
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def add(self, entry):
+        """
+        Makes a new DB entry (name, synonyms, ...) matchable immediately.
+        Only the entry's own names are vectorized, against the frozen vocabulary and IDF;
+        n-grams the base never saw are ignored until the next compact().
+        An existing entry with the same name is replaced.
+        """
+        with self._write_lock:
+            if self.index is None:
+                self.index = MatcherIndex.build([entry])
+            else:
+                self.index = self.index.with_entry(entry)
+            self.memo.clear()
+            needs_compaction = (MATCHER_COMPACT_ROWS and self.index.n_delta >= MATCHER_COMPACT_ROWS
+                                and not self._compacting)
+            if needs_compaction:
+                self._compacting = True
+        if needs_compaction:
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def remove(self, name):
+        """Stops matching the entry with this name (and its synonyms). Returns False if it is unknown."""
+        with self._write_lock:
+            if self.index is None:
+                return False
+            updated = self.index.without_name(normalize_query(name))
+            if updated is None:
+                return False
+            self.index = updated
+            self.memo.clear()
+            return True
+
+    def compact(self):
+        """Refits the vocabulary and IDF over the live entries, folding the delta and tombstones into a new base."""
+        with self._write_lock:
+            try:
+                if self.index is None:
+                    return
+                entries = self.index.live_entries()
+                compacted = MatcherIndex.build(entries) if entries else None
+                if compacted is not None:
+                    # Keep generations increasing so memo entries of the old snapshot never match
+                    compacted.generation = self.index.generation + 1
+                self.index = compacted
+                self.index_source = "fit"
+                self.memo.clear()
+            finally:
+                self._compacting = False
 
     def match(self, query, threshold=0.6):
         """
@@ -54,20 +317,123 @@ class IngredientMatcher:
         if not self.vectorizer or not query:
             return None
 
-        query_vec = self.vectorizer.transform([query.lower()])
-        similarities = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
-        
-        best_idx = np.argmax(similarities)
-        best_score = similarities[best_idx]
-        
-        if best_score >= threshold:
-            return {
-                "match": self.index_map[best_idx],
-                "score": float(best_score),
-                "original_query": query
-            }
-        
-        return None
+        candidates = self.match_many([query], k=1, threshold=threshold)[0]
+        return candidates[0] if candidates else None
+
+    def match_many(self, queries, k=5, threshold=0.0):
+        """
+        Top-k matches for every query in one sparse matrix product.
+        With k=1, exact (normalized) name/synonym hits skip the search, and fuzzy
+        results are memoized, so repeated label ingredients are dictionary lookups.
+        Returns one list per query of {"match", "score", "original_query"} dicts,
+        best first (ties go to the earlier DB row), keeping only scores >= threshold.
+        Entries sharing no n-gram with the query (score 0) are never returned.
+        """
+        results = [[] for _ in queries]
+        index = self.index  # one consistent snapshot for the whole call
+        if index is None or not queries:
+            return results
+
+        # 1. Exact name/synonym hits (the best possible match), then memoized fuzzy results
+        pending = {}  # normalized query -> positions still needing the fuzzy search
+        for i, query in enumerate(queries):
+            if not query:
+                continue
+            key = normalize_query(query)
+            exact = index.exact(key) if k == 1 else None
+            if exact is not None:
+                self.exact_hits += 1
+                results[i] = [self._candidate(index, exact, 1.0, query)]
+                continue
+            cached = self.memo.get((key, k, threshold, index.generation))
+            if cached is not None:
+                self.memo_hits += 1
+                results[i] = [self._candidate(index, idx, score, query) for idx, score in cached]
+                continue
+            pending.setdefault(key, []).append(i)
+
+        if not pending:
+            return results
+
+        # 2. Fuzzy search for the rest, one sparse product for all distinct queries
+        keys = list(pending)
+        self.fuzzy_fallbacks += len(keys)
+        similarities = index.similarities(index.vectorizer.transform(keys))
+        tombstones = np.fromiter(index.tombstones, dtype=np.int64, count=len(index.tombstones))
+
+        for row, key in enumerate(keys):
+            start, end = similarities.indptr[row], similarities.indptr[row + 1]
+            scores = similarities.data[start:end]
+            indices = similarities.indices[start:end]
+            keep = scores >= threshold
+            if len(tombstones):
+                keep &= ~np.isin(indices, tombstones)
+            scores, indices = scores[keep], indices[keep]
+
+            if len(scores) > k:
+                # Everything scoring at least the k-th best, so ties are not dropped arbitrarily
+                kth_best = -np.partition(-scores, k - 1)[k - 1]
+                keep = scores >= kth_best
+                scores, indices = scores[keep], indices[keep]
+            order = np.lexsort((indices, -scores))[:k]
+
+            top = [(int(indices[j]), float(scores[j])) for j in order]
+            self.memo.put((key, k, threshold, index.generation), top)
+            for i in pending[key]:
+                results[i] = [self._candidate(index, idx, score, queries[i]) for idx, score in top]
+
+        return results
+
+    def _candidate(self, index, idx, score, query):
+        return {
+            "match": index.entry(idx),
+            "score": score,
+            "original_query": query
+        }
+
+    def stats(self):
+        index = self.index
+        return {
+            "exact_hits": self.exact_hits,
+            "memo_hits": self.memo_hits,
+            "fuzzy_fallbacks": self.fuzzy_fallbacks,
+            "base_rows": index.n_base if index else 0,
+            "delta_rows": index.n_delta if index else 0,
+            "removed_rows": len(index.tombstones) if index else 0,
+            "memo": self.memo.stats()
+        }
+
+def benchmark_startup(db_path="data/ingredients_db.json"):
+    """Times a cold fit (no cache) against a warm start from the cached index."""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        cold = IngredientMatcher(db_path, cache_dir=None)
+        fit_time = time.perf_counter() - start
+
+        IngredientMatcher(db_path, cache_dir=cache_dir)  # writes the cache
+        start = time.perf_counter()
+        warm = IngredientMatcher(db_path, cache_dir=cache_dir)
+        load_time = time.perf_counter() - start
+
+    assert warm.index_source == "cache"
+    print(f"{cold.index.n_base} names, {len(cold.vectorizer.vocabulary_)} n-grams: "
+          f"fit {fit_time * 1000:.1f} ms, cached load {load_time * 1000:.1f} ms")
+    return fit_time, load_time
 
 # Singleton instance for easy import
 matcher = IngredientMatcher()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingredient matcher index tools.")
+    parser.add_argument("--benchmark", action="store_true", help="compare fitting with loading the cached index")
+    parser.add_argument("--db", default="data/ingredients_db.json", help="ingredients DB to benchmark with")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_startup(args.db)
+    else:
+        print(f"Index for {matcher.db_path}: {matcher.index_source} ({matcher._index_path()})")
@@ -0,0 +1,282 @@
+"""
+In-memory search index over the local product catalog (see
+IncidecoderClient.search_local_products).
+
+The catalog is loaded once into posting lists (sorted arrays of product
+positions). A products.json file is reloaded when its mtime or size changes;
+a LocalProductStore log is followed instead, indexing only the products
+appended since the last search:
+
+- word postings: the product's name + brand words (split on whitespace, "-", "(" and ")")
+- chunk postings: the whitespace-separated pieces of "name brand", with a
+  1- to 3-gram index over that (much smaller) vocabulary. A query word is a
+  substring of a product text exactly when it is inside one of its chunks, so
+  substring queries (prefixes while the user is typing, "hydrat" in
+  "hydrating") merge the postings of the matching chunks
+
+Queries keep the original semantics: every query word must either be a word
+of the product or (if longer than 2 chars) a substring of its text, and
+otherwise the whole query as a substring still matches. Results come back
+in file order.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def _intersect(a, b):
+    """Intersection of two sorted arrays of unique ids (binary search of the smaller in the larger)."""
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a):
+        return a
+    idx = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return a[b[idx] == a]
+
+
+def product_text(product):
+    return f"{(product.get('name') or '').lower()} {(product.get('brand') or '').lower()}"
+
+
+def product_words(text):
+    # Replace punctuation that might glue words
+    return set(text.replace("-", " ").replace("(", " ").replace(")", " ").split())
+
+
+class _Snapshot:
+    """One loaded version of the catalog and its postings."""
+
+    def __init__(self, products, stamp):
+        self.stamp = stamp
+        self.products = []
+        self.texts = []
+        self.words = {}
+        self.chunk_list = []
+        self.chunk_ids = {}
+        self.chunks = []
+        self.grams = {}
+        self.all_ids = _EMPTY
+        self.extend(products, stamp)
+
+    def extend(self, products, stamp):
+        """
+        Indexes products appended to the catalog. Products and texts are added before any
+        posting refers to them, so searches running meanwhile stay consistent.
+        """
+        start = len(self.products)
+        texts = [product_text(p) for p in products]
+        self.products.extend(products)
+        self.texts.extend(texts)
+
+        words = {}
+        chunks = {}
+        for i, text in enumerate(texts, start):
+            for word in product_words(text):
+                words.setdefault(word, []).append(i)
+            for chunk in set(text.split()):
+                chunks.setdefault(chunk, []).append(i)
+        # Ids are appended in order (and after every existing id), so every posting list stays sorted
+        for w, ids in words.items():
+            ids = np.array(ids, dtype=np.int32)
+            self.words[w] = ids if w not in self.words else np.concatenate([self.words[w], ids])
+        for chunk, ids in chunks.items():
+            ids = np.array(ids, dtype=np.int32)
+            c = self.chunk_ids.get(chunk)
+            if c is not None:
+                self.chunks[c] = np.concatenate([self.chunks[c], ids])
+                continue
+            # 1- to 3-grams of the (much smaller) chunk vocabulary, for substring lookups
+            c = len(self.chunk_list)
+            self.chunk_list.append(chunk)
+            self.chunks.append(ids)
+            self.chunk_ids[chunk] = c
+            for n in (1, 2, 3):
+                for gram in {chunk[j:j + n] for j in range(len(chunk) - n + 1)}:
+                    self.grams.setdefault(gram, []).append(c)
+        self.all_ids = np.arange(len(self.products), dtype=np.int32)
+        self.stamp = stamp
+
+    def chunks_containing(self, token):
+        """Vocabulary chunks (whitespace-separated pieces of the texts) that contain a token without whitespace."""
+        if len(token) <= 3:
+            return self.grams.get(token, [])
+        postings = []
+        for gram in {token[j:j + 3] for j in range(len(token) - 2)}:
+            posting = self.grams.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return [c for c in candidates if token in self.chunk_list[c]]
+
+    def containing(self, token, within=None, chunk_ids=None):
+        """
+        Ids of the products whose text contains `token` (no whitespace), optionally restricted to `within`.
+        A token without whitespace is inside the text iff it is inside one of its chunks.
+        """
+        if chunk_ids is None:
+            chunk_ids = self.chunks_containing(token)
+        if not chunk_ids:
+            return _EMPTY
+        size = sum(len(self.chunks[c]) for c in chunk_ids)
+        if within is not None and len(within) < size:
+            # Fewer candidates than postings to merge: check the candidates directly
+            texts = self.texts
+            return np.array([i for i in within.tolist() if token in texts[i]], dtype=np.int32)
+        if len(chunk_ids) == 1:
+            ids = self.chunks[chunk_ids[0]]
+        else:
+            ids = np.unique(np.concatenate([self.chunks[c] for c in chunk_ids]))
+        return ids if within is None else _intersect(within, ids)
+
+    def phrase_matches(self, phrase):
+        """Ids of the products whose text contains the whole phrase (which may contain whitespace)."""
+        pieces = phrase.split()
+        texts = self.texts
+        if not pieces:
+            return np.array([i for i, text in enumerate(texts) if phrase in text], dtype=np.int32)
+
+        # Every piece is inside a chunk of a matching text: a piece with whitespace before it
+        # starts its chunk, one with whitespace after it ends it. Narrow down with the most
+        # selective pieces first, then check the phrase itself.
+        plans = []
+        for k, piece in enumerate(pieces):
+            chunk_ids = self.chunks_containing(piece)
+            starts = k > 0 or phrase[0].isspace()
+            ends = k < len(pieces) - 1 or phrase[-1].isspace()
+            if starts or ends:
+                chunk_list = self.chunk_list
+                chunk_ids = [c for c in chunk_ids
+                             if (not starts or chunk_list[c].startswith(piece)) and (not ends or chunk_list[c].endswith(piece))]
+            plans.append((sum(len(self.chunks[c]) for c in chunk_ids), piece, chunk_ids))
+        candidates = None
+        for _, piece, chunk_ids in sorted(plans, key=lambda plan: plan[0]):
+            candidates = self.containing(piece, candidates, chunk_ids)
+            if not len(candidates):
+                return _EMPTY
+        return np.array([i for i in candidates.tolist() if phrase in texts[i]], dtype=np.int32)
+
+    def word_matches(self, token, within=None, chunk_ids=None):
+        """Ids where the query word matches: an exact product word, or a substring if longer than 2 chars."""
+        exact = self.words.get(token, _EMPTY)
+        if within is not None:
+            exact = _intersect(within, exact)
+        if len(token) <= 2:
+            return exact
+        # A product word is also a substring of the text, so the substring matches include the exact ones
+        return self.containing(token, within, chunk_ids)
+
+
+class LocalProductIndex:
+    def __init__(self, source):
+        """`source` is the path of a products.json file or a LocalProductStore."""
+        self.source = source
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.loads = 0
+        self.extends = 0
+        self.last_load_s = 0.0
+
+    def _stamp(self):
+        """(stamp, products) of the current catalog; products is None for a file that was not loaded yet."""
+        if not isinstance(self.source, str):
+            # Generation and products read together, so a compaction cannot land between the stamp and
+            # the products it describes (no cross-process lock: searches never wait for writers)
+            generation, products = self.source.snapshot()
+            return (generation, len(products)), products
+        try:
+            s = os.stat(self.source)
+        except OSError:
+            return None, None
+        return (s.st_mtime_ns, s.st_size), None
+
+    def _load(self, stamp, products):
+        if products is not None:
+            return products[:stamp[1]]
+        if not os.path.exists(self.source):
+            return []
+        with open(self.source, "r") as f:
+            return json.load(f)
+
+    def _current(self):
+        stamp, products = self._stamp()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.stamp == stamp:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.stamp == stamp:
+                return snapshot
+            start = time.perf_counter()
+            if (snapshot is not None and products is not None
+                    and snapshot.stamp[0] == stamp[0] and snapshot.stamp[1] < stamp[1]):
+                # Same log, new lines: index just the appended products
+                snapshot.extend(products[snapshot.stamp[1]:stamp[1]], stamp)
+                self.extends += 1
+            else:
+                self._snapshot = _Snapshot(self._load(stamp, products), stamp)
+                self.loads += 1
+            self.last_load_s = time.perf_counter() - start
+            return self._snapshot
+
+    def search(self, query):
+        """Products matching the query, in file order (the same dicts on every call: do not modify them)."""
+        snapshot = self._current()
+        query_lower = query.lower()
+        query_tokens = query_lower.split()
+
+        # 1. Strict: every query word matches. The words are intersected from the most selective
+        # one (smallest estimated posting size) down, so later words only check a few candidates.
+        plans = []
+        for token in set(query_tokens):
+            if len(token) <= 2:
+                plans.append((len(snapshot.words.get(token, _EMPTY)), token, None))
+            else:
+                chunk_ids = snapshot.chunks_containing(token)
+                plans.append((sum(len(snapshot.chunks[c]) for c in chunk_ids), token, chunk_ids))
+        strict = None
+        for _, token, chunk_ids in sorted(plans, key=lambda plan: plan[0]):
+            strict = snapshot.word_matches(token, strict, chunk_ids)
+            if not len(strict):
+                break
+        if strict is None:
+            strict = snapshot.all_ids
+
+        # 2. Fallback: exact phrase match always wins. When every word is longer than 2 chars,
+        # a phrase match is already a strict match (each word is a substring), so skip it.
+        if query_tokens and all(len(t) > 2 for t in query_tokens):
+            phrase_only = _EMPTY
+        else:
+            phrase_only = np.setdiff1d(snapshot.phrase_matches(query_lower), strict, assume_unique=True)
+
+        if not len(phrase_only):
+            return [snapshot.products[i] for i in strict]
+
+        results = []
+        added_by_text = {}
+        strict_set = set(strict.tolist())
+        for i in np.union1d(strict, phrase_only).tolist():
+            p = snapshot.products[i]
+            # Phrase matches skip products equal to one already returned, as before
+            if i not in strict_set and p in added_by_text.get(snapshot.texts[i], ()):
+                continue
+            results.append(p)
+            added_by_text.setdefault(snapshot.texts[i], []).append(p)
+        return results
+
+    def stats(self):
+        snapshot = self._current()
+        return {
+            "products": len(snapshot.products),
+            "words": len(snapshot.words),
+            "chunks": len(snapshot.chunk_list),
+            "loads": self.loads,
+            "extends": self.extends,
+            "last_load_s": round(self.last_load_s, 3)
+        }
@@ -0,0 +1,226 @@
+"""
+Append-only local product cache (the products scraped from Incidecoder).
+
+Products are stored one JSON object per line in data/products.jsonl. Caching a
+product appends a single line under an exclusive file lock, so several uvicorn
+workers can cache at the same time without losing or tearing entries. A link
+index gives O(1) duplicate checks.
+
+Readers never reload the whole file: refresh() stats the log and parses only
+the lines appended since the last read. Compaction rewrites the log without
+duplicate or unreadable lines (atomically, under the same lock); other
+processes notice the new file and reload it once.
+
+On first use the log is created from the bundled data/products.json (one-time
+migration, the JSON file itself is left untouched).
+
+    python local_product_store.py --compact     # compact the log now
+    python local_product_store.py --stats
+"""
+import argparse
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+PRODUCTS_FILE = os.path.join(DATA_DIR, "products.json")
+PRODUCTS_LOG = os.getenv("PRODUCTS_LOG_PATH", os.path.join(DATA_DIR, "products.jsonl"))
+
+# Compact once this many lines are wasted (duplicates / torn writes) and they are 10%+ of the log
+COMPACT_MIN_WASTE = int(os.getenv("PRODUCTS_LOG_COMPACT_MIN_WASTE", "100"))
+
+
+class _FileLock:
+    """Exclusive flock on a side file (held across processes), plus a thread lock."""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._fd = None
+        self._depth = 0
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+
+class LocalProductStore:
+    def __init__(self, path=PRODUCTS_LOG, seed_path=PRODUCTS_FILE):
+        self.path = path
+        self.seed_path = seed_path
+        self._lock = _FileLock(path + ".lock")
+        self._read_lock = threading.Lock()
+        self.products = []
+        self.links = {}  # link -> position of its first product
+        self.generation = 0  # bumped whenever `products` is rebuilt rather than extended
+        self.wasted_lines = 0
+        self._inode = None
+        self._offset = 0
+
+    # --- Migration ---
+
+    def _migrate(self):
+        """Creates the log from the bundled products.json (once, whichever process gets there first)."""
+        with self._lock:
+            if os.path.exists(self.path):
+                return
+            products = []
+            if self.seed_path and os.path.exists(self.seed_path):
+                try:
+                    with open(self.seed_path, "r") as f:
+                        products = json.load(f)
+                except json.JSONDecodeError as e:
+                    print(f"Could not migrate {self.seed_path}: {e}")
+            self._write_all(products)
+            print(f"Migrated {len(products)} products from {self.seed_path} to {self.path}")
+
+    def _write_all(self, products):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for p in products:
+                f.write(json.dumps(p, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    # --- Reading ---
+
+    def refresh(self):
+        """Picks up lines appended since the last call (or reloads after a compaction). Returns self.products."""
+        return self.snapshot()[1]
+
+    def snapshot(self):
+        """
+        Refreshes and returns (generation, products) read together, so a reload in another thread cannot
+        pair one generation with the other's products. Reloading replaces the list, appends extend it:
+        the first `len(products)` entries of the returned list never change.
+        """
+        if not os.path.exists(self.path):
+            self._migrate()
+        with self._read_lock:
+            st = os.stat(self.path)
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                # New file (first read or compacted elsewhere): start over
+                self.products = []
+                self.links = {}
+                self.wasted_lines = 0
+                self.generation += 1
+                self._inode = st.st_ino
+                self._offset = 0
+            if st.st_size > self._offset:
+                self._read_tail()
+            return self.generation, self.products
+
+    def _read_tail(self):
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Only complete lines: a writer may be halfway through the last one
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                product = json.loads(line)
+            except json.JSONDecodeError:
+                self.wasted_lines += 1
+                continue
+            link = product.get("link")
+            if link in self.links:
+                self.wasted_lines += 1
+            else:
+                self.links[link] = len(self.products)
+            self.products.append(product)
+        self._offset += end
+
+    def unique_products(self):
+        """The cached products, one per link (the first one cached), in log order."""
+        self.refresh()
+        with self._read_lock:
+            return [self.products[i] for i in self.links.values()]
+
+    def __contains__(self, link):
+        self.refresh()
+        return link in self.links
+
+    def __len__(self):
+        return len(self.refresh())
+
+    # --- Writing ---
+
+    def append(self, product):
+        """Caches a product unless one with the same link is already stored. Returns True if it was added."""
+        if not os.path.exists(self.path):
+            self._migrate()
+        with self._lock:
+            # Catch up with other writers while holding the lock, so the duplicate check is exact
+            self.refresh()
+            if product.get("link") in self.links:
+                return False
+            line = json.dumps(product, ensure_ascii=False) + "\n"
+            with open(self.path, "a") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.refresh()
+            if self.wasted_lines >= COMPACT_MIN_WASTE and self.wasted_lines * 10 >= len(self.products):
+                self.compact()
+            return True
+
+    def compact(self):
+        """Rewrites the log without duplicate-link or unreadable lines. Returns the number of lines dropped."""
+        with self._lock:
+            self.refresh()
+            dropped = self.wasted_lines
+            seen = set()
+            kept = []
+            for p in self.products:
+                link = p.get("link")
+                if link not in seen:
+                    seen.add(link)
+                    kept.append(p)
+            self._write_all(kept)
+            self._inode = None  # force a reload from the new file
+            self.refresh()
+            print(f"Compacted {self.path}: {len(kept)} products, {dropped} lines dropped")
+            return dropped
+
+    def stats(self):
+        self.refresh()
+        return {
+            "products": len(self.products),
+            "wasted_lines": self.wasted_lines,
+            "bytes": self._offset,
+            "generation": self.generation
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the append-only local product cache.")
+    parser.add_argument("--path", default=PRODUCTS_LOG)
+    parser.add_argument("--compact", action="store_true", help="rewrite the log without duplicate or torn lines")
+    parser.add_argument("--stats", action="store_true")
+    args = parser.parse_args()
+
+    store = LocalProductStore(args.path)
+    if args.compact:
+        store.compact()
+    print(store.stats())
@@ -1,17 +1,36 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 import os
+import uuid
 from pydantic import BaseModel
 from fetch_ingredients import get_ingredients_from_product
-from toxicity_engine import predict_toxicity
-from ingredient_cleaner import clean_ingredient_list
-from skin_engine import check_skin_type_suitability, check_skin_tone_suitability
-from product_scoring import calculate_product_toxicity
+from toxicity_engine import predict_toxicity, get_inference_stats, warmup as warmup_toxicity_model
+from toxicity_engine import start_backend, shutdown_backend
+from inference_backend import InferenceBackendBusy
+from ingredient_cleaner import clean_ingredient_list, tokenize_ingredients
+from skin_engine import check_skin_type_suitability, check_skin_tone_suitability, skin_suitability_matrix
+from product_scoring import calculate_product_toxicity, calculate_base_score, calculate_usage_grid
+from cache_utils import LRUCache
 from wellness_engine import calculate_wellness_match
+from auth import require_admin
+import http_clients
 
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI()
 
+@app.on_event("startup")
+def load_models():
+    # Models load lazily on the first scan by default (fast cold starts).
+    # Set TOXICITY_WARMUP=1 to pay the load cost at startup instead.
+    if os.getenv("TOXICITY_WARMUP", "0") == "1":
+        print(f"Toxicity model warmed up (version {warmup_toxicity_model()})")
+    start_backend()
+
+@app.on_event("shutdown")
+def stop_models():
+    shutdown_backend()
+    http_clients.close_all()
+
 @app.get("/")
 def health_check():
     return {"status": "ok", "message": "ScanWise API v2 is running"}
@@ -32,6 +51,15 @@ import traceback
 from fastapi import Request
 from fastapi.responses import JSONResponse
 
+@app.exception_handler(InferenceBackendBusy)
+async def inference_busy_handler(request: Request, exc: InferenceBackendBusy):
+    # Back-pressure from the inference worker pool: ask the client to retry shortly
+    return JSONResponse(
+        status_code=503,
+        content={"message": "Server busy, please retry", "details": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     error_msg = f"Global Exception: {exc}\n{traceback.format_exc()}"
@@ -85,6 +113,30 @@ class ProductRequest(BaseModel):
     skin_concerns: Optional[List[str]] = []
     allergies: Optional[List[str]] = []
 
+class RescoreRequest(BaseModel):
+    scan_token: Optional[str] = None # From a previous /scan-product response
+    toxicity_report: Optional[List[dict]] = None # Used when the token has expired (or is from another worker)
+    usage_frequency: str = "Daily"
+    amount_applied: str = "Normal"
+    category: Optional[str] = None
+
+# Toxicity reports of recent scans, so usage/category changes can be rescored without rescanning
+SCAN_TOKEN_CACHE_SIZE = int(os.getenv("SCAN_TOKEN_CACHE_SIZE", "5000"))
+scan_sessions = LRUCache(maxsize=SCAN_TOKEN_CACHE_SIZE)
+
+@app.get("/inference-stats", dependencies=[Depends(require_admin)])
+def inference_stats_endpoint():
+    # Cache hit rates plus batch-size / queue-wait histograms for tuning the batching window
+    from ingredient_matcher import matcher
+    stats = get_inference_stats()
+    stats["ingredient_matcher"] = matcher.stats()
+    return stats
+
+@app.get("/http-stats", dependencies=[Depends(require_admin)])
+def http_stats_endpoint():
+    # Connection reuse and latency of the outbound calls (Incidecoder, OpenBeautyFacts)
+    return http_clients.stats()
+
 @app.get("/search-products")
 def search_products_endpoint(q: str):
     products = search_products(q)
@@ -115,13 +167,13 @@ def scan_product(req: ProductRequest):
     
     if req.ingredients_list:
         # Manual Entry
-        ingredients = [i.strip() for i in req.ingredients_list.split(",")]
+        ingredients = list(tokenize_ingredients(req.ingredients_list, clean=False))
     elif req.barcode:
         # Direct Lookup via Barcode/ID
         from fetch_ingredients import get_product_by_barcode
         product_data = get_product_by_barcode(req.barcode)
         if product_data and product_data.get("ingredients_text"):
-             ingredients = [i.strip() for i in product_data["ingredients_text"].split(",")]
+             ingredients = list(tokenize_ingredients(product_data["ingredients_text"], clean=False))
         else:
              # Fallback to name search if barcode lookup fails or has no ingredients
              ingredients = get_ingredients_from_product(req.product_name)
@@ -169,6 +221,11 @@ def scan_product(req: ProductRequest):
         req.category or "general" # Default to general if None
     )
 
+    # Every usage combination up front, plus a token for /rescore-product
+    usage_grid = calculate_usage_grid(calculate_base_score(toxicity, req.category or "general")) if toxicity else {}
+    scan_token = uuid.uuid4().hex
+    scan_sessions.put(scan_token, {"toxicity_report": toxicity, "category": req.category})
+
     bad_skin_type = check_skin_type_suitability(ingredients, req.skin_type)
     bad_skin_tone = check_skin_tone_suitability(ingredients, req.skin_tone)
 
@@ -236,6 +293,8 @@ def scan_product(req: ProductRequest):
         "product_toxicity_score": product_score,
         "product_status": product_status,
         "detailed_score_breakdown": detailed_score,
+        "scan_token": scan_token,
+        "usage_grid": usage_grid,
         "not_suitable_for_skin_type": bad_skin_type,
         "not_suitable_for_skin_tone": bad_skin_tone,
         "category": req.category,
@@ -243,6 +302,41 @@ def scan_product(req: ProductRequest):
         "efficacy_report": efficacy_report # NEW
     }
 
+@app.post("/rescore-product")
+def rescore_product(req: RescoreRequest):
+    """
+    Re-applies usage and category to an already scored product.
+    Only the weighting is redone: no fetching, cleaning or model inference.
+    """
+    session = scan_sessions.get(req.scan_token) if req.scan_token else None
+    if session is not None:
+        toxicity = session["toxicity_report"]
+        category = req.category or session["category"]
+    elif req.toxicity_report is not None:
+        toxicity = req.toxicity_report
+        category = req.category
+    else:
+        raise HTTPException(status_code=404, detail="Unknown or expired scan token. Send the toxicity_report or rescan.")
+
+    for item in toxicity:
+        if "ingredient" not in item or not isinstance(item.get("score"), (int, float)):
+            raise HTTPException(status_code=422, detail="Each toxicity_report item needs an ingredient and a numeric score.")
+
+    product_score, product_status, detailed_score = calculate_product_toxicity(
+        toxicity,
+        req.usage_frequency,
+        req.amount_applied,
+        category or "general"
+    )
+
+    return {
+        "product_toxicity_score": product_score,
+        "product_status": product_status,
+        "detailed_score_breakdown": detailed_score,
+        "category": category,
+        "usage_grid": calculate_usage_grid(calculate_base_score(toxicity, category or "general")) if toxicity else {}
+    }
+
 @app.get("/test-db")
 def test_db():
     with open("debug.log", "a") as f:
@@ -438,28 +532,11 @@ class RoutineRequest(BaseModel):
 
 @app.post("/analyze-routine")
 def analyze_routine_endpoint(req: RoutineRequest):
-    # 1. Run deterministic rule-based check
-    from routine_engine import check_routine_compatibility
-    
+    # 1. Run deterministic rule-based check (one conflict per product pair)
+    from routine_engine import analyze_routine_conflicts
+
     products_data = [{"name": p.name, "ingredients": p.ingredients} for p in req.products]
-    
-    all_conflicts = []
-    seen_pairs = set()
-    
-    for i, p1 in enumerate(products_data):
-        # Check against all other products
-        others = products_data[:i] + products_data[i+1:]
-        
-        # We can reuse the engine logic: treat p1 as "new product" and others as "current routine"
-        report = check_routine_compatibility(p1['ingredients'], others)
-        
-        for conflict in report['conflicts']:
-            # Avoid duplicates (A vs B and B vs A)
-            p2_name = conflict['with_product']
-            pair = tuple(sorted([p1['name'], p2_name]))
-            if pair not in seen_pairs:
-                seen_pairs.add(pair)
-                all_conflicts.append(conflict)
+    all_conflicts = analyze_routine_conflicts(products_data)
 
     # 2. Pass known conflicts to AI for summary and explanation
     return analyze_routine_with_ai(products_data, rule_based_conflicts=all_conflicts)
@@ -733,13 +810,14 @@ def suggest_products_endpoint(req: ProductSuggestionRequest):
         suitable_products = []
         skin_type = req.skin_report.get("skin_type", "Normal")
         
-        for p in candidates:
-            # Check against skin type logic
-            bad_for_skin = check_skin_type_suitability(p.get("ingredients", []), skin_type)
-            
+        # Check every candidate against skin type logic in one pass
+        suitability = skin_suitability_matrix([p.get("ingredients", []) for p in candidates])
+        suitable_mask = suitability.suitable(skin_type=skin_type)
+
+        for p, is_suitable in zip(candidates, suitable_mask):
             # Use specific heuristics from the new V2 logic if needed
             # For now, just ensure 'bad_for_skin' is empty or manageable
-            if not bad_for_skin:
+            if is_suitable:
                 suitable_products.append({
                     "product_name": p.get("product_name"),
                     "brand": p.get("brand"),
@@ -774,6 +852,11 @@ if __name__ == "__main__":
 
 from incidecoder_client import IncidecoderClient
 
+# Ingredients scraped by /ingredient-details are added to the live matcher (until the next restart),
+# at most this many per process
+SCRAPED_INGREDIENT_LIMIT = int(os.getenv("SCRAPED_INGREDIENT_LIMIT", "1000"))
+scraped_ingredients = set()
+
 @app.get("/ingredient-details/{ingredient_name}")
 async def get_ingredient_details(ingredient_name: str):
     """
@@ -786,6 +869,22 @@ async def get_ingredient_details(ingredient_name: str):
     except Exception:
         pass # Ignore scraper errors, fallback to AI
 
+    canonical_name = details.get("canonical_name") if details else None
+    if (canonical_name and details.get("functions") and canonical_name not in scraped_ingredients
+            and len(scraped_ingredients) < SCRAPED_INGREDIENT_LIMIT):
+        # Make scraped ingredients matchable right away (no matcher rebuild needed), under the
+        # name Incidecoder gives them rather than whatever the caller typed
+        from ingredient_matcher import matcher
+        scraped_ingredients.add(canonical_name)
+        if not matcher.match_many([canonical_name], k=1, threshold=0.99)[0]:
+            matcher.add({
+                "name": canonical_name,
+                "synonyms": [],
+                "functions": details["functions"],
+                "description": details.get("description"),
+                "source": "incidecoder"
+            })
+
     # Check if we need AI (missing data or weak description)
     needs_ai = False
     if not details:
@@ -0,0 +1,167 @@
+"""
+Pure-NumPy evaluator for the exported toxicity ensemble.
+
+export_model.py flattens the pickled VotingClassifier (RBF SVC + random forest
++ LightGBM) and the tfidf/scaler preprocessing into plain arrays in
+model/toxicity_model.npz. This module evaluates them without sklearn or
+LightGBM, and loads with allow_pickle=False, so no arbitrary code is
+unpickled at startup.
+"""
+import json
+import re
+
+import numpy as np
+
+# libsvm clips pairwise probabilities to [min_prob, 1 - min_prob]
+LIBSVM_MIN_PROB = 1e-7
+
+
+def libsvm_binary_coupling(r01):
+    """
+    libsvm's multiclass_probability() for two classes, vectorized over samples.
+    libsvm runs its iterative pairwise-coupling solver even for binary problems
+    and stops at a loose tolerance, so this does not reduce to p0 = r01.
+    Returns the probability of class 0.
+    """
+    k = 2
+    r10 = 1.0 - r01
+    q00 = r10 * r10
+    q11 = r01 * r01
+    q01 = -r10 * r01
+    p0 = np.full_like(r01, 1.0 / k)
+    p1 = np.full_like(r01, 1.0 / k)
+    eps = 0.005 / k
+    active = np.ones(r01.shape, dtype=bool)
+
+    for _ in range(max(100, k)):
+        qp0 = q00 * p0 + q01 * p1
+        qp1 = q01 * p0 + q11 * p1
+        pqp = p0 * qp0 + p1 * qp1
+        max_error = np.maximum(np.abs(qp0 - pqp), np.abs(qp1 - pqp))
+        active &= ~(max_error < eps)
+        if not active.any():
+            break
+
+        # t = 0
+        diff = (-qp0 + pqp) / q00
+        new_p0 = p0 + diff
+        pqp_next = (pqp + diff * (diff * q00 + 2 * qp0)) / (1 + diff) / (1 + diff)
+        qp1_next = (qp1 + diff * q01) / (1 + diff)
+        new_p0 = new_p0 / (1 + diff)
+        new_p1 = p1 / (1 + diff)
+
+        # t = 1
+        diff = (-qp1_next + pqp_next) / q11
+        new_p1 = new_p1 + diff
+        new_p0 = new_p0 / (1 + diff)
+        new_p1 = new_p1 / (1 + diff)
+
+        p0 = np.where(active, new_p0, p0)
+        p1 = np.where(active, new_p1, p1)
+
+    return p0
+
+
+def evaluate_trees(X, roots, feature, threshold, left, right, value, depth):
+    """
+    Evaluates many flattened binary trees at once.
+    Leaves point to themselves, so walking `depth` steps from every root lands on a leaf.
+    Returns an (n_samples, n_trees) array of leaf values.
+    """
+    node = np.broadcast_to(roots, (X.shape[0], len(roots))).copy()
+    rows = np.arange(X.shape[0])[:, None]
+    for _ in range(depth):
+        go_left = X[rows, feature[node]] <= threshold[node]
+        node = np.where(go_left, left[node], right[node])
+    return value[node]
+
+
+class NumpyToxicityModel:
+    def __init__(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {k: data[k] for k in data.files}
+
+        self.meta = json.loads(str(arrays.pop("meta")))
+        self.source_version = self.meta["source_version"]
+
+        # TF-IDF
+        self.vocabulary = {term: int(i) for term, i in zip(arrays["tfidf_terms"], arrays["tfidf_indices"])}
+        self.idf = arrays["tfidf_idf"]
+        self.token_re = re.compile(self.meta["tfidf"]["token_pattern"])
+        self.ngram_range = tuple(self.meta["tfidf"]["ngram_range"])
+        self.lowercase = self.meta["tfidf"]["lowercase"]
+        self.n_text = len(self.idf)
+
+        # Scaler
+        self.scale_mean = arrays["scaler_mean"]
+        self.scale_std = arrays["scaler_scale"]
+
+        # Ensemble
+        self.weights = arrays["voting_weights"]
+        self.svc = {k[4:]: v for k, v in arrays.items() if k.startswith("svc_")}
+        self.forest = {k[7:]: v for k, v in arrays.items() if k.startswith("forest_")}
+        self.gbm = {k[4:]: v for k, v in arrays.items() if k.startswith("gbm_")}
+
+    def _ngrams(self, doc):
+        if self.lowercase:
+            doc = doc.lower()
+        tokens = self.token_re.findall(doc)
+        low, high = self.ngram_range
+        grams = []
+        for n in range(low, high + 1):
+            if n == 1:
+                grams.extend(tokens)
+            else:
+                grams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+    def transform(self, names, numeric_features):
+        """Builds the dense feature matrix (tfidf columns followed by scaled numeric columns)."""
+        X = np.zeros((len(names), self.n_text + len(self.scale_mean)))
+        for row, name in enumerate(names):
+            for gram in self._ngrams(name):
+                idx = self.vocabulary.get(gram)
+                if idx is not None:
+                    X[row, idx] += 1.0
+        text = X[:, :self.n_text]
+        text *= self.idf
+        norms = np.sqrt((text * text).sum(axis=1, keepdims=True))
+        np.divide(text, norms, out=text, where=norms > 0)
+
+        X[:, self.n_text:] = (np.asarray(numeric_features, dtype=float) - self.scale_mean) / self.scale_std
+        return X
+
+    def _svc_proba(self, X):
+        svc = self.svc
+        sv = svc["support_vectors"]
+        # |x - sv|^2 = |x|^2 + |sv|^2 - 2 x.sv: O(n * n_sv) memory instead of an n x n_sv x n_features temporary
+        sq_dist = (X ** 2).sum(axis=1)[:, None] + (sv ** 2).sum(axis=1)[None, :] - 2.0 * (X @ sv.T)
+        np.maximum(sq_dist, 0.0, out=sq_dist)  # rounding can take it slightly below zero
+        kernel = np.exp(-svc["gamma"] * sq_dist)
+        dec = kernel @ svc["dual_coef"] + svc["intercept"]
+        r01 = 1.0 / (1.0 + np.exp(dec * svc["prob_a"] + svc["prob_b"]))
+        r01 = np.clip(r01, LIBSVM_MIN_PROB, 1 - LIBSVM_MIN_PROB)
+        return 1.0 - libsvm_binary_coupling(r01)
+
+    def _forest_proba(self, X):
+        f = self.forest
+        # sklearn trees compare float32 features against float64 thresholds
+        X32 = X.astype(np.float32).astype(np.float64)
+        leaves = evaluate_trees(X32, f["roots"], f["feature"], f["threshold"],
+                                f["left"], f["right"], f["value"], int(f["depth"]))
+        return leaves.mean(axis=1)
+
+    def _gbm_proba(self, X):
+        g = self.gbm
+        leaves = evaluate_trees(X, g["roots"], g["feature"], g["threshold"],
+                                g["left"], g["right"], g["value"], int(g["depth"]))
+        raw = leaves.sum(axis=1)
+        return 1.0 / (1.0 + np.exp(-g["sigmoid"] * raw))
+
+    def predict_proba(self, names, numeric_features):
+        """Probability of the toxic class for each ingredient name."""
+        if not names:
+            return np.zeros(0)
+        X = self.transform(names, numeric_features)
+        probas = np.stack([self._svc_proba(X), self._forest_proba(X), self._gbm_proba(X)])
+        return (self.weights[:, None] * probas).sum(axis=0) / self.weights.sum()
@@ -1,42 +1,68 @@
+import numpy as np
+
+from ingredient_annotator import annotator
+
+# Common "1% line" markers: everything listed after the first of these is usually below 1%
+CONCENTRATION_MARKERS = ["phenoxyethanol", "parfum", "fragrance", "xanthan gum", "carbomer", "disodium edta"]
+annotator.register("concentration_markers", lambda: {"marker": CONCENTRATION_MARKERS})
+
+# Decay rate of the concentration curve above the 1% line
+# 'serum': High actives at top, steep drop.
+# 'cleanser': High water/surfactant at top, very low actives.
+# 'moisturizer' and everything else: Balanced.
+CATEGORY_DECAY_RATES = {"serum": 0.8, "cleanser": 0.7}
+DEFAULT_DECAY_RATE = 0.9
+
+# Weight of ingredients below the 1% line (trace amounts)
+TRACE_WEIGHT = 0.05
+
+FREQUENCY_MULTIPLIERS = {"daily": 1.0, "weekly": 0.5, "occasional": 0.2}
+AMOUNT_MULTIPLIERS = {"pea": 0.5, "normal": 1.0, "generous": 1.5}
+
+TOXIC_THRESHOLD = 0.60
+MODERATE_THRESHOLD = 0.30
+
+
+def is_concentration_marker(ingredient):
+    return annotator.has(ingredient, "concentration_markers", "marker")
+
+def usage_multiplier(usage_frequency="daily", amount_applied="normal"):
+    freq_mult = FREQUENCY_MULTIPLIERS.get(usage_frequency.lower(), 1.0)
+    amount_mult = AMOUNT_MULTIPLIERS.get(amount_applied.lower(), 1.0)
+    return freq_mult * amount_mult
+
+def toxicity_status(final_score):
+    if final_score >= TOXIC_THRESHOLD:
+        return "TOXIC"
+    elif final_score >= MODERATE_THRESHOLD:
+        return "MODERATE"
+    return "SAFE"
+
 def calculate_dynamic_concentration(ingredients_list, product_category="general"):
     """
     Estimates the concentration of each ingredient based on its position and the '1% Line'.
-    
+
     Args:
         ingredients_list (list): List of ingredient names.
         product_category (str): 'cleanser', 'serum', 'moisturizer', etc.
-        
+
     Returns:
         list: List of weights (0.0 to 1.0) corresponding to each ingredient.
     """
     total_ingredients = len(ingredients_list)
     weights = []
-    
+
     # 1. Find the "1% Line" Marker
-    # Common markers: Phenoxyethanol, Parfum, Fragrance, Xanthan Gum, Carbomer
-    markers = ["phenoxyethanol", "parfum", "fragrance", "xanthan gum", "carbomer", "disodium edta"]
     cutoff_index = total_ingredients # Default to end
-    
+
     for idx, ing in enumerate(ingredients_list):
-        if any(m in ing.lower() for m in markers):
+        if is_concentration_marker(ing):
             cutoff_index = idx
             break
-            
+
     # 2. Define Curves based on Category
-    # 'serum': High actives at top, steep drop.
-    # 'cleanser': High water/surfactant at top, very low actives.
-    # 'moisturizer': Balanced.
-    
-    if product_category == "serum":
-        # Steep curve: Top 3 are 80%, rest drop fast
-        decay_rate = 0.8
-    elif product_category == "cleanser":
-        # Very steep: Top 2 are 90%
-        decay_rate = 0.7
-    else:
-        # Standard (Moisturizer/General)
-        decay_rate = 0.9
-        
+    decay_rate = CATEGORY_DECAY_RATES.get(product_category, DEFAULT_DECAY_RATE)
+
     # 3. Calculate Weights
     for i in range(total_ingredients):
         if i < cutoff_index:
@@ -45,54 +71,128 @@ def calculate_dynamic_concentration(ingredients_list, product_category="general"
         else:
             # Below 1% line: Flatline (Trace amounts)
             # Usually < 1%, so we give it a low fixed weight
-            weight = 0.05 
-            
-        weights.append(weight)
-        
-    return weights
+            weight = TRACE_WEIGHT
 
-def calculate_product_toxicity(toxicity_report, usage_frequency="daily", amount_applied="normal", product_category="general"):
-    if len(toxicity_report) == 0:
-        return 0, "SAFE", {}
+        weights.append(weight)
 
-    # 1. Define Multipliers
-    freq_mult = {"daily": 1.0, "weekly": 0.5, "occasional": 0.2}.get(usage_frequency.lower(), 1.0)
-    amount_mult = {"pea": 0.5, "normal": 1.0, "generous": 1.5}.get(amount_applied.lower(), 1.0)
-    
-    usage_factor = freq_mult * amount_mult
+    return weights
 
-    # 2. Advanced Concentration Logic
+def calculate_base_score(toxicity_report, product_category="general"):
+    """Concentration-weighted mean of the ingredient scores, before usage is applied."""
     ingredient_names = [item["ingredient"] for item in toxicity_report]
     weights = calculate_dynamic_concentration(ingredient_names, product_category)
-    
+
     total_weight = 0
     weighted_sum = 0
-    
+
     for idx, item in enumerate(toxicity_report):
         weight = weights[idx]
         score = item["score"]
-        
+
         weighted_sum += score * weight
         total_weight += weight
 
-    base_score = weighted_sum / total_weight if total_weight > 0 else 0
-    
-    # 3. Apply Usage Factor
-    final_score = base_score * usage_factor
-    
-    # Cap at 1.0
-    final_score = min(final_score, 1.0)
+    return weighted_sum / total_weight if total_weight > 0 else 0
 
-    # 4. Determine Status
-    if final_score >= 0.60:
-        status = "TOXIC"
-    elif final_score >= 0.30:
-        status = "MODERATE"
-    else:
-        status = "SAFE"
+def apply_usage(base_score, usage_frequency="daily", amount_applied="normal"):
+    """Applies the usage factor to a base score. Returns (final_score, status, breakdown)."""
+    usage_factor = usage_multiplier(usage_frequency, amount_applied)
 
-    return final_score, status, {
+    # Cap at 1.0
+    final_score = min(base_score * usage_factor, 1.0)
+
+    return final_score, toxicity_status(final_score), {
         "base_score": round(base_score, 3),
         "usage_factor": round(usage_factor, 2),
         "final_score": round(final_score, 3)
     }
+
+def calculate_product_toxicity(toxicity_report, usage_frequency="daily", amount_applied="normal", product_category="general"):
+    if len(toxicity_report) == 0:
+        return 0, "SAFE", {}
+
+    # 1. Advanced Concentration Logic
+    base_score = calculate_base_score(toxicity_report, product_category)
+
+    # 2. Apply Usage Factor and determine status
+    return apply_usage(base_score, usage_frequency, amount_applied)
+
+def calculate_usage_grid(base_score):
+    """
+    Final score and status for every frequency x amount combination, so clients can
+    switch usage settings without rescanning: grid[frequency][amount] = {final_score, status}.
+    """
+    grid = {}
+    for frequency in FREQUENCY_MULTIPLIERS:
+        grid[frequency] = {}
+        for amount in AMOUNT_MULTIPLIERS:
+            final_score, status, _ = apply_usage(base_score, frequency, amount)
+            grid[frequency][amount] = {"final_score": round(final_score, 3), "status": status}
+    return grid
+
+def _per_product(value, n, lookup):
+    """Maps a scalar or per-product sequence of keys through `lookup` into a float array of length n."""
+    if isinstance(value, str):
+        return np.full(n, lookup(value))
+    return np.array([lookup(v) for v in value], dtype=float)
+
+def calculate_product_toxicity_many(scores, offsets, ingredient_names, product_categories="general",
+                                    usage_frequency="daily", amount_applied="normal"):
+    """
+    Batch version of calculate_product_toxicity for many products at once.
+
+    Products are passed as a ragged array: `scores` and `ingredient_names` hold every
+    product's ingredients back to back, and product i owns the slice
+    offsets[i]:offsets[i + 1] (so len(offsets) == n_products + 1).
+    Categories, frequency and amount may be a single string or one per product.
+
+    Returns a dict of arrays: base_score, usage_factor, final_score and status.
+    Products without ingredients score 0 / "SAFE", like the single-product version.
+    """
+    scores = np.asarray(scores, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_products = len(offsets) - 1
+    lengths = np.diff(offsets)
+    starts = offsets[:-1]
+
+    # 1. Per-product parameters
+    decay = _per_product(product_categories, n_products, lambda c: CATEGORY_DECAY_RATES.get(c, DEFAULT_DECAY_RATE))
+    if isinstance(usage_frequency, str) and isinstance(amount_applied, str):
+        usage_factor = np.full(n_products, usage_multiplier(usage_frequency, amount_applied))
+    else:
+        freq = np.broadcast_to(np.array(usage_frequency, dtype=object), (n_products,))
+        amount = np.broadcast_to(np.array(amount_applied, dtype=object), (n_products,))
+        usage_factor = np.array([usage_multiplier(f, a) for f, a in zip(freq, amount)], dtype=float)
+
+    base_score = np.zeros(n_products)
+    result = {"base_score": base_score, "usage_factor": usage_factor}
+    if len(scores):
+        # 2. Position of every ingredient within its product
+        product_idx = np.repeat(np.arange(n_products), lengths)
+        position = np.arange(len(scores)) - starts[product_idx]
+
+        # 3. "1% line": first marker position per product (each distinct name is checked once)
+        distinct = list(set(ingredient_names))
+        marker_names = dict(zip(distinct, annotator.has_many(distinct, "concentration_markers", "marker")))
+        is_marker = np.fromiter(map(marker_names.__getitem__, ingredient_names), dtype=bool, count=len(scores))
+        cutoff = lengths.copy()
+        np.minimum.at(cutoff, product_idx[is_marker], position[is_marker])
+
+        # 4. Decay weights above the line, trace weight below it
+        weights = np.where(position < cutoff[product_idx], decay[product_idx] ** position, TRACE_WEIGHT)
+
+        # 5. Weighted mean per product (reduceat misbehaves on empty slices, so skip those)
+        filled = lengths > 0
+        weighted_sum = np.add.reduceat(scores * weights, starts[filled])
+        total_weight = np.add.reduceat(weights, starts[filled])
+        base_score[filled] = weighted_sum / total_weight
+
+    # 6. Usage factor, cap and status
+    final_score = np.minimum(base_score * usage_factor, 1.0)
+    result["final_score"] = final_score
+    result["status"] = np.select(
+        [final_score >= TOXIC_THRESHOLD, final_score >= MODERATE_THRESHOLD],
+        ["TOXIC", "MODERATE"],
+        default="SAFE"
+    )
+    return result
@@ -0,0 +1,276 @@
+"""
+Rescores every product in the `products` collection with the current model
+and product_scoring weights.
+
+The catalog is streamed in pages (ordered by document id). For each page the
+ingredients of all products are deduplicated and scored in one predict_toxicity
+call, and the new scores are written back in batched commits. Progress is
+checkpointed after every page, so an interrupted run resumes where it stopped.
+
+    python rescore_catalog.py                  # rescore Firestore
+    python rescore_catalog.py --dry-run        # only show what would change
+    python rescore_catalog.py --local          # run against the local product cache in memory (benchmarking)
+
+Set FIRESTORE_EMULATOR_HOST to point the Firestore run at the emulator.
+Scores are stored on the same 0-1 scale scan_product uses, with the default
+usage ("daily", "normal") and the product's category (or "general").
+"""
+import argparse
+import bisect
+import json
+import os
+import time
+
+from toxicity_engine import predict_toxicity, normalize_ingredient_key, get_model_version
+from product_scoring import calculate_product_toxicity_many
+from local_product_store import LocalProductStore, PRODUCTS_LOG
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CHECKPOINT_PATH = os.path.join(BASE_DIR, "rescore_checkpoint.json")
+# The local product cache (data/products.jsonl, seeded from products.json)
+DEFAULT_LOCAL_CATALOG = PRODUCTS_LOG
+
+# Firestore allows 500 writes per batch; stay well under it
+MAX_BATCH_WRITES = 400
+
+# Scores closer than this are not treated as a change
+SCORE_EPSILON = 1e-6
+
+
+class FirestoreCatalog:
+    """Pages through the products collection by document id and writes updates in batches."""
+
+    def __init__(self, db, collection="products"):
+        from firebase_admin import firestore
+        self.db = db
+        self.collection = db.collection(collection)
+        self.id_field = firestore.FieldPath.document_id()
+
+    def read_page(self, page_size, start_after=None):
+        query = self.collection.order_by(self.id_field).limit(page_size)
+        if start_after is not None:
+            query = query.start_after({self.id_field: start_after})
+        return [(doc.id, doc.to_dict()) for doc in query.stream()]
+
+    def write_batch(self, updates):
+        batch = self.db.batch()
+        for doc_id, fields in updates:
+            batch.update(self.collection.document(doc_id), fields)
+        batch.commit()
+
+
+class LocalCatalog:
+    """
+    In-memory stand-in for the products collection, seeded from the local
+    product cache (or any list of product dicts). Documents are shaped like the ones
+    scan_product writes, and updates stay in memory.
+    """
+
+    def __init__(self, products):
+        from ingredient_cleaner import clean_ingredient_list_many
+
+        cleaned = clean_ingredient_list_many([p.get("ingredients", []) for p in products])
+        self.docs = {}
+        for i, p in enumerate(products):
+            doc_id = p.get("barcode") or f"local-{i:06d}"
+            self.docs[doc_id] = {
+                "product_name": p.get("product_name") or p.get("name", ""),
+                "brand": p.get("brand"),
+                "category": p.get("category"),
+                "ingredients": cleaned[i],
+                "toxicity_score": p.get("toxicity_score"),
+                "product_status": p.get("product_status")
+            }
+        self.ids = sorted(self.docs)
+        self.commits = 0
+        self.writes = 0
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_LOCAL_CATALOG, copies=1):
+        """
+        Loads the local product cache (a .jsonl log) or a products JSON file;
+        copies > 1 repeats it to get a benchmark-sized catalog.
+        """
+        if path.endswith(".jsonl"):
+            products = LocalProductStore(path).unique_products()
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                products = json.load(f)
+        return cls(products * copies)
+
+    def read_page(self, page_size, start_after=None):
+        start = 0
+        if start_after is not None:
+            # Same semantics as Firestore's start_after on an ordered id
+            start = bisect.bisect_right(self.ids, start_after)
+        return [(doc_id, dict(self.docs[doc_id])) for doc_id in self.ids[start:start + page_size]]
+
+    def write_batch(self, updates):
+        if len(updates) > MAX_BATCH_WRITES:
+            raise ValueError(f"Batch of {len(updates)} writes exceeds {MAX_BATCH_WRITES}")
+        for doc_id, fields in updates:
+            self.docs[doc_id].update(fields)
+        self.commits += 1
+        self.writes += len(updates)
+
+
+def load_checkpoint(path, model_version):
+    """The saved position, or None if there is none or it belongs to another model version."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("model_version") != model_version:
+        print(f"Ignoring checkpoint from model {checkpoint.get('model_version')} (current: {model_version}).")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def score_page(docs):
+    """
+    Scores one page of (doc_id, data) pairs.
+    Ingredients shared between products are sent to the model once.
+    Returns a list of (doc_id, old_fields, new_fields) and the number of unique ingredients.
+    """
+    unique = {}
+    for _, data in docs:
+        for ing in data.get("ingredients") or []:
+            unique.setdefault(normalize_ingredient_key(ing), ing)
+
+    scored = dict(zip(unique, (r["score"] for r in predict_toxicity(list(unique.values())))))
+
+    # Flatten the page into one ragged array and score every product in one pass
+    names, scores, offsets = [], [], [0]
+    for _, data in docs:
+        for ing in data.get("ingredients") or []:
+            names.append(ing)
+            scores.append(scored[normalize_ingredient_key(ing)])
+        offsets.append(len(names))
+    categories = [data.get("category") or "general" for _, data in docs]
+    batch = calculate_product_toxicity_many(scores, offsets, names, categories)
+
+    results = []
+    for i, (doc_id, data) in enumerate(docs):
+        old = {"toxicity_score": data.get("toxicity_score"), "product_status": data.get("product_status")}
+        new = {"toxicity_score": float(batch["final_score"][i]), "product_status": str(batch["status"][i])}
+        results.append((doc_id, old, new))
+    return results, len(unique)
+
+
+def is_changed(old, new):
+    old_score = old.get("toxicity_score")
+    if not isinstance(old_score, (int, float)):
+        return True
+    return abs(old_score - new["toxicity_score"]) > SCORE_EPSILON or old.get("product_status") != new["product_status"]
+
+
+def rescore_catalog(catalog, page_size=500, checkpoint_path=DEFAULT_CHECKPOINT_PATH,
+                    dry_run=False, restart=False, show_changes=20):
+    """
+    Rescores the whole catalog. Returns a summary dict.
+    In dry-run mode nothing is written (including the checkpoint) and the biggest changes are printed.
+    """
+    model_version = get_model_version()
+    checkpoint = None
+    if not dry_run and not restart:
+        checkpoint = load_checkpoint(checkpoint_path, model_version)
+
+    summary = {
+        "model_version": model_version,
+        "last_doc_id": None,
+        "processed": 0,
+        "changed": 0,
+        "written": 0,
+        "unique_ingredients": 0,
+        "elapsed_s": 0.0
+    }
+    if checkpoint:
+        summary.update({k: checkpoint[k] for k in summary if k in checkpoint})
+        print(f"Resuming after '{summary['last_doc_id']}' ({summary['processed']} products already done).")
+
+    changes = []
+    start = time.perf_counter()
+    prior_elapsed = summary["elapsed_s"]
+
+    while True:
+        # 1. Read the next page
+        docs = catalog.read_page(page_size, summary["last_doc_id"])
+        if not docs:
+            break
+
+        # 2. Score the page in one model call
+        results, n_unique = score_page(docs)
+
+        # 3. Write back only what changed, in batches
+        updates = [(doc_id, new) for doc_id, old, new in results if is_changed(old, new)]
+        if dry_run:
+            changes.extend((doc_id, old, new) for doc_id, old, new in results if is_changed(old, new))
+        else:
+            for i in range(0, len(updates), MAX_BATCH_WRITES):
+                catalog.write_batch(updates[i:i + MAX_BATCH_WRITES])
+            summary["written"] += len(updates)
+
+        # 4. Checkpoint and report
+        summary["processed"] += len(docs)
+        summary["changed"] += len(updates)
+        summary["unique_ingredients"] += n_unique
+        summary["last_doc_id"] = docs[-1][0]
+        summary["elapsed_s"] = prior_elapsed + time.perf_counter() - start
+        if not dry_run and checkpoint_path:
+            save_checkpoint(checkpoint_path, summary)
+
+        rate = summary["processed"] / summary["elapsed_s"] if summary["elapsed_s"] else 0.0
+        print(f"{summary['processed']} products ({len(updates)} changed in this page, "
+              f"{n_unique} unique ingredients) - {rate:.0f} products/s")
+
+    if dry_run:
+        def delta(change):
+            old_score = change[1].get("toxicity_score")
+            return abs(change[2]["toxicity_score"] - old_score) if isinstance(old_score, (int, float)) else float("inf")
+
+        for doc_id, old, new in sorted(changes, key=delta, reverse=True)[:show_changes]:
+            print(f"  {doc_id}: {old.get('toxicity_score')} ({old.get('product_status')}) -> "
+                  f"{new['toxicity_score']:.4f} ({new['product_status']})")
+        print(f"Dry run: {len(changes)} of {summary['processed']} products would change.")
+    elif checkpoint_path and os.path.exists(checkpoint_path):
+        # Finished cleanly, the next run starts from the beginning
+        os.remove(checkpoint_path)
+
+    elapsed = summary["elapsed_s"]
+    summary["products_per_s"] = summary["processed"] / elapsed if elapsed else 0.0
+    print(f"Done: {summary['processed']} products, {summary['changed']} changed, "
+          f"{summary['written']} written in {elapsed:.2f}s ({summary['products_per_s']:.0f} products/s)")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescore every product in the catalog with the current model.")
+    parser.add_argument("--local", nargs="?", const=DEFAULT_LOCAL_CATALOG, metavar="PRODUCTS_FILE",
+                        help="run against an in-memory copy of the local product cache (or a products .json/.jsonl file) instead of Firestore")
+    parser.add_argument("--copies", type=int, default=1, help="repeat the local catalog N times")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="ignore any saved checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="show what would change without writing")
+    parser.add_argument("--show", type=int, default=20, help="number of changes to list in a dry run")
+    args = parser.parse_args()
+
+    if args.local:
+        catalog = LocalCatalog.from_file(args.local, args.copies)
+        checkpoint_path = None  # in-memory writes do not survive a restart
+    else:
+        from firebase_config import get_db
+        db = get_db()
+        if db is None:
+            raise SystemExit("Firestore is not available.")
+        catalog = FirestoreCatalog(db)
+        checkpoint_path = args.checkpoint
+
+    rescore_catalog(catalog, args.page_size, checkpoint_path, args.dry_run, args.restart, args.show)
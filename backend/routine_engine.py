@@ -1,11 +1,15 @@
 import json
 import os
+import threading
+
+from ingredient_annotator import annotator
+from cache_utils import LRUCache
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routine_rules.json")
 
 def load_rules():
     try:
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        file_path = os.path.join(base_path, "data", "routine_rules.json")
-        with open(file_path, "r") as f:
+        with open(RULES_PATH, "r") as f:
             return json.load(f)
     except Exception as e:
         print(f"Error loading routine rules: {e}")
@@ -15,64 +19,189 @@ RULES = load_rules()
 CONFLICT_RULES = RULES.get("conflict_rules", {})
 INGREDIENT_CATEGORIES = RULES.get("ingredient_categories", {})
 
+def _annotation_rules():
+    """Loader for the annotator: re-reads routine_rules.json so edits apply without a restart."""
+    global RULES, CONFLICT_RULES, INGREDIENT_CATEGORIES
+    RULES = load_rules()
+    CONFLICT_RULES = RULES.get("conflict_rules", {})
+    INGREDIENT_CATEGORIES = RULES.get("ingredient_categories", {})
+    # Each category key is its own label, so hits keep the key order of the rules file
+    return {key: [key] for key in INGREDIENT_CATEGORIES}
+
+annotator.register("routine_categories", _annotation_rules, [RULES_PATH])
+
 def get_ingredient_category(ingredient_name):
     """
     Returns the category of an ingredient if it's a known active.
     """
-    norm_name = ingredient_name.lower().strip()
-    for key, category in INGREDIENT_CATEGORIES.items():
-        if key in norm_name:
+    for key in annotator.labels(ingredient_name.strip(), "routine_categories"):
+        category = INGREDIENT_CATEGORIES.get(key)
+        if category:
             return category
     return None
 
+class _CompiledConflicts:
+    """CONFLICT_RULES as category bits and a symmetric conflict matrix (one row mask per category)."""
+
+    def __init__(self, version):
+        self.version = version
+        categories = list(INGREDIENT_CATEGORIES.values()) + list(CONFLICT_RULES)
+        categories += [c for others in CONFLICT_RULES.values() for c in others]
+        self.categories = list(dict.fromkeys(categories))
+        self.bit = {c: 1 << i for i, c in enumerate(self.categories)}
+
+        # A conflict listed in either direction applies both ways
+        self.conflicts = [0] * len(self.categories)
+        for active, others in CONFLICT_RULES.items():
+            for other in others:
+                self.conflicts[self.categories.index(active)] |= self.bit[other]
+                self.conflicts[self.categories.index(other)] |= self.bit[active]
+
+    def conflict_mask(self, actives):
+        """Every category that conflicts with any of the active bits."""
+        mask = 0
+        for i, row in enumerate(self.conflicts):
+            if actives >> i & 1:
+                mask |= row
+        return mask
+
+    def pairs(self, actives, other_actives):
+        """Conflicting (active, other active) category pairs, in rules order."""
+        pairs = []
+        for i, row in enumerate(self.conflicts):
+            if actives >> i & 1 and row & other_actives:
+                hits = row & other_actives
+                for j, other in enumerate(self.categories):
+                    if hits >> j & 1:
+                        pairs.append((self.categories[i], other))
+        return pairs
+
+
+_compiled = None
+_compiled_lock = threading.Lock()
+
+# Active-category bitmask per ingredient list, keyed by (rules version, ingredients)
+ACTIVES_CACHE_SIZE = int(os.getenv("ROUTINE_ACTIVES_CACHE_SIZE", "4096"))
+actives_cache = LRUCache(maxsize=ACTIVES_CACHE_SIZE)
+
+def _compiled_conflicts():
+    global _compiled
+    version = annotator.current_version()  # also picks up edited rule files
+    compiled = _compiled
+    if compiled is None or compiled.version != version:
+        with _compiled_lock:
+            if _compiled is None or _compiled.version != version:
+                _compiled = _CompiledConflicts(version)
+            compiled = _compiled
+    return compiled
+
+def product_actives(ingredients, compiled=None):
+    """Bitmask of the active categories in an ingredient list (bits from the compiled rules)."""
+    compiled = compiled or _compiled_conflicts()
+    key = (compiled.version, tuple(ingredients))
+    mask = actives_cache.get(key)
+    if mask is None:
+        mask = 0
+        for ing in ingredients:
+            cat = get_ingredient_category(ing)
+            if cat:
+                mask |= compiled.bit.get(cat, 0)
+        actives_cache.put(key, mask)
+    return mask
+
+def _product_name(product):
+    return product.get('product_name') or product.get('name') or 'Unknown Product'
+
+def _conflict(active, other, product_name):
+    return {
+        "conflict": f"{active} vs {other}",
+        "with_product": product_name,
+        "description": f"Avoid using {active} (in this product) with {other} (in {product_name}) at the same time to prevent irritation."
+    }
+
+
+class RoutineIndex:
+    """
+    A saved routine with each product's actives computed once, so new products
+    can be checked against it incrementally (one AND per routine product).
+    """
+
+    def __init__(self, products=()):
+        self._compiled = _compiled_conflicts()
+        self.names = []
+        self.ingredients = []
+        self.masks = []
+        for product in products:
+            self.add(_product_name(product), product.get('ingredients', []))
+
+    def _refresh(self):
+        """Recomputes the cached masks if the rules were reloaded since they were built."""
+        compiled = _compiled_conflicts()
+        if compiled is not self._compiled:
+            self._compiled = compiled
+            self.masks = [product_actives(ings, compiled) for ings in self.ingredients]
+        return compiled
+
+    def add(self, product_name, ingredients):
+        compiled = self._refresh()
+        self.names.append(product_name)
+        self.ingredients.append(list(ingredients))
+        self.masks.append(product_actives(ingredients, compiled))
+
+    def remove(self, product_name):
+        if product_name in self.names:
+            i = self.names.index(product_name)
+            del self.names[i], self.ingredients[i], self.masks[i]
+
+    def check(self, new_product_ingredients):
+        """Same report as check_routine_compatibility, against the indexed routine."""
+        compiled = self._refresh()
+        new_actives = product_actives(new_product_ingredients, compiled)
+        if not new_actives:
+            return {"compatible": True, "conflicts": []}
+
+        conflicts = []
+        conflicting = compiled.conflict_mask(new_actives)
+        for name, mask in zip(self.names, self.masks):
+            if conflicting & mask:
+                conflicts.extend(_conflict(a, b, name) for a, b in compiled.pairs(new_actives, mask))
+        return {
+            "compatible": len(conflicts) == 0,
+            "conflicts": conflicts
+        }
+
+    def pairwise_conflicts(self):
+        """
+        Conflicts between the routine's own products, one per conflicting product pair
+        (reported from the earlier product's side).
+        """
+        compiled = self._refresh()
+        conflict_masks = [compiled.conflict_mask(m) for m in self.masks]
+        conflicts = []
+        for i, conflicting in enumerate(conflict_masks):
+            if not conflicting:
+                continue
+            for j in range(i + 1, len(self.masks)):
+                if conflicting & self.masks[j]:
+                    a, b = compiled.pairs(self.masks[i], self.masks[j])[0]
+                    conflicts.append(_conflict(a, b, self.names[j]))
+        return conflicts
+
+
 def check_routine_compatibility(new_product_ingredients, current_routine_products):
     """
     Checks if the new product conflicts with any product in the current routine.
-    
+
     Args:
         new_product_ingredients (list): List of ingredients in the new product.
         current_routine_products (list): List of dicts representing current routine products.
                                          Each dict should have 'product_name' and 'ingredients'.
-                                         
+
     Returns:
         dict: Report containing 'conflicts' (list of warnings) and 'compatible' (bool).
     """
-    conflicts = []
-    
-    # 1. Identify actives in the new product
-    new_actives = set()
-    for ing in new_product_ingredients:
-        cat = get_ingredient_category(ing)
-        if cat:
-            new_actives.add(cat)
-            
-    if not new_actives:
-        return {"compatible": True, "conflicts": []}
-        
-    # 2. Check against each product in the routine
-    for product in current_routine_products:
-        routine_ingredients = product.get('ingredients', [])
-        product_name = product.get('product_name', 'Unknown Product')
-        
-        routine_actives = set()
-        for ing in routine_ingredients:
-            cat = get_ingredient_category(ing)
-            if cat:
-                routine_actives.add(cat)
-        
-        # Check for conflicts between new_actives and routine_actives
-        for new_active in new_actives:
-            if new_active in CONFLICT_RULES:
-                incompatible_list = CONFLICT_RULES[new_active]
-                for routine_active in routine_actives:
-                    if routine_active in incompatible_list:
-                        conflicts.append({
-                            "conflict": f"{new_active} vs {routine_active}",
-                            "with_product": product_name,
-                            "description": f"Avoid using {new_active} (in this product) with {routine_active} (in {product_name}) at the same time to prevent irritation."
-                        })
-                        
-    return {
-        "compatible": len(conflicts) == 0,
-        "conflicts": conflicts
-    }
+    return RoutineIndex(current_routine_products).check(new_product_ingredients)
+
+def analyze_routine_conflicts(products):
+    """All conflicts within a routine, one per conflicting product pair."""
+    return RoutineIndex(products).pairwise_conflicts()
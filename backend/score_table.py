@@ -0,0 +1,174 @@
+"""
+Prebuilt, read-only ingredient score table.
+
+The table is a single binary file:
+    header  (32 bytes): magic, format version, row count, model version
+    hashes  (uint64[count], sorted): 64-bit hash of the normalized ingredient key
+    scores  (float32[count]): toxic-class probability for that key
+
+The API memory-maps it at startup, so every worker process shares the same
+pages and known ingredients are answered with a binary search instead of
+running the model.
+
+Build it with:
+    python score_table.py build
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TABLE_PATH = os.path.join(BASE_DIR, "model", "score_table.bin")
+
+MAGIC = b"SWST"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIQ16s")  # magic, format version, count, model version
+HEADER_SIZE = 32
+
+
+def hash_key(key):
+    """64-bit hash of a normalized ingredient key."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class ScoreTable:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, fmt, count, model_version = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"Not a score table (or unsupported format): {path}")
+
+        self.count = count
+        self.model_version = model_version.decode("ascii").rstrip("\0")
+        if count:
+            self.hashes = np.memmap(path, dtype="<u8", mode="r", offset=HEADER_SIZE, shape=(count,))
+            self.scores = np.memmap(path, dtype="<f4", mode="r", offset=HEADER_SIZE + 8 * count, shape=(count,))
+        else:
+            self.hashes = np.zeros(0, dtype="<u8")
+            self.scores = np.zeros(0, dtype="<f4")
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, keys):
+        """
+        Looks up normalized ingredient keys.
+        Returns a float64 array of scores with NaN where the key is not in the table.
+        """
+        result = np.full(len(keys), np.nan)
+        if not self.count or not keys:
+            return result
+
+        wanted = np.fromiter((hash_key(k) for k in keys), dtype=np.uint64, count=len(keys))
+        idx = np.searchsorted(self.hashes, wanted)
+        idx[idx >= self.count] = self.count - 1
+        found = self.hashes[idx] == wanted
+        result[found] = self.scores[idx[found]]
+        return result
+
+
+def load_score_table(path, model_version):
+    """Memory-maps the table if it exists and was built for the given model version."""
+    if not os.path.exists(path):
+        return None
+    try:
+        table = ScoreTable(path)
+    except (OSError, ValueError) as e:
+        print(f"Warning: could not load score table {path}: {e}")
+        return None
+    if table.model_version != model_version:
+        print(f"Warning: score table {path} was built for model {table.model_version}, "
+              f"current model is {model_version}. Ignoring it.")
+        return None
+    return table
+
+
+def write_score_table(path, keys, scores, model_version):
+    hashes = np.fromiter((hash_key(k) for k in keys), dtype=np.uint64, count=len(keys))
+    scores = np.asarray(scores, dtype="<f4")
+
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order].astype("<u8")
+    scores = scores[order]
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, len(keys), model_version.encode("ascii"))
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(hashes.tobytes())
+        f.write(scores.tobytes())
+    # Atomic swap: workers that already mapped the old file keep their pages.
+    os.replace(tmp_path, path)
+
+
+def collect_ingredient_names(data_dir=None, dataset_path=None):
+    """Every ingredient name we know about: catalog, ingredient DB (names + synonyms) and training set."""
+    from ingredient_cleaner import clean_ingredient
+
+    data_dir = data_dir or os.path.join(BASE_DIR, "data")
+    dataset_path = dataset_path or os.path.join(BASE_DIR, "model", "dataset.csv")
+    names = []
+
+    # The local product cache: the bundled products.json plus everything cached since
+    from local_product_store import LocalProductStore
+    if data_dir == os.path.join(BASE_DIR, "data"):
+        store = LocalProductStore()
+    else:
+        store = LocalProductStore(os.path.join(data_dir, "products.jsonl"), seed_path=os.path.join(data_dir, "products.json"))
+    for product in store.unique_products():
+        for ing in product.get("ingredients", []):
+            names.append(ing)
+            # Scans score the cleaned form, so store that too
+            names.append(clean_ingredient(ing))
+
+    db_path = os.path.join(data_dir, "ingredients_db.json")
+    if os.path.exists(db_path):
+        with open(db_path, "r", encoding="utf-8") as f:
+            for entry in json.load(f):
+                names.append(entry["name"])
+                names.extend(entry.get("synonyms", []))
+
+    if os.path.exists(dataset_path):
+        with open(dataset_path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                names.append(row["ingredient"])
+
+    return names
+
+
+def build_score_table(path=DEFAULT_TABLE_PATH, batch_size=2048):
+    import toxicity_engine
+
+    start = time.time()
+    names = collect_ingredient_names()
+    keys = sorted({toxicity_engine.normalize_ingredient_key(n) for n in names if n and n.strip()})
+    print(f"Scoring {len(keys)} unique ingredients...")
+
+    scores = []
+    for i in range(0, len(keys), batch_size):
+        report = toxicity_engine.predict_toxicity(keys[i:i + batch_size])
+        scores.extend(r["score"] for r in report)
+
+    write_score_table(path, keys, scores, toxicity_engine.get_model_version())
+    size_kb = os.path.getsize(path) / 1024
+    print(f"Wrote {len(keys)} scores ({size_kb:.1f} KB) to {path} in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or inspect the prebuilt ingredient score table.")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--path", default=DEFAULT_TABLE_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_score_table(args.path)
+    else:
+        table = ScoreTable(args.path)
+        print(f"{args.path}: {len(table)} rows, model version {table.model_version}")
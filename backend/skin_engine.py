@@ -1,11 +1,15 @@
 import json
 import os
 
+import numpy as np
+
+from ingredient_annotator import annotator
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "skin_rules.json")
+
 def load_rules():
     try:
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        file_path = os.path.join(base_path, "data", "skin_rules.json")
-        with open(file_path, "r") as f:
+        with open(RULES_PATH, "r") as f:
             return json.load(f)
     except Exception as e:
         print(f"Error loading skin rules: {e}")
@@ -13,16 +17,21 @@ def load_rules():
 
 RULES = load_rules()
 
+def _annotation_rules(section):
+    """Loader for the annotator: re-reads skin_rules.json so edits apply without a restart."""
+    global RULES
+    RULES = load_rules()
+    return RULES.get(section, {})
+
+annotator.register("skin_type", lambda: _annotation_rules("skin_type_rules"), [RULES_PATH])
+annotator.register("skin_tone", lambda: _annotation_rules("skin_tone_rules"), [RULES_PATH])
+
 def check_skin_type_suitability(ingredients, skin_type):
     bad_for_skin = []
     skin_type = skin_type.lower()
-    
-    rules = RULES.get("skin_type_rules", {})
-    bad_list = rules.get(skin_type, [])
 
     for ing in ingredients:
-        ing_l = ing.lower()
-        if any(x in ing_l for x in bad_list):
+        if annotator.has(ing, "skin_type", skin_type):
             bad_for_skin.append(ing)
 
     return list(set(bad_for_skin))
@@ -31,17 +40,87 @@ def check_skin_type_suitability(ingredients, skin_type):
 def check_skin_tone_suitability(ingredients, skin_tone):
     bad_for_tone = []
     skin_tone = skin_tone.lower()
-    
-    rules = RULES.get("skin_tone_rules", {})
-    bad_list = rules.get(skin_tone, [])
 
     for ing in ingredients:
-        ing_l = ing.lower()
-        if any(x in ing_l for x in bad_list):
+        if annotator.has(ing, "skin_tone", skin_tone):
             bad_for_tone.append(ing)
 
     return list(set(bad_for_tone))
 
+
+class SkinSuitability:
+    """
+    Suitability of N products for every skin type and tone at once.
+
+    `matrix` is an N x (len(skin_types) + len(skin_tones)) bool array (True = suitable),
+    with the skin types first. The offending ingredients are only collected on demand.
+    """
+
+    def __init__(self, products, columns, ingredient_hits, offsets):
+        self.products = products
+        self.skin_types = [label for group, label in columns if group == "skin_type"]
+        self.skin_tones = [label for group, label in columns if group == "skin_tone"]
+        self._column = {col: i for i, col in enumerate(columns)}
+        self._ingredient_hits = ingredient_hits
+        self._offsets = offsets
+
+        # A product is unsuitable for a column if any of its ingredients hits it
+        n_products = len(products)
+        lengths = np.diff(offsets)
+        any_hit = np.zeros((n_products, len(columns)), dtype=bool)
+        filled = lengths > 0
+        if filled.any() and len(columns):
+            counts = np.add.reduceat(ingredient_hits.astype(np.int32), offsets[:-1][filled], axis=0)
+            any_hit[filled] = counts > 0
+        self.matrix = ~any_hit
+
+    def _columns_for(self, skin_type=None, skin_tone=None):
+        cols = []
+        if skin_type is not None:
+            cols.append(self._column.get(("skin_type", skin_type.lower())))
+        if skin_tone is not None:
+            cols.append(self._column.get(("skin_tone", skin_tone.lower())))
+        # Types/tones without rules are suitable for everything, like the single-product checks
+        return [c for c in cols if c is not None]
+
+    def suitable(self, skin_type=None, skin_tone=None):
+        """Bool vector over the products: suitable for the given type and/or tone."""
+        cols = self._columns_for(skin_type, skin_tone)
+        if not cols:
+            return np.ones(len(self.products), dtype=bool)
+        return self.matrix[:, cols].all(axis=1)
+
+    def offending(self, index, skin_type=None, skin_tone=None):
+        """Ingredients of product `index` that are bad for the given type and/or tone (deduplicated)."""
+        cols = self._columns_for(skin_type, skin_tone)
+        if not cols:
+            return []
+        start, end = self._offsets[index], self._offsets[index + 1]
+        hits = self._ingredient_hits[start:end][:, cols].any(axis=1)
+        return list(dict.fromkeys(ing for ing, hit in zip(self.products[index], hits) if hit))
+
+
+def skin_suitability_matrix(products):
+    """
+    Checks N ingredient lists against every skin type and tone rule in one pass.
+    Each distinct ingredient is annotated once; an ingredient-by-rule incidence
+    matrix is then reduced per product with NumPy.
+    """
+    products = [list(ingredients or []) for ingredients in products]
+
+    # 1. Distinct ingredients and their rule hits
+    flat = [ing for ingredients in products for ing in ingredients]
+    distinct = list(dict.fromkeys(flat))
+    columns, incidence = annotator.label_matrix(distinct, ["skin_type", "skin_tone"])
+
+    # 2. Rows for every (product, ingredient) occurrence, products back to back
+    row_of = {ing: i for i, ing in enumerate(distinct)}
+    rows = np.fromiter((row_of[ing] for ing in flat), dtype=np.int64, count=len(flat))
+    offsets = np.zeros(len(products) + 1, dtype=np.int64)
+    np.cumsum([len(ingredients) for ingredients in products], out=offsets[1:])
+
+    return SkinSuitability(products, columns, incidence[rows], offsets)
+
 # --- NEW V2 FEATURES ---
 import google.generativeai as genai
 from dotenv import load_dotenv
@@ -1,4 +1,3 @@
-
 import re
 
 SUSPICIOUS_KEYWORDS = [
@@ -9,15 +8,36 @@ SUSPICIOUS_KEYWORDS = [
     "adhesive", "adhesives", "insecticide", "insecticides", "pesticide", "pesticides"
 ]
 
+# All keywords as one whole-word alternation (word boundaries so "Carrot" does not match "car").
+# Longest first, so "motor oil" is reported rather than "motor".
+SUSPICIOUS_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(kw) for kw in sorted(SUSPICIOUS_KEYWORDS, key=len, reverse=True)) + r")\b"
+)
+
+def suspicious_keyword(name: str, category: str = None):
+    """The first suspicious keyword in the product's name and category, or None."""
+    text = (name + " " + (category or "")).lower()
+    m = SUSPICIOUS_RE.search(text)
+    return m.group() if m else None
+
 def detect_suspicious_product(name: str, category: str = None) -> bool:
     """
     Detects if a product is likely non-cosmetic based on its name and category.
     Returns True if suspicious, False otherwise.
     """
-    text = (name + " " + (category or "")).lower()
-    for kw in SUSPICIOUS_KEYWORDS:
-        # Use regex for whole word matching to avoid "Carrot" matching "car"
-        pattern = r'\b' + re.escape(kw) + r'\b'
-        if re.search(pattern, text):
-            return True
-    return False
+    return suspicious_keyword(name, category) is not None
+
+def detect_suspicious_many(names, categories=None):
+    """
+    Batch version of detect_suspicious_product for catalog-wide reclassification.
+    `categories` is None, a single category or one per name.
+    Returns a list of (is_suspicious, matched keyword or None), one per name.
+    """
+    if categories is None or isinstance(categories, str):
+        categories = [categories] * len(names)
+    search = SUSPICIOUS_RE.search
+    results = []
+    for name, category in zip(names, categories):
+        m = search((name + " " + (category or "")).lower())
+        results.append((True, m.group()) if m else (False, None))
+    return results
@@ -0,0 +1,181 @@
+import sys
+import os
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import incidecoder_client
+from incidecoder_client import IncidecoderClient
+from incidecoder_parser import parse_search_results
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "incidecoder")
+
+
+class StubIncidecoder(ThreadingHTTPServer):
+    """
+    Serves the pages in tests/fixtures/incidecoder, with optional per-page delays. They are small
+    hand-written pages that follow Incidecoder's markup (the classes and links the scraper reads),
+    not captures of the live site.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.delays = {}
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real site
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/search":
+            name = "search"
+        elif path.startswith("/ingredients/"):
+            name = "ingredient-" + path.rsplit("/", 1)[-1]
+        else:
+            name = path.rsplit("/", 1)[-1]
+        file_path = os.path.join(FIXTURES, name + ".html")
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delays.get(name, 0))
+            if not os.path.exists(file_path):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            with open(file_path, "rb") as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubIncidecoder()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    site = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(incidecoder_client, "SITE_URL", site)
+    server.site = site
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_search_online_scrapes_fixture_pages(stub):
+    products = IncidecoderClient.search_online("hydrating")
+    # The brand-only result ("CeraVe") is dropped, the ingredient result is never followed
+    assert [p["name"] for p in products] == [
+        "CeraVe Hydrating Facial Cleanser",
+        "The Ordinary Niacinamide 10% + Zinc 1%",
+        "La Roche-Posay Toleriane Double Repair Face Moisturizer"
+    ]
+    cleanser, niacinamide, moisturizer = products
+    assert cleanser["brand"] == "CeraVe"
+    assert cleanser["link"] == f"{stub.site}/products/cerave-hydrating-facial-cleanser"
+    assert cleanser["image"] == f"{stub.site}/images/cerave-hydrating-facial-cleanser.jpg"
+    assert cleanser["ingredients"] == ["Aqua", "Glycerin", "Cetearyl Alcohol", "Ceramide NP", "Sodium Hyaluronate"]
+    assert niacinamide["image"] == "https://incidecoder-content.storage.googleapis.com/ordinary-niacinamide.jpg"
+    assert niacinamide["ingredients"][-1] == "Phenoxyethanol"
+    assert moisturizer["brand"] == "La Roche-Posay"
+    assert moisturizer["image"] is None
+
+    # Same results as fetching the pages one after another
+    with open(os.path.join(FIXTURES, "search.html")) as f:
+        search_html = f.read()
+    sequential = []
+    for name, url in parse_search_results(search_html, 5, stub.site):
+        product = IncidecoderClient._build_product(name, url, IncidecoderClient._fetch_product_page_details(url))
+        if product:
+            sequential.append(product)
+    assert products == sequential
+    assert IncidecoderClient.search_online("hydrating", limit=1) == products[:1]
+
+
+def test_product_pages_fetched_concurrently_within_host_limit(stub, monkeypatch):
+    monkeypatch.setattr(incidecoder_client, "SCRAPE_PER_HOST", 2)
+    for name in ("cerave-hydrating-facial-cleanser", "the-ordinary-niacinamide-10-zinc-1", "cerave",
+                 "la-roche-posay-toleriane-double-repair"):
+        stub.delays[name] = 0.3
+    start = time.perf_counter()
+    products = IncidecoderClient.search_online("hydrating")
+    elapsed = time.perf_counter() - start
+    assert len(products) == 3
+    assert stub.max_active == 2
+    assert elapsed < 4 * 0.3
+
+
+def test_deadline_returns_finished_pages(stub):
+    stub.delays["the-ordinary-niacinamide-10-zinc-1"] = 3
+
+    async def search():
+        return await IncidecoderClient.search_online_async("hydrating", deadline=0.8)
+
+    start = time.perf_counter()
+    products = asyncio.run(search())
+    assert time.perf_counter() - start < 2
+    assert [p["brand"] for p in products] == ["CeraVe", "La Roche-Posay"]
+
+
+def test_sync_wrapper_inside_running_loop(stub):
+    async def handler():
+        # e.g. a sync helper called from an async endpoint
+        return IncidecoderClient.search_online("hydrating", limit=2)
+
+    assert [p["brand"] for p in asyncio.run(handler())] == ["CeraVe", "The Ordinary"]
+
+
+def test_requests_reuse_pooled_connections(stub):
+    import http_clients
+    before = http_clients.stats()["upstreams"]["incidecoder"]
+    IncidecoderClient.search_online("hydrating")
+    IncidecoderClient.search_online("hydrating")
+    for name in ("cerave-hydrating-facial-cleanser", "cerave"):
+        IncidecoderClient._fetch_product_page_details(f"{stub.site}/products/{name}")
+    after = http_clients.stats()["upstreams"]["incidecoder"]
+
+    responses = after["responses"] - before["responses"]
+    new_connections = after["new_connections"] - before["new_connections"]
+    assert responses == 2 * 5 + 2
+    # At most one connection per concurrent page on the async pool, one on the sync pool
+    assert new_connections <= incidecoder_client.SCRAPE_PER_HOST + 1
+    assert after["latency_ms_p50"] is not None
+
+
+def test_ingredient_details_follow_site_url(stub):
+    details = IncidecoderClient.fetch_ingredient_details("Niacinamide")
+    assert details["functions"] == ["cell-communicating ingredient", "skin brightening", "anti-acne"]
+    assert IncidecoderClient.fetch_ingredient_details("Not An Ingredient") is None
+
+
+def test_http_stats_require_admin(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    monkeypatch.setenv("ADMIN_PASSWORD", "s3cret")
+    client = TestClient(main.app)
+    assert client.get("/http-stats", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    response = client.get("/http-stats", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert "incidecoder" in response.json()["upstreams"]
@@ -0,0 +1,55 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from incidecoder_parser import parse_search_results, parse_product_page, parse_ingredient_page
+
+# Synthetic pages written to follow Incidecoder's markup (not captures of the live site)
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "incidecoder")
+SITE = "https://incidecoder.com"
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def test_strained_extraction_matches_full_parse_on_fixture_pages():
+    for name in sorted(os.listdir(FIXTURES)):
+        html = read_fixture(name)
+        if name.startswith("search"):
+            for limit in (1, 3, 10):
+                assert parse_search_results(html, limit, SITE) == parse_search_results(html, limit, SITE, strain=False)
+        elif name.startswith("ingredient-"):
+            assert parse_ingredient_page(html, "Niacinamide") == parse_ingredient_page(html, "Niacinamide", strain=False)
+        else:
+            assert parse_product_page(html, SITE) == parse_product_page(html, SITE, strain=False), name
+
+
+def test_product_page_regions():
+    html = """
+    <div id="nav"><a href="/brands/featured">Featured Brand</a></div>
+    <div class="content">
+      <div class="kbox"><p><a class="ingred-link" href="/ingredients/glycerin">Glycerin</a></p></div>
+      <ul><li><a class="ingred-link" href="/ingredients/aqua">Aqua</a></li>
+          <li><a class="ingred-link" href="/ingredients/glycerin"><b>Glyc</b>erin &amp; co</a></li>
+          <li><a class="ingred-link" href="/products/other">Other Product</a></li></ul>
+      <picture><source srcset="/x.webp"><img src="/images/main.jpg"></picture>
+    </div>
+    """
+    expected = {"image": f"{SITE}/images/main.jpg", "brand": "Featured Brand", "ingredients": ["Aqua", "Glycerin & co"]}
+    assert parse_product_page(html, SITE) == expected
+    assert parse_product_page(html, SITE, strain=False) == expected
+    # Nothing to find
+    assert parse_product_page("<p>Not found</p>", SITE) == {"image": None, "brand": "Unknown", "ingredients": []}
+
+
+def test_ingredient_page_fields():
+    data = parse_ingredient_page(read_fixture("ingredient-niacinamide.html"), "Niacinamide")
+    assert data["canonical_name"] == "Niacinamide"
+    assert data["description"].startswith("Niacinamide is avitamin B3derivative")
+    assert data["functions"] == ["cell-communicating ingredient", "skin brightening", "anti-acne"]
+    assert data["quick_facts"][0] == "Amulti-functionalskincare superstar withbrighteningeffects"
+    assert data["quick_facts"][-1] == "Irritancy/Comedogenicity: Irritancy: 0, Comedogenicity: 0"
+    assert len(data["quick_facts"]) == 4
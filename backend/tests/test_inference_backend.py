@@ -0,0 +1,78 @@
+import sys
+import os
+import pytest
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_backend import InProcessBackend, ProcessPoolBackend, InferenceBackendBusy, create_backend
+
+
+def test_create_backend_defaults_to_in_process(monkeypatch):
+    monkeypatch.delenv("INFERENCE_BACKEND", raising=False)
+    backend = create_backend(lambda names: [0.5] * len(names))
+    assert isinstance(backend, InProcessBackend)
+    assert backend.predict(["water", "glycerin"]) == [0.5, 0.5]
+
+
+def test_process_backend_rejects_when_queue_is_full():
+    backend = ProcessPoolBackend(lambda names: [0.0] * len(names), workers=1, max_pending=1, queue_timeout=0.01)
+    # Hold the only slot, as a long-running model call would
+    backend._slots.acquire()
+    try:
+        with pytest.raises(InferenceBackendBusy):
+            backend.predict(["water"])
+    finally:
+        backend._slots.release()
+    assert backend.stats()["rejected"] == 1
+
+
+def test_broken_pool_falls_back_to_in_process():
+    backend = ProcessPoolBackend(lambda names: [0.25] * len(names), workers=1)
+    backend.broken = True
+    assert backend.predict(["water"]) == [0.25]
+    assert backend.stats()["fallbacks"] == 1
+
+
+def test_worker_timeout_is_reported_as_busy():
+    from concurrent.futures import Future
+
+    class StuckExecutor:
+        def __init__(self):
+            self.futures = []
+
+        def submit(self, fn, *args):
+            future = Future()
+            future.set_running_or_notify_cancel()  # picked up by a worker that never answers
+            self.futures.append(future)
+            return future
+
+    backend = ProcessPoolBackend(lambda names: [0.0] * len(names), workers=1, max_pending=1,
+                                 queue_timeout=0.01, timeout=0.01)
+    backend._executor = StuckExecutor()
+    with pytest.raises(InferenceBackendBusy):
+        backend.predict(["water"])
+    assert backend.stats()["timeouts"] == 1
+    # The task is still running in its worker, so its slot is still taken
+    with pytest.raises(InferenceBackendBusy):
+        backend.predict(["water"])
+    assert backend.stats()["rejected"] == 1
+    # ...until it finishes
+    backend._executor.futures[0].set_result([0.0])
+    assert backend._slots.acquire(timeout=0)
+
+
+def test_inference_stats_require_admin(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    monkeypatch.delenv("ADMIN_PASSWORD", raising=False)
+    assert client.get("/inference-stats", headers={"Authorization": "Bearer anything"}).status_code == 403
+
+    monkeypatch.setenv("ADMIN_PASSWORD", "s3cret")
+    assert client.get("/inference-stats").status_code in (401, 403)
+    assert client.get("/inference-stats", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    response = client.get("/inference-stats", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert "ingredient_matcher" in response.json()
@@ -0,0 +1,45 @@
+import sys
+import os
+import threading
+
+# Add backend directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_scheduler import MicroBatcher
+
+def test_each_caller_gets_its_own_slice():
+    calls = []
+
+    def run_batch(rows):
+        calls.append(list(rows))
+        return [r.upper() for r in rows]
+
+    batcher = MicroBatcher(run_batch, window_ms=20, max_rows=512)
+    results = {}
+
+    def worker(i):
+        results[i] = batcher.submit([f"ing{i}", "water"])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for i in range(8):
+        assert results[i] == [f"ING{i}", "WATER"]
+    # Rows were coalesced into fewer model calls, with shared rows sent once
+    assert len(calls) < 8
+    assert sum(batch.count("water") for batch in calls) == len(calls)
+
+def test_errors_reach_every_caller():
+    def run_batch(rows):
+        raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(run_batch, window_ms=1)
+    try:
+        batcher.submit(["water"])
+        assert False, "expected the model error to propagate"
+    except RuntimeError as e:
+        assert "model failed" in str(e)
+    assert batcher.stats()["batch_rows"]["count"] == 1
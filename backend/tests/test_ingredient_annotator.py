@@ -0,0 +1,56 @@
+import sys
+import os
+import json
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingredient_annotator
+from ingredient_annotator import IngredientAnnotator, KeywordAutomaton
+
+
+def test_automaton_matches_substring_search():
+    rng = random.Random(0)
+    alphabet = "abc "
+    for _ in range(500):
+        keywords = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))}
+        masks = {k: 1 << i for i, k in enumerate(keywords)}
+        automaton = KeywordAutomaton(masks)
+        for _ in range(20):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+            assert automaton.scan(text) == sum(m for k, m in masks.items() if k in text)
+
+
+def test_labels_keep_group_order():
+    annotator = IngredientAnnotator()
+    annotator.register("heroes", lambda: {"retinol": ["retinol"], "retinyl palmitate": ["retinyl palmitate"],
+                                         "acid": ["acid"]})
+    annotator.register("other", lambda: {"acid": ["acid"]})
+    assert annotator.labels("Retinyl Palmitate / Retinol", "heroes") == ["retinol", "retinyl palmitate"]
+    assert annotator.labels("Hyaluronic ACID", "heroes") == ["acid"]
+    assert annotator.has("Hyaluronic ACID", "other", "acid")
+    assert not annotator.has("Water", "other", "acid")
+    assert not annotator.has("Hyaluronic ACID", "other", "missing-label")
+    assert annotator.has_many(["Water", "Salicylic Acid"], "other", "acid") == [False, True]
+
+
+def test_rules_file_change_rebuilds(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingredient_annotator, "RULES_CHECK_INTERVAL", 0)
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"oily": ["mineral oil"]}))
+
+    def load():
+        with open(path) as f:
+            return json.load(f)
+
+    annotator = IngredientAnnotator()
+    annotator.register("skin_type", load, [str(path)])
+    assert not annotator.has("Coconut Oil", "skin_type", "oily")
+    version = annotator.stats()["version"]
+
+    path.write_text(json.dumps({"oily": ["mineral oil", "coconut oil"]}))
+    os.utime(path, ns=(0, 1))  # make sure the mtime changes even on coarse clocks
+    assert annotator.has("Coconut Oil", "skin_type", "oily")
+    assert annotator.stats()["version"] == version + 1
+
+    assert annotator.reload_rules() == version + 2
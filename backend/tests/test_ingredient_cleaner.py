@@ -0,0 +1,51 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingredient_cleaner import clean_ingredient, clean_ingredient_list, clean_ingredient_list_many, tokenize_ingredients
+
+
+def test_clean_ingredient_rules():
+    assert clean_ingredient("  Water/Eau ") == "Water"
+    assert clean_ingredient("Glycerin Directions: apply daily") == "Glycerin"
+    assert clean_ingredient("Apply to clean skin and rinse well") == ""
+    assert clean_ingredient("Made in Germany") == ""
+    assert clean_ingredient("Niacinamide 12AB http://example.com/x") == "Niacinamide"
+    assert clean_ingredient("Store-cool Aqua") == "Aqua"
+    # OCR fixes only apply at the start of a word, so an already correct "Hydroxide" is left alone
+    assert clean_ingredient("Sodium ydroxide") == "Sodium hydroxide"
+    assert clean_ingredient("Sodium Hydroxide") == "Sodium Hydroxide"
+    assert clean_ingredient("Potassium hydroxide") == "Potassium hydroxide"
+    assert clean_ingredient("Glyceryl Searate") == "Glyceryl Stearate"
+    assert clean_ingredient("Orange Feel Oil") == "Orange Peel Oil"
+
+
+def test_batch_matches_per_list_cleaning():
+    lists = [
+        ["Water/Eau", "Glycerin", "Parfum", "Lot 12AB", "ab"],
+        [],
+        ["Glycerin", "Sodium ydroxide", "Caution: avoid contact with eyes"]
+    ]
+    assert clean_ingredient_list_many(lists) == [clean_ingredient_list(lst) for lst in lists]
+
+
+def test_tokenizer_handles_names_brackets_and_sections():
+    text = ("Ingredients: Aqua (Water/Eau), Mineral Oil/​Huile Minérale, 1,2-Hexanediol, "
+            "Colorants (CI 77491, CI 77492), Sodium ydroxide. [+/- CI 77891, Mica]")
+    assert list(tokenize_ingredients(text)) == [
+        "Aqua (Water)", "Mineral Oil", "1,2-Hexanediol", "Colorants (CI 77491, CI 77492)",
+        "Sodium hydroxide", "CI 77891", "Mica"
+    ]
+    assert list(tokenize_ingredients("Water, Glycerin, May Contain: Mica, Titanium Dioxide")) == \
+        ["Water", "Glycerin", "Mica", "Titanium Dioxide"]
+
+
+def test_tokenizer_unclosed_bracket_and_laziness():
+    # An unclosed bracket falls back to the separators inside it
+    assert list(tokenize_ingredients("Water, Glycerin (and, Parfum, Linalool")) == \
+        ["Water", "Glycerin (and", "Parfum", "Linalool"]
+
+    tokens = tokenize_ingredients("Water, Glycerin, " + "x" * 10)
+    assert next(tokens) == "Water"
+    assert list(tokenize_ingredients("Water; ydroxide, , ", clean=False)) == ["Water", "ydroxide"]
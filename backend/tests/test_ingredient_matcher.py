@@ -0,0 +1,122 @@
+import sys
+import os
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingredient_matcher import matcher
+
+
+def test_match_many_returns_ranked_top_k():
+    results = matcher.match_many(["Aqua", "Niacinamide", ""], k=3)
+    assert results[0][0]["match"]["name"] == "Water"
+    assert results[1][0]["match"]["name"] == "Niacinamide"
+    assert results[1][0]["score"] >= 0.99
+    assert results[2] == []
+    for candidates in results[:2]:
+        assert 1 <= len(candidates) <= 3
+        scores = [c["score"] for c in candidates]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_match_agrees_with_match_many():
+    for query in ["Purified Water", "Retinyl Palmitate", "Glycerine", "xyz"]:
+        single = matcher.match(query)
+        batch = matcher.match_many([query], k=1, threshold=0.6)[0]
+        assert (single is None) == (batch == [])
+        if single:
+            assert single["match"] is batch[0]["match"]
+
+
+def test_exact_and_memoized_matches_are_counted():
+    stats = matcher.stats()
+    exact = matcher.match("  AQUA ")
+    assert exact["match"]["name"] == "Water"
+    assert matcher.stats()["exact_hits"] == stats["exact_hits"] + 1
+
+    first = matcher.match("Niacinamide 5% Solution")
+    second = matcher.match("niacinamide  5% solution")
+    assert matcher.stats()["memo_hits"] >= stats["memo_hits"] + 1
+    assert (first is None and second is None) or first["match"] is second["match"]
+
+
+def test_index_is_reused_until_the_db_changes(tmp_path):
+    import json
+    from ingredient_matcher import IngredientMatcher
+
+    db = [{"name": "Water", "synonyms": ["Aqua"]}, {"name": "Glycerin", "synonyms": ["Glycerol"]},
+          {"name": "Sodium Hyaluronate", "synonyms": []}]
+    db_path = tmp_path / "db.json"
+    db_path.write_text(json.dumps(db))
+    cache_dir = str(tmp_path / "cache")
+
+    fitted = IngredientMatcher(str(db_path), cache_dir=cache_dir)
+    cached = IngredientMatcher(str(db_path), cache_dir=cache_dir)
+    assert (fitted.index_source, cached.index_source) == ("fit", "cache")
+
+    queries = ["glycerine", "hyaluronic", "aqua purificata"]
+    for a, b in zip(fitted.match_many(queries, k=2), cached.match_many(queries, k=2)):
+        assert [(c["match"]["name"], round(c["score"], 12)) for c in a] == \
+               [(c["match"]["name"], round(c["score"], 12)) for c in b]
+
+    db.append({"name": "Niacinamide", "synonyms": []})
+    db_path.write_text(json.dumps(db))
+    changed = IngredientMatcher(str(db_path), cache_dir=cache_dir)
+    assert changed.index_source == "fit"
+    assert changed.fingerprint != fitted.fingerprint
+
+
+def test_add_remove_and_compact_without_refitting(tmp_path):
+    import json
+    from ingredient_matcher import IngredientMatcher
+
+    db = [{"name": "Water", "synonyms": ["Aqua"]}, {"name": "Glycerin", "synonyms": []},
+          {"name": "Salicylic Acid", "synonyms": ["BHA"]}]
+    db_path = tmp_path / "db.json"
+    db_path.write_text(json.dumps(db))
+    m = IngredientMatcher(str(db_path), cache_dir=None)
+    vectorizer = m.vectorizer
+    before = m.index
+
+    m.add({"name": "Salicylate Ester", "synonyms": ["Methyl Salicylate"], "functions": ["Fragrance"]})
+    assert m.vectorizer is vectorizer  # frozen vocabulary, no refit
+    assert before.n_delta == 0  # readers holding the old snapshot are unaffected
+    assert m.match("methyl salicylate")["match"]["name"] == "Salicylate Ester"
+
+    assert m.remove("salicylic acid")
+    assert not m.remove("salicylic acid")
+    assert m.match("BHA", threshold=0.99) is None
+    top = m.match_many(["salicylic acid"], k=3)[0]
+    assert all(c["match"]["name"] != "Salicylic Acid" for c in top)
+
+    m.compact()
+    assert m.stats()["delta_rows"] == 0
+    assert sorted(e["name"] for e in m.index.live_entries()) == ["Glycerin", "Salicylate Ester", "Water"]
+    assert m.match("methyl salicylate")["match"]["name"] == "Salicylate Ester"
+
+
+def test_ingredient_details_adds_only_canonical_scraped_names(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    from incidecoder_client import IncidecoderClient
+
+    pages = {"bakuchiol-typo": {"name": "bakuchiol-typo", "canonical_name": "Bakuchiol Test Extract",
+                                "description": "A plant-based retinol alternative.", "functions": ["antioxidant"],
+                                "quick_facts": []}}
+    monkeypatch.setattr(IncidecoderClient, "fetch_ingredient_details", staticmethod(lambda name: pages.get(name)))
+    monkeypatch.setattr(main, "explain_ingredient_with_ai", lambda name: {"error": "offline"})
+    monkeypatch.setattr(main, "scraped_ingredients", set())
+    added = []
+    monkeypatch.setattr(matcher, "add", added.append)
+
+    client = TestClient(main.app)
+    assert client.get("/ingredient-details/bakuchiol-typo").status_code == 200
+    assert client.get("/ingredient-details/bakuchiol-typo").status_code == 200
+    assert client.get("/ingredient-details/zzqx junk").status_code == 200
+    # Only the scraped page's own name, once; failed lookups add nothing
+    assert [entry["name"] for entry in added] == ["Bakuchiol Test Extract"]
+
+    monkeypatch.setattr(main, "SCRAPED_INGREDIENT_LIMIT", 1)
+    pages["retinal"] = dict(pages["bakuchiol-typo"], canonical_name="Retinal Test")
+    client.get("/ingredient-details/retinal")
+    assert len(added) == 1
@@ -0,0 +1,67 @@
+import sys
+import os
+import json
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_product_index import LocalProductIndex
+
+WORDS = ["hydrating", "serum", "gel-cream", "(mini)", "la", "roche", "posay", "niacinamide", "10%", "zinc",
+         "toleriane", "double", "repair", "moisturizer", "a", "ordinary", "the", "cerave", "se"]
+
+
+def linear_search(products, query):
+    """The original scan over every product, as the reference semantics."""
+    query_lower = query.lower()
+    query_tokens = query_lower.split()
+    results = []
+    for p in products:
+        full_text = f"{p.get('name', '').lower()} {p.get('brand', '').lower()}"
+        text_tokens = set(full_text.replace("-", " ").replace("(", " ").replace(")", " ").split())
+        matches = 0
+        for token in query_tokens:
+            if token in text_tokens:
+                matches += 1
+            elif len(token) > 2 and token in full_text:
+                matches += 1
+        if matches == len(query_tokens):
+            results.append(p)
+        elif query_lower in full_text and p not in results:
+            results.append(p)
+    return results
+
+
+def make_catalog(tmp_path, n=400, seed=0):
+    rng = random.Random(seed)
+    products = [{"name": " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 5))),
+                 "brand": rng.choice(["CeraVe", "The Ordinary", "La Roche-Posay", ""]),
+                 "link": f"https://example.com/{i}"} for i in range(n)]
+    products.append(dict(products[0]))  # duplicate entry
+    path = tmp_path / "products.json"
+    path.write_text(json.dumps(products))
+    return products, str(path)
+
+
+def test_index_matches_linear_search(tmp_path):
+    products, path = make_catalog(tmp_path)
+    index = LocalProductIndex(path)
+    rng = random.Random(1)
+    queries = ["", " ", "a", "se", "serum", "hydra", "gel cream", "gel-cream", "(mini)", "la roche", "la", "zinc 10%",
+               "ser um", " rum", "posay ", "the ordinary serum", "xyz", "e r"]
+    queries += [" ".join(rng.choice(WORDS)[:rng.randint(1, 6)] for _ in range(rng.randint(1, 3))) for _ in range(100)]
+    for query in queries:
+        expected = [p["link"] for p in linear_search(products, query)]
+        assert [p["link"] for p in index.search(query)] == expected, query
+
+
+def test_index_reloads_when_file_changes(tmp_path):
+    products, path = make_catalog(tmp_path, n=20)
+    index = LocalProductIndex(path)
+    assert index.search("brand new toner") == []
+
+    products.append({"name": "Brand New Toner", "brand": "Test", "link": "https://example.com/new"})
+    with open(path, "w") as f:
+        json.dump(products, f)
+    assert [p["link"] for p in index.search("brand new toner")] == ["https://example.com/new"]
+    assert index.stats()["loads"] == 2
@@ -0,0 +1,125 @@
+import sys
+import os
+import json
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_product_store import LocalProductStore
+from local_product_index import LocalProductIndex
+
+
+def make_store(tmp_path, n=3):
+    seed = [{"name": f"Seed Serum {i}", "brand": "Test", "link": f"https://example.com/{i}"} for i in range(n)]
+    seed_path = tmp_path / "products.json"
+    seed_path.write_text(json.dumps(seed, indent=4))
+    return LocalProductStore(str(tmp_path / "products.jsonl"), seed_path=str(seed_path)), seed
+
+
+def test_migrates_seed_once(tmp_path):
+    store, seed = make_store(tmp_path)
+    assert store.refresh() == seed
+    lines = (tmp_path / "products.jsonl").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == seed
+
+    # The log is the source of truth from now on
+    (tmp_path / "products.json").write_text("[]")
+    assert len(LocalProductStore(store.path, seed_path=store.seed_path)) == len(seed)
+
+
+def test_append_dedupes_by_link(tmp_path):
+    store, seed = make_store(tmp_path)
+    assert not store.append(dict(seed[0]))
+    assert store.append({"name": "New Toner", "brand": "Test", "link": "https://example.com/new"})
+    assert not store.append({"name": "New Toner again", "brand": "Test", "link": "https://example.com/new"})
+    assert len(store) == len(seed) + 1
+    assert len((tmp_path / "products.jsonl").read_text().splitlines()) == len(seed) + 1
+
+
+def test_concurrent_appends_are_not_lost(tmp_path):
+    store, seed = make_store(tmp_path)
+    store.refresh()
+    # Separate store objects share nothing but the file, like separate workers
+    writers = [LocalProductStore(store.path, seed_path=store.seed_path) for _ in range(4)]
+
+    def cache(w, k):
+        for i in range(25):
+            writers[w].append({"name": f"P {i}", "link": f"https://example.com/p{i % 30}-{k}"})
+
+    threads = [threading.Thread(target=cache, args=(w, w % 2)) for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(store) == len(seed) + 50
+    assert store.wasted_lines == 0
+
+
+def test_reader_sees_appends_without_reload(tmp_path):
+    store, _ = make_store(tmp_path)
+    index = LocalProductIndex(store)
+    assert index.search("brand new toner") == []
+
+    writer = LocalProductStore(store.path, seed_path=store.seed_path)
+    writer.append({"name": "Brand New Toner", "brand": "Test", "link": "https://example.com/new"})
+    assert [p["link"] for p in index.search("brand new toner")] == ["https://example.com/new"]
+    assert [p["link"] for p in index.search("seed serum 1")] == ["https://example.com/1"]
+    assert index.stats()["loads"] == 1
+    assert index.stats()["extends"] == 1
+
+
+def test_compact_drops_duplicate_and_torn_lines(tmp_path):
+    store, seed = make_store(tmp_path)
+    store.refresh()
+    with open(store.path, "a") as f:
+        f.write(json.dumps(seed[1]) + "\n")
+        f.write('{"name": "torn\n')
+    reader = LocalProductStore(store.path, seed_path=store.seed_path)
+    index = LocalProductIndex(reader)
+    assert len(index.search("seed serum")) == len(seed) + 1
+    assert reader.wasted_lines == 2
+
+    assert store.compact() == 2
+    assert [json.loads(line) for line in (tmp_path / "products.jsonl").read_text().splitlines()] == seed
+    # Other readers notice the rewritten file and reload once
+    assert [p["link"] for p in index.search("seed serum")] == [p["link"] for p in seed]
+    assert reader.wasted_lines == 0
+    assert index.stats()["loads"] == 2
+
+
+def test_compaction_between_stamp_and_load(tmp_path):
+    store, seed = make_store(tmp_path)
+    store.refresh()
+    with open(store.path, "a") as f:
+        f.write(json.dumps(seed[1]) + "\n")
+    index = LocalProductIndex(store)
+    assert len(index.search("seed serum")) == len(seed) + 1
+
+    store.append({"name": "Fresh Toner", "brand": "Test", "link": "https://example.com/new"})
+    read_stamp = index._stamp
+
+    def stamp_then_compact():
+        stamp = read_stamp()
+        store.compact()  # lands after the stamp was read, before the index catches up
+        return stamp
+
+    index._stamp = stamp_then_compact
+    assert [p["link"] for p in index.search("fresh toner")] == ["https://example.com/new"]
+    index._stamp = read_stamp
+    assert [p["link"] for p in index.search("seed serum")] == [p["link"] for p in seed]
+
+
+def test_search_does_not_wait_for_writers(tmp_path):
+    store, seed = make_store(tmp_path)
+    index = LocalProductIndex(store)
+    writer = LocalProductStore(store.path, seed_path=store.seed_path)
+    writer.refresh()
+    results = []
+    with writer._lock:  # e.g. another worker in the middle of an append or a compaction
+        thread = threading.Thread(target=lambda: results.append(index.search("seed serum")))
+        thread.start()
+        thread.join(timeout=5)
+        finished = not thread.is_alive()
+    thread.join()
+    assert finished
+    assert len(results[0]) == len(seed)
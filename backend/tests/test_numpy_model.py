@@ -0,0 +1,19 @@
+import sys
+import os
+
+# Add backend directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export_model import export_model, verify_export
+from numpy_model import NumpyToxicityModel
+import toxicity_engine
+
+def test_export_matches_pickle(tmp_path):
+    path = str(tmp_path / "model.npz")
+    export_model(path)
+    assert verify_export(path, tolerance=1e-6) <= 1e-6
+
+def test_export_is_tied_to_model_version(tmp_path):
+    path = str(tmp_path / "model.npz")
+    export_model(path)
+    assert NumpyToxicityModel(path).source_version == toxicity_engine.get_model_version()
@@ -0,0 +1,61 @@
+import sys
+import os
+import random
+import pytest
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_scoring import calculate_product_toxicity, calculate_product_toxicity_many, calculate_base_score, calculate_usage_grid
+
+NAMES = ["Water", "Glycerin", "Niacinamide", "Phenoxyethanol", "Parfum (Fragrance)", "Xanthan Gum",
+         "Retinol", "Methylparaben", "Dimethicone", "Disodium EDTA", "Tocopherol", "Alcohol Denat."]
+
+
+def random_products(n, seed=0):
+    rng = random.Random(seed)
+    products = []
+    for i in range(n):
+        size = 0 if i % 17 == 0 else rng.randint(1, 25)
+        report = [{"ingredient": rng.choice(NAMES), "score": rng.random()} for _ in range(size)]
+        products.append((report, rng.choice(["serum", "cleanser", "moisturizer", "general", "toner"]),
+                         rng.choice(["daily", "weekly", "occasional", "Daily"]),
+                         rng.choice(["pea", "normal", "generous"])))
+    return products
+
+
+def test_batch_matches_single_product_scoring():
+    products = random_products(300)
+    scores, names, offsets = [], [], [0]
+    for report, _, _, _ in products:
+        scores.extend(item["score"] for item in report)
+        names.extend(item["ingredient"] for item in report)
+        offsets.append(len(scores))
+
+    batch = calculate_product_toxicity_many(
+        scores, offsets, names,
+        [p[1] for p in products], [p[2] for p in products], [p[3] for p in products])
+
+    for i, (report, category, frequency, amount) in enumerate(products):
+        final_score, status, _ = calculate_product_toxicity(report, frequency, amount, category)
+        assert batch["final_score"][i] == pytest.approx(final_score, abs=1e-12)
+        assert batch["status"][i] == status
+
+
+def test_batch_with_scalar_parameters_and_no_products():
+    batch = calculate_product_toxicity_many([0.9, 0.8, 0.1], [0, 2, 2, 3], ["Retinol", "Parfum", "Water"])
+    assert list(batch["status"]) == ["TOXIC", "SAFE", "SAFE"]
+    assert batch["final_score"][1] == 0
+
+    empty = calculate_product_toxicity_many([], [0], [])
+    assert len(empty["final_score"]) == 0
+
+
+def test_usage_grid_matches_rescoring_with_each_setting():
+    report, category, _, _ = random_products(3, seed=4)[1]
+    grid = calculate_usage_grid(calculate_base_score(report, category))
+    for frequency in ["daily", "weekly", "occasional"]:
+        for amount in ["pea", "normal", "generous"]:
+            final_score, status, _ = calculate_product_toxicity(report, frequency, amount, category)
+            assert grid[frequency][amount]["final_score"] == round(final_score, 3)
+            assert grid[frequency][amount]["status"] == status
@@ -0,0 +1,68 @@
+import sys
+import os
+import pytest
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rescore_catalog import LocalCatalog, rescore_catalog
+from toxicity_engine import predict_toxicity
+from product_scoring import calculate_product_toxicity
+
+PRODUCTS = [
+    {"name": "Gentle Cleanser", "category": "cleanser", "ingredients": ["Water", "Glycerin", "Sodium Laureth Sulfate", "Fragrance"]},
+    {"name": "Vitamin C Serum", "category": "serum", "ingredients": ["Water", "Ascorbic Acid", "Propylene Glycol", "Phenoxyethanol"]},
+    {"name": "Day Cream", "ingredients": ["Water", "Glycerin", "Dimethicone", "Methylparaben", "Parfum"]},
+    {"name": "Old Score", "category": "moisturizer", "toxicity_score": 0.99, "product_status": "TOXIC", "ingredients": ["Water", "Glycerin"]},
+    {"name": "Body Milk", "ingredients": ["Water", "Mineral Oil", "Glycerin", "Tocopherol"]},
+]
+
+
+def expected_score(doc):
+    report = predict_toxicity(doc["ingredients"])
+    return calculate_product_toxicity(report, "daily", "normal", doc["category"] or "general")[0]
+
+
+class FlakyCatalog(LocalCatalog):
+    """Fails on the second commit, like a job killed halfway through."""
+    def write_batch(self, updates):
+        if self.commits == 1:
+            self.commits += 1
+            raise RuntimeError("connection lost")
+        super().write_batch(updates)
+
+
+def test_rescore_resumes_from_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    catalog = FlakyCatalog(PRODUCTS)
+
+    with pytest.raises(RuntimeError):
+        rescore_catalog(catalog, page_size=2, checkpoint_path=checkpoint)
+    assert os.path.exists(checkpoint)
+
+    summary = rescore_catalog(catalog, page_size=2, checkpoint_path=checkpoint)
+    assert summary["processed"] == len(PRODUCTS)
+    assert not os.path.exists(checkpoint)
+    for doc in catalog.docs.values():
+        assert doc["toxicity_score"] == pytest.approx(expected_score(doc))
+
+
+def test_dry_run_does_not_write(tmp_path):
+    catalog = LocalCatalog(PRODUCTS)
+    summary = rescore_catalog(catalog, page_size=2, checkpoint_path=str(tmp_path / "c.json"), dry_run=True)
+    assert summary["changed"] == len(PRODUCTS)
+    assert catalog.writes == 0
+    assert catalog.docs[catalog.ids[3]]["toxicity_score"] == 0.99
+
+
+def test_local_catalog_includes_cached_products(tmp_path):
+    import json
+    from local_product_store import LocalProductStore
+
+    seed = [dict(p, link=f"https://example.com/{i}") for i, p in enumerate(PRODUCTS[:2])]
+    (tmp_path / "products.json").write_text(json.dumps(seed))
+    store = LocalProductStore(str(tmp_path / "products.jsonl"), seed_path=str(tmp_path / "products.json"))
+    store.append({"name": "Fresh Scrape", "link": "https://example.com/new", "ingredients": ["Water", "Zinc Oxide"]})
+
+    catalog = LocalCatalog.from_file(store.path)
+    assert sorted(doc["product_name"] for doc in catalog.docs.values()) == ["Fresh Scrape", "Gentle Cleanser", "Vitamin C Serum"]
@@ -5,7 +5,7 @@ import pytest
 # Add backend directory to path so we can import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from routine_engine import check_routine_compatibility
+from routine_engine import check_routine_compatibility, analyze_routine_conflicts, RoutineIndex
 
 def test_no_conflicts():
     new_product = ["Water", "Glycerin"]
@@ -54,3 +54,31 @@ def test_multiple_conflicts():
     report = check_routine_compatibility(new_product, routine)
     # Just check structure
     assert isinstance(report["conflicts"], list)
+
+def test_conflicts_apply_both_ways():
+    # The rules only list Vitamin C under Benzoyl Peroxide, not the other way round
+    report = check_routine_compatibility(["Ascorbic Acid"], [{"product_name": "Spot Gel", "ingredients": ["Benzoyl Peroxide"]}])
+    assert [c["conflict"] for c in report["conflicts"]] == ["Vitamin C vs Benzoyl Peroxide"]
+    assert report["conflicts"][0]["with_product"] == "Spot Gel"
+
+def test_routine_index_incremental_check():
+    index = RoutineIndex([{"product_name": "Toner", "ingredients": ["Glycolic Acid"]}])
+    index.add("Cleanser", ["Water", "Glycerin"])
+    report = index.check(["Retinol"])
+    assert [c["with_product"] for c in report["conflicts"]] == ["Toner"]
+
+    index.remove("Toner")
+    assert index.check(["Retinol"])["compatible"]
+
+def test_pairwise_conflicts_one_per_pair():
+    products = [
+        {"name": "Night Serum", "ingredients": ["Retinol", "Niacinamide"]},
+        {"name": "Vitamin C Serum", "ingredients": ["Ascorbic Acid", "Glycolic Acid"]},
+        {"name": "Moisturizer", "ingredients": ["Water", "Glycerin"]},
+        {"name": "Exfoliant", "ingredients": ["Salicylic Acid"]}
+    ]
+    conflicts = analyze_routine_conflicts(products)
+    pairs = [(c["conflict"], c["with_product"]) for c in conflicts]
+    # Night Serum conflicts with both serums, Vitamin C Serum with the exfoliant; one entry per pair
+    assert pairs == [("Retinol vs Vitamin C", "Vitamin C Serum"), ("Retinol vs BHA", "Exfoliant"),
+                     ("Vitamin C vs BHA", "Exfoliant")]
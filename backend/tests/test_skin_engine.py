@@ -0,0 +1,37 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from skin_engine import skin_suitability_matrix, check_skin_type_suitability, check_skin_tone_suitability
+
+PRODUCTS = [
+    ["Water", "Glycerin", "Mineral Oil", "Dimethicone"],
+    ["Aqua", "Alcohol Denat.", "Parfum", "Kojic Acid"],
+    [],
+    ["Water", "Lemon Oil", "Niacinamide", "Mineral Oil"]
+]
+
+
+def test_matrix_matches_single_product_checks():
+    result = skin_suitability_matrix(PRODUCTS)
+    assert result.matrix.shape == (len(PRODUCTS), len(result.skin_types) + len(result.skin_tones))
+
+    for skin_type in result.skin_types + ["Oily", "unknown"]:
+        suitable = result.suitable(skin_type=skin_type)
+        for i, ingredients in enumerate(PRODUCTS):
+            bad = check_skin_type_suitability(ingredients, skin_type)
+            assert suitable[i] == (not bad)
+            assert sorted(result.offending(i, skin_type=skin_type)) == sorted(bad)
+
+    for skin_tone in result.skin_tones:
+        for i, ingredients in enumerate(PRODUCTS):
+            bad = check_skin_tone_suitability(ingredients, skin_tone)
+            assert sorted(result.offending(i, skin_tone=skin_tone)) == sorted(bad)
+
+
+def test_combined_type_and_tone():
+    result = skin_suitability_matrix(PRODUCTS)
+    assert list(result.suitable(skin_type="dry", skin_tone="dark")) == [True, False, True, True]
+    assert list(result.suitable(skin_type="oily", skin_tone="light")) == [False, True, True, False]
+    assert result.offending(1, skin_type="sensitive", skin_tone="dark") == ["Alcohol Denat.", "Parfum", "Kojic Acid"]
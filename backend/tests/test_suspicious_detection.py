@@ -0,0 +1,20 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suspicious_detection import detect_suspicious_product, detect_suspicious_many, suspicious_keyword
+
+
+def test_whole_word_matching():
+    assert not detect_suspicious_product("Carrot Seed Face Oil", "Skincare")
+    assert detect_suspicious_product("Shine Car Shampoo")
+    assert detect_suspicious_product("Lemon Fresh", "Household")
+    assert suspicious_keyword("Premium Motor Oil 5W-30") == "motor oil"
+
+
+def test_batch_flags_and_keywords():
+    names = ["Hydrating Serum", "Floor Cleaner", "Nail Polish", "Scar Gel"]
+    assert detect_suspicious_many(names, "Beauty") == [(False, None), (True, "floor"), (True, "polish"), (False, None)]
+    assert [flag for flag, _ in detect_suspicious_many(names, ["Skincare", None, "", "Kitchen"])] == \
+        [False, True, True, True]
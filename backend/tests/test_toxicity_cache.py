@@ -0,0 +1,76 @@
+import sys
+import os
+import threading
+
+# Add backend directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import toxicity_engine
+from toxicity_engine import predict_toxicity, score_cache
+
+def test_cached_scores_match_model():
+    ingredients = ["Water", "Glycerin", "Phenoxyethanol", "Parfum"]
+    score_cache.clear()
+    first = predict_toxicity(ingredients)
+    second = predict_toxicity(ingredients)
+    assert first == second
+    assert [r["ingredient"] for r in second] == ingredients
+
+def test_cache_counts_hits_and_misses(monkeypatch):
+    monkeypatch.setattr(toxicity_engine, "score_table", None)
+    score_cache.clear()
+    before = toxicity_engine.get_cache_stats()
+    predict_toxicity(["Water", "Glycerin"])
+    predict_toxicity(["water ", "Glycerin", "Niacinamide"])
+    after = toxicity_engine.get_cache_stats()
+    assert after["misses"] - before["misses"] == 3
+    assert after["hits"] - before["hits"] == 2
+
+def test_cache_dropped_when_model_changes(monkeypatch):
+    monkeypatch.setattr(toxicity_engine, "SCORE_TABLE_PATH", "does-not-exist.bin")
+    monkeypatch.setattr(toxicity_engine, "score_table", None)
+    predict_toxicity(["Water"])
+    assert len(score_cache) > 0
+    # Pretend the pickles changed on disk
+    monkeypatch.setattr(toxicity_engine, "_model_stat", None)
+    predict_toxicity(["Glycerin"])
+    assert len(score_cache) == 1
+
+def test_score_table_lookup(tmp_path):
+    from score_table import write_score_table, load_score_table
+    path = str(tmp_path / "table.bin")
+    write_score_table(path, ["water", "parfum"], [0.01, 0.99], "testversion")
+
+    assert load_score_table(path, "otherversion") is None
+    table = load_score_table(path, "testversion")
+    found = table.lookup(["parfum", "niacinamide", "water"])
+    assert abs(found[0] - 0.99) < 1e-6
+    assert found[1] != found[1]  # NaN for unknown ingredients
+    assert abs(found[2] - 0.01) < 1e-6
+
+def test_batched_miss_without_started_backend(monkeypatch):
+    # Micro-batching on, no start_backend(): the first model miss must not deadlock on _model_lock
+    monkeypatch.setattr(toxicity_engine, "INFERENCE_BATCH_WINDOW_MS", 2)
+    monkeypatch.setattr(toxicity_engine, "batcher", None)
+    monkeypatch.setattr(toxicity_engine, "backend", None)
+    monkeypatch.setattr(toxicity_engine, "score_table", None)
+    score_cache.clear()
+
+    results = []
+    worker = threading.Thread(target=lambda: results.append(predict_toxicity(["Water", "Zzzunknownthing"])), daemon=True)
+    worker.start()
+    worker.join(timeout=60)
+    assert not worker.is_alive(), "predict_toxicity deadlocked"
+    assert [r["ingredient"] for r in results[0]] == ["Water", "Zzzunknownthing"]
+
+def test_score_table_names_include_cached_products(tmp_path):
+    import json
+    from score_table import collect_ingredient_names
+    from local_product_store import LocalProductStore
+
+    (tmp_path / "products.json").write_text(json.dumps([{"name": "Seed", "link": "a", "ingredients": ["Water"]}]))
+    store = LocalProductStore(str(tmp_path / "products.jsonl"), seed_path=str(tmp_path / "products.json"))
+    store.append({"name": "Cached Later", "link": "b", "ingredients": ["Bakuchiol"]})
+
+    names = collect_ingredient_names(data_dir=str(tmp_path), dataset_path=str(tmp_path / "none.csv"))
+    assert "Water" in names and "Bakuchiol" in names
@@ -0,0 +1,37 @@
+import sys
+import os
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wellness_engine import calculate_wellness_match, get_wellness_scorer
+
+
+def test_allergies_fail_the_match():
+    profile = {"skin_type": "Dry", "skin_concerns": [], "allergies": ["Fragrance", "nut"]}
+    result = calculate_wellness_match(["Water", "Parfum (Fragrance)", "Coconut Oil"], profile)
+    assert result["score"] == 0
+    assert result["allergy_matches"] == ["Contains allergen: Parfum (Fragrance)", "Contains allergen: Coconut Oil"]
+
+
+def test_concerns_and_skin_type_use_db_functions():
+    profile = {"skin_type": "Dry", "skin_concerns": ["Acne"], "allergies": []}
+    result = calculate_wellness_match(["Aqua", "Glycerin", "Salicylic Acid"], profile)
+    assert result["score"] > 80
+    assert any("is hydrating for Dry skin" in m for m in result["positive_matches"])
+
+    batch = get_wellness_scorer(profile).score_many([["Aqua", "Glycerin", "Salicylic Acid"], ["Water"]])
+    assert batch[0]["score"] == result["score"]
+    assert sorted(batch[0]["positive_matches"]) == sorted(result["positive_matches"])
+    assert batch[1]["score"] == 80.0
+
+
+def test_scorer_is_cached_per_profile():
+    profile = {"skin_type": "Oily", "skin_concerns": ["Acne"], "allergies": []}
+    scorer = get_wellness_scorer(profile)
+    assert get_wellness_scorer(dict(profile)) is scorer
+    # An updated profile gets its own scorer
+    assert get_wellness_scorer({**profile, "skin_type": "Dry"}) is not scorer
+    assert get_wellness_scorer({**profile, "allergies": ["Fragrance"]}) is not scorer
+    # Fields that do not affect the score share it
+    assert get_wellness_scorer({**profile, "age_group": "30s"}) is scorer
@@ -1,72 +1,304 @@
-# toxicity_engine.py
 import joblib
 import numpy as np
 from scipy.sparse import hstack
+import hashlib
+import threading
 import os
 
-MODEL_PATH = "model/toxicity_model.pkl"
-ENCODER_PATH = "model/encoder.pkl"
+from cache_utils import LRUCache
+from score_table import load_score_table
+from inference_scheduler import MicroBatcher
+from numpy_model import NumpyToxicityModel
+from inference_backend import create_backend
+from ingredient_annotator import annotator
 
-if not os.path.exists(MODEL_PATH) or not os.path.exists(ENCODER_PATH):
-    raise FileNotFoundError("Model or encoder not found. Run train_model.py first.")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "model", "toxicity_model.pkl")
+ENCODER_PATH = os.path.join(BASE_DIR, "model", "encoder.pkl")
+SCORE_TABLE_PATH = os.getenv("SCORE_TABLE_PATH", os.path.join(BASE_DIR, "model", "score_table.bin"))
+NUMPY_MODEL_PATH = os.path.join(BASE_DIR, "model", "toxicity_model.npz")
 
-ensemble = joblib.load(MODEL_PATH)
-preproc = joblib.load(ENCODER_PATH)
-tfidf = preproc["tfidf"]
-scaler = preproc["scaler"]
+# "pickle" runs the sklearn/LightGBM ensemble, "numpy" the flat-array export (see export_model.py)
+MODEL_FORMAT = os.getenv("TOXICITY_MODEL_FORMAT", "pickle")
+
+# Load the pickles with mmap_mode="r" so large arrays are shared between worker processes
+MODEL_MMAP = os.getenv("TOXICITY_MODEL_MMAP", "0") == "1"
+
+# Per-ingredient score cache. Scores only depend on the ingredient string and the model,
+# so product lists that share most of their ingredients skip the model for the shared part.
+SCORE_CACHE_SIZE = int(os.getenv("SCORE_CACHE_SIZE", "20000"))
+score_cache = LRUCache(maxsize=SCORE_CACHE_SIZE)
+
+# Nothing is loaded at import time. The model version and score table are resolved on the
+# first prediction, and the pickles only when an ingredient actually needs the model
+# (or eagerly through warmup()).
+_model_lock = threading.Lock()
+_model_stat = None
+MODEL_VERSION = None
+ensemble = None
+tfidf = None
+scaler = None
+numpy_model = None
+_numpy_model_checked = False
+
+# Cross-request micro-batching of model calls (disabled unless a window is configured)
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "0"))
+INFERENCE_BATCH_MAX_ROWS = int(os.getenv("INFERENCE_BATCH_MAX_ROWS", "512"))
+batcher = None
+
+# Where the model actually runs: in-process (default) or a worker process pool (INFERENCE_BACKEND)
+backend = None
+
+# Prebuilt table of known ingredients (see score_table.py), memory-mapped and shared by all workers
+score_table = None
+table_hits = 0
+
+def _model_file_stat():
+    """Cheap change detector for the model files (mtime + size)."""
+    if not os.path.exists(MODEL_PATH) or not os.path.exists(ENCODER_PATH):
+        raise FileNotFoundError("Model or encoder not found. Run train_model.py first.")
+    stats = [os.stat(p) for p in (MODEL_PATH, ENCODER_PATH)]
+    return tuple((s.st_mtime_ns, s.st_size) for s in stats)
+
+def _model_file_hash():
+    """Content hash of the model files, used as the model version."""
+    h = hashlib.sha1()
+    for path in (MODEL_PATH, ENCODER_PATH):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+def _load_metadata():
+    """Resolves the model version and score table. Drops any previously loaded model."""
+    global ensemble, tfidf, scaler, numpy_model, _numpy_model_checked
+    global _model_stat, MODEL_VERSION, score_table
+    _model_stat = _model_file_stat()
+    MODEL_VERSION = _model_file_hash()
+    ensemble = tfidf = scaler = numpy_model = None
+    _numpy_model_checked = False
+    score_cache.clear()
+    score_table = load_score_table(SCORE_TABLE_PATH, MODEL_VERSION)
+
+def _ensure_current():
+    """Loads metadata on first use, and reloads it when the pickles change on disk."""
+    if _model_stat is not None:
+        try:
+            if _model_file_stat() == _model_stat:
+                return
+        except OSError:
+            return
+    with _model_lock:
+        if _model_stat is None:
+            _load_metadata()
+        elif _model_file_stat() != _model_stat:
+            print("Model files changed on disk, reloading and clearing score cache.")
+            _load_metadata()
+
+def _get_model():
+    global ensemble, tfidf, scaler
+    if ensemble is None:
+        _ensure_current()
+        with _model_lock:
+            if ensemble is None:
+                mmap_mode = "r" if MODEL_MMAP else None
+                preproc = joblib.load(ENCODER_PATH, mmap_mode=mmap_mode)
+                tfidf = preproc["tfidf"]
+                scaler = preproc["scaler"]
+                ensemble = joblib.load(MODEL_PATH, mmap_mode=mmap_mode)
+    return ensemble, tfidf, scaler
+
+def _get_numpy_model():
+    """The exported flat-array model, or None if it is missing or was exported from another model version."""
+    global numpy_model, _numpy_model_checked
+    if not _numpy_model_checked:
+        _ensure_current()
+        with _model_lock:
+            if not _numpy_model_checked:
+                if not os.path.exists(NUMPY_MODEL_PATH):
+                    print(f"Warning: {NUMPY_MODEL_PATH} not found, falling back to the pickled model.")
+                else:
+                    exported = NumpyToxicityModel(NUMPY_MODEL_PATH)
+                    if exported.source_version == MODEL_VERSION:
+                        numpy_model = exported
+                    else:
+                        print("Warning: exported model is stale (run export_model.py), "
+                              "falling back to the pickled model.")
+                _numpy_model_checked = True
+    return numpy_model
+
+def get_model_version():
+    _ensure_current()
+    return MODEL_VERSION
+
+def warmup():
+    """
+    Eagerly loads everything and runs one prediction so the first real
+    request does not pay for deserialization or library initialization.
+    """
+    if MODEL_FORMAT != "numpy" or _get_numpy_model() is None:
+        _get_model()
+    _run_model(["water"])
+    return MODEL_VERSION
 
 # The numeric features order must match the training script numeric_cols
 numeric_cols = ["cancer","allergy","immunotoxic","reprotoxic","restriction",
                 "bad_oily","bad_dry","bad_sensitive","bad_combination"]
 
+# Name keywords behind the heuristic numeric features (matched through the shared annotator)
+TOXICITY_FEATURE_KEYWORDS = {
+    "cancer": ["hydroquinone", "paraben", "formaldehyde", "benzene"],
+    "allergy": ["fragrance", "parfum", "benzyl", "limonene", "linalool"],
+    "immunotoxic": ["isocyanate"],
+    "reprotoxic": ["phthalate", "paraben"],
+    "bad_oily": ["paraffin", "mineral oil", "dimethicone"],
+    "bad_dry": ["alcohol", "sulfate"],
+    "bad_sensitive": ["fragrance", "alcohol"]
+}
+annotator.register("toxicity_features", lambda: TOXICITY_FEATURE_KEYWORDS)
+
 def ingredient_features_from_name(name):
     """
     Best-effort: small heuristic to infer numeric features from ingredient name
     when only the name is available (useful for product ingredient lists).
     You should replace this with real features from your dataset where possible.
     """
-    n = name.lower()
-    cancer = 1 if any(x in n for x in ["hydroquinone","paraben","formaldehyde","benzene"]) else 0
-    allergy = 1 if any(x in n for x in ["fragrance","parfum","benzyl","limonene","linalool"]) else 0
-    immuno = 1 if "isocyanate" in n else 0
-    reprotoxic = 1 if any(x in n for x in ["phthalate","paraben"]) else 0
+    hits = annotator.labels(name, "toxicity_features")
+    cancer = 1 if "cancer" in hits else 0
+    allergy = 1 if "allergy" in hits else 0
+    immuno = 1 if "immunotoxic" in hits else 0
+    reprotoxic = 1 if "reprotoxic" in hits else 0
     restriction = 1 if (cancer or allergy or reprotoxic) else 0
-    bad_oily = 1 if any(x in n for x in ["paraffin","mineral oil","dimethicone"]) else 0
-    bad_dry = 1 if any(x in n for x in ["alcohol","sulfate"]) else 0
-    bad_sensitive = 1 if any(x in n for x in ["fragrance","alcohol"]) else 0
+    bad_oily = 1 if "bad_oily" in hits else 0
+    bad_dry = 1 if "bad_dry" in hits else 0
+    bad_sensitive = 1 if "bad_sensitive" in hits else 0
     bad_combination = 0
     return [cancer, allergy, immuno, reprotoxic, restriction, bad_oily, bad_dry, bad_sensitive, bad_combination]
 
-def predict_toxicity(ingredients):
+def normalize_ingredient_key(name):
     """
-    ingredients: list of ingredient strings
-    returns list of dicts: {ingredient, score (0..1), label}
+    Cache key for an ingredient. Both the TF-IDF vectorizer and the heuristic
+    features lowercase their input and ignore surrounding whitespace, so this
+    never merges two strings that would get different scores.
     """
-    results = []
-    names = [str(i) for i in ingredients]
-    # build features
+    return name.strip().lower()
+
+def risk_label(score):
+    if score >= 0.75:
+        return "HIGH RISK"
+    elif score >= 0.50:
+        return "MODERATE RISK"
+    elif score >= 0.25:
+        return "LOW RISK"
+    return "SAFE"
+
+def _run_model(names):
+    """Runs the ensemble on a list of ingredient strings and returns toxic-class probabilities."""
+    exported = _get_numpy_model() if MODEL_FORMAT == "numpy" else None
+    if exported is not None:
+        return exported.predict_proba(names, [ingredient_features_from_name(n) for n in names])
+    return _run_pickle_model(names)
+
+def _run_pickle_model(names):
+    ensemble, tfidf, scaler = _get_model()
     text_features = tfidf.transform(names)
     numeric_features = np.array([ingredient_features_from_name(n) for n in names])
     numeric_scaled = scaler.transform(numeric_features)
 
     X = hstack([text_features, numeric_scaled])
 
-    probs = ensemble.predict_proba(X)[:,1]  # probability of toxic class
-    for name, p in zip(names, probs):
-        score = float(p)
-        if score >= 0.75:
-            label = "HIGH RISK"
-        elif score >= 0.50:
-            label = "MODERATE RISK"
-        elif score >= 0.25:
-            label = "LOW RISK"
+    return ensemble.predict_proba(X)[:,1]  # probability of toxic class
+
+def get_backend():
+    global backend
+    if backend is None:
+        with _model_lock:
+            if backend is None:
+                backend = create_backend(_run_model)
+    return backend
+
+def start_backend():
+    """Pre-starts the inference backend (loads the model in every worker for the process pool)."""
+    get_backend().start()
+
+def shutdown_backend():
+    if backend is not None:
+        backend.shutdown()
+
+def _score_missing(keys):
+    """Sends cache misses to the model backend, through the micro-batcher when it is enabled."""
+    global batcher
+    if INFERENCE_BATCH_WINDOW_MS <= 0:
+        return get_backend().predict(keys)
+    if batcher is None:
+        # get_backend() takes _model_lock itself, so resolve it before locking
+        predict = get_backend().predict
+        with _model_lock:
+            if batcher is None:
+                batcher = MicroBatcher(predict, INFERENCE_BATCH_WINDOW_MS, INFERENCE_BATCH_MAX_ROWS)
+    return batcher.submit(keys)
+
+def predict_toxicity(ingredients):
+    """
+    ingredients: list of ingredient strings
+    returns list of dicts: {ingredient, score (0..1), label}
+    """
+    global table_hits
+    _ensure_current()
+
+    names = [str(i) for i in ingredients]
+    keys = [normalize_ingredient_key(n) for n in names]
+    unique_keys = list(dict.fromkeys(keys))
+    scores = {}
+
+    # 1. Prebuilt table (binary search over the mmap'd hashes)
+    if score_table is not None:
+        found = score_table.lookup(unique_keys)
+        for key, score in zip(unique_keys, found):
+            if score == score:  # not NaN
+                scores[key] = float(score)
+        table_hits += len(scores)
+
+    # 2. Then the in-process cache
+    missing = []
+    for key in unique_keys:
+        if key in scores:
+            continue
+        cached = score_cache.get((key, MODEL_VERSION))
+        if cached is None:
+            missing.append(key)
         else:
-            label = "SAFE"
+            scores[key] = cached
+
+    # 3. Only unseen ingredients go to the model
+    if missing:
+        probs = _score_missing(missing)
+        for key, p in zip(missing, probs):
+            scores[key] = float(p)
+            score_cache.put((key, MODEL_VERSION), float(p))
 
+    # 4. Assemble the report in the original order
+    results = []
+    for name, key in zip(names, keys):
+        score = scores[key]
         results.append({
             "ingredient": name,
             "score": score,
-            "label": label
+            "label": risk_label(score)
         })
 
     return results
+
+def get_cache_stats():
+    _ensure_current()
+    stats = score_cache.stats()
+    stats["model_version"] = MODEL_VERSION
+    stats["table_rows"] = len(score_table) if score_table is not None else 0
+    stats["table_hits"] = table_hits
+    return stats
+
+def get_inference_stats():
+    return {
+        "score_cache": get_cache_stats(),
+        "batching": batcher.stats() if batcher is not None else None,
+        "backend": get_backend().stats()
+    }
@@ -1,8 +1,186 @@
+import hashlib
+import json
+import os
+import re
+
 from ingredient_matcher import matcher
+from cache_utils import LRUCache
+
+# Compiled scorers, keyed by profile hash. A session scanning many products compiles once; an updated
+# profile hashes to a new key, so a stale scorer is never used (it just ages out of the LRU).
+WELLNESS_SCORER_CACHE_SIZE = int(os.getenv("WELLNESS_SCORER_CACHE_SIZE", "2000"))
+scorer_cache = LRUCache(maxsize=WELLNESS_SCORER_CACHE_SIZE)
+
+# Per-scorer memory of ingredient -> DB match effect
+MAX_REMEMBERED_INGREDIENTS = 20000
 
 def normalize_ingredient(name):
     return name.lower().strip()
 
+def profile_hash(user_profile):
+    """Stable hash of the profile fields that affect the wellness score."""
+    relevant = {
+        "skin_type": user_profile.get("skin_type", "Normal"),
+        "skin_concerns": user_profile.get("skin_concerns", []) or [],
+        "allergies": user_profile.get("allergies", []) or []
+    }
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class WellnessScorer:
+    """
+    A user profile compiled for fast scoring: lowercased allergies in one regex,
+    and each matched DB entry's effect on the score worked out once and reused
+    for every ingredient (and product) that maps to it.
+    """
+
+    def __init__(self, user_profile):
+        self.skin_type = user_profile.get("skin_type", "Normal")
+        self.skin_concerns = user_profile.get("skin_concerns", []) or []
+        self.allergies = user_profile.get("allergies", []) or []
+
+        self._concerns = [(c, c.lower()) for c in self.skin_concerns]
+        self._allergies = [a.lower() for a in self.allergies]
+        # Any allergy as a substring of the ingredient (longest first so the alternation is greedy)
+        self._allergy_re = re.compile("|".join(re.escape(a) for a in sorted(set(self._allergies), key=len, reverse=True))) \
+            if self._allergies else None
+        self._effects = {} # id(db entry) -> (entry, score delta, positive suffixes, negative suffixes)
+        self._by_ingredient = {} # ingredient -> effect (or None), valid for self._generation
+        self._generation = None
+
+    def _allergy_count(self, ing_norm):
+        """Number of allergies found in the ingredient (each one adds a message, as before)."""
+        if self._allergy_re is None or not self._allergy_re.search(ing_norm):
+            return 0
+        return sum(1 for a in self._allergies if a in ing_norm)
+
+    def _entry_effect(self, db_entry):
+        cached = self._effects.get(id(db_entry))
+        if cached is not None and cached[0] is db_entry:
+            return cached
+
+        # The DB has "functions" and "safety_rating" but no "good_for" / "bad_for" lists yet,
+        # so "functions" are mapped to concerns as a heuristic (e.g. "Anti-Acne" is good for "Acne").
+        functions = db_entry.get("functions", [])
+        delta = 0
+        positive = []
+        negative = []
+
+        # Positive Matches
+        for concern, concern_lower in self._concerns:
+            # Simple substring match: if concern is "Acne" and function is "Anti-Acne"
+            for func in functions:
+                if concern_lower in func.lower():
+                    delta += 5
+                    positive.append(f" ({func}) is good for {concern}")
+
+        # Skin Type Logic (Heuristic based on functions)
+        if self.skin_type == "Oily" and "Oil Control" in functions:
+            delta += 3
+            positive.append(" helps with oil control")
+        if self.skin_type == "Dry" and ("Hydration" in functions or "Moisturizer" in functions):
+            delta += 3
+            positive.append(" is hydrating for Dry skin")
+
+        # Negative Matches (Safety Rating)
+        if db_entry.get("safety_rating") == "Caution":
+            if self.skin_type == "Sensitive":
+                delta -= 10
+                negative.append(" can be irritating for Sensitive skin")
+
+        if db_entry.get("safety_rating") == "Risk":
+            delta -= 10
+            negative.append(" is a potential risk")
+
+        effect = (db_entry, delta, positive, negative)
+        self._effects[id(db_entry)] = effect
+        return effect
+
+    def _ingredient_effects(self, ingredients):
+        """Effect of each ingredient's DB match. Remembered per ingredient until the matcher index changes."""
+        generation = matcher.index.generation if matcher.index else None
+        if generation != self._generation or len(self._by_ingredient) > MAX_REMEMBERED_INGREDIENTS:
+            self._by_ingredient = {}
+            self._generation = generation
+
+        known = self._by_ingredient
+        missing = [ing for ing in dict.fromkeys(ingredients) if ing not in known]
+        if missing:
+            for ing, candidates in zip(missing, matcher.match_many(missing, k=1, threshold=0.6)):
+                known[ing] = self._entry_effect(candidates[0]["match"]) if candidates else None
+        return [known[ing] for ing in ingredients]
+
+    def score(self, ingredients):
+        """
+        Calculates a personalized wellness match score (0-100).
+        """
+        # 1. Check Allergies (Critical)
+        allergy_matches = []
+        if self._allergy_re is not None:
+            for ing in ingredients:
+                allergy_matches.extend([f"Contains allergen: {ing}"] * self._allergy_count(normalize_ingredient(ing)))
+
+        if allergy_matches:
+            return {
+                "score": 0,
+                "match_level": "Unsafe (Allergy)",
+                "positive_matches": [],
+                "negative_matches": [],
+                "allergy_matches": allergy_matches
+            }
+
+        # 2. Check Ingredients against Knowledge Base (via Matcher)
+        # We assume 'ingredients' list passed here might already be canonical,
+        # but let's match again to be sure we get the DB entry (only for ingredients this scorer has not seen)
+        effects = self._ingredient_effects(ingredients)
+
+        # Base Score
+        score = 80.0
+        positive_matches = []
+        negative_matches = []
+        for ing, effect in zip(ingredients, effects):
+            if effect:
+                _, delta, positive, negative = effect
+                score += delta
+                positive_matches.extend(ing + suffix for suffix in positive)
+                negative_matches.extend(ing + suffix for suffix in negative)
+
+        # Clamp Score
+        score = max(0, min(100, score))
+
+        # Determine Level
+        if score >= 90:
+            match_level = "Perfect Match"
+        elif score >= 75:
+            match_level = "Good Match"
+        elif score >= 50:
+            match_level = "Fair Match"
+        else:
+            match_level = "Poor Match"
+
+        return {
+            "score": round(score, 1),
+            "match_level": match_level,
+            "positive_matches": list(set(positive_matches)), # Dedupe
+            "negative_matches": list(set(negative_matches)),
+            "allergy_matches": []
+        }
+
+    def score_many(self, products):
+        """Scores several ingredient lists, matching all their distinct ingredients in one matcher call."""
+        self._ingredient_effects([ing for ingredients in products for ing in ingredients])
+        return [self.score(ingredients) for ingredients in products]
+
+
+def get_wellness_scorer(user_profile):
+    """Compiled scorer for the profile, reused while the profile stays the same."""
+    key = profile_hash(user_profile)
+    scorer = scorer_cache.get(key)
+    if scorer is None:
+        scorer = WellnessScorer(user_profile)
+        scorer_cache.put(key, scorer)
+    return scorer
+
 def calculate_wellness_match(ingredients, user_profile):
     """
     Calculates a personalized wellness match score (0-100).
@@ -16,105 +194,4 @@ def calculate_wellness_match(ingredients, user_profile):
             "allergy_matches": []
         }
 
-    skin_type = user_profile.get("skin_type", "Normal")
-    skin_concerns = user_profile.get("skin_concerns", []) or []
-    age_group = user_profile.get("age_group", "")
-    allergies = user_profile.get("allergies", []) or []
-    
-    # Base Score
-    score = 80.0
-    
-    positive_matches = []
-    negative_matches = []
-    allergy_matches = []
-    
-    # 1. Check Allergies (Critical)
-    for ing in ingredients:
-        ing_norm = normalize_ingredient(ing)
-        for allergy in allergies:
-            if allergy.lower() in ing_norm:
-                score = 0 # Immediate fail
-                allergy_matches.append(f"Contains allergen: {ing}")
-    
-    if allergy_matches:
-        return {
-            "score": 0,
-            "match_level": "Unsafe (Allergy)",
-            "positive_matches": [],
-            "negative_matches": [],
-            "allergy_matches": allergy_matches
-        }
-
-    # 2. Check Ingredients against Knowledge Base (via Matcher)
-    for ing in ingredients:
-        # We assume 'ingredients' list passed here might already be canonical, 
-        # but let's match again to be sure we get the DB entry
-        match_result = matcher.match(ing)
-        
-        if match_result:
-            db_entry = match_result["match"]
-            
-            # Get attributes from DB entry, default to empty lists
-            good_for = db_entry.get("functions", []) # Map functions to good_for logic? 
-            # Actually, the DB schema in implementation plan had "functions". 
-            # But the hardcoded one had "good_for" / "bad_for".
-            # We should probably update the DB schema or map "functions" to "good_for".
-            # For now, let's assume the DB has "good_for" and "bad_for" added to it, 
-            # or we infer it. 
-            # Let's check the DB content I wrote.
-            # It has "functions" and "safety_rating".
-            # It DOES NOT have "good_for" / "bad_for" lists yet.
-            # I need to update the DB content to include these or map them.
-            
-            # Let's map "functions" to "good_for" for now as a heuristic
-            # e.g. "Anti-Acne" -> good for "Acne"
-            
-            functions = db_entry.get("functions", [])
-            
-            # Positive Matches
-            for concern in skin_concerns:
-                # Simple substring match: if concern is "Acne" and function is "Anti-Acne"
-                for func in functions:
-                    if concern.lower() in func.lower():
-                        score += 5
-                        positive_matches.append(f"{ing} ({func}) is good for {concern}")
-            
-            # Skin Type Logic (Heuristic based on functions)
-            if skin_type == "Oily" and "Oil Control" in functions:
-                 score += 3
-                 positive_matches.append(f"{ing} helps with oil control")
-            if skin_type == "Dry" and ("Hydration" in functions or "Moisturizer" in functions):
-                 score += 3
-                 positive_matches.append(f"{ing} is hydrating for Dry skin")
-                 
-            # Negative Matches (Safety Rating)
-            if db_entry.get("safety_rating") == "Caution":
-                if skin_type == "Sensitive":
-                    score -= 10
-                    negative_matches.append(f"{ing} can be irritating for Sensitive skin")
-            
-            if db_entry.get("safety_rating") == "Risk":
-                 score -= 10
-                 negative_matches.append(f"{ing} is a potential risk")
-
-
-    # Clamp Score
-    score = max(0, min(100, score))
-    
-    # Determine Level
-    if score >= 90:
-        match_level = "Perfect Match"
-    elif score >= 75:
-        match_level = "Good Match"
-    elif score >= 50:
-        match_level = "Fair Match"
-    else:
-        match_level = "Poor Match"
-        
-    return {
-        "score": round(score, 1),
-        "match_level": match_level,
-        "positive_matches": list(set(positive_matches)), # Dedupe
-        "negative_matches": list(set(negative_matches)),
-        "allergy_matches": []
-    }
+    return get_wellness_scorer(user_profile).score(ingredients)